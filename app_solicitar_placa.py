@@ -1,10 +1,30 @@
+import logging
+import os
+import uuid
 import streamlit as st
 import requests
 import pandas as pd
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
 from io import BytesIO
-from datetime import datetime
-import time
+from datetime import datetime, timedelta
+from functools import partial
+
+from solicitar_placa import ConsultaProdutos, ListaProdutos, Produto, VarejoFacilClient, modelo_padrao
+from solicitar_placa.api import URL_BASE, descrever_falha
+from solicitar_placa.aquecimento import CONEXOES_AQUECIMENTO, Aquecimento, aquecer_modelo, aquecer_previews, pre_carregar
+from solicitar_placa.assets import LARGURA_PREVIEW, TAMANHO_PLACA_IMAGEM_MAP, preparar_previews
+from solicitar_placa.busca import IndiceBusca
+from solicitar_placa.catalogo import INTERVALO_SINCRONIZACAO, CatalogoLocal, SincronizadorCatalogo
+from solicitar_placa.formulario import LINHAS_POR_FORMULARIO, arquivo_exportacao, quantidade_formularios
+from solicitar_placa.historico import HistoricoSolicitacoes
+from solicitar_placa.ingestao import EXTENSOES_PLANILHA, EXTENSOES_TEXTO, validar_codigo
+from solicitar_placa.limitador import REQUISICOES_POR_SEGUNDO, LimitadorRequisicoes
+from solicitar_placa.metricas import METRICAS, iniciar_servidor_metricas
+from solicitar_placa.produtos import LOJAS, TAMANHO_PLACA_MAP, TIPO_PLACA_MAP
+from solicitar_placa.sessoes import RegistroSessoes
+from solicitar_placa.tarefas import (
+    CANCELADA, DUPLICADO, ENCONTRADO, FALHOU, NAO_ENCONTRADO, NAO_PROCESSADO, GerenciadorTarefas
+)
 
 # ===============================
 # CONFIGURAÇÃO DA PÁGINA
@@ -17,22 +37,29 @@ st.set_page_config(
 
 st.title("Solicitação de placas")
 
+# Mensagens do núcleo (aquecimento, lotes retomados, sincronização) no log do servidor
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 # ===============================
 # CONSTANTES
 # ===============================
-LIMITE_PRODUTOS = 23  # Limite máximo de produtos permitidos
+PRODUTOS_POR_FORMULARIO = LINHAS_POR_FORMULARIO  # Acima disso o download traz várias páginas (ZIP)
+INTERVALO_ACOMPANHAMENTO = 1  # Segundos entre as atualizações do progresso do lote
+DIAS_HISTORICO = 90  # Período exibido por padrão na aba HISTÓRICO
 
 # ===============================
 # SESSION STATE
 # ===============================
-if "workbook" not in st.session_state:
-    st.session_state.workbook = None
+# A sessão guarda só os dados do solicitante e as linhas dos produtos; tabelas e
+# rótulos derivados ficam em obter_sessoes() e o formulário é gerado no download
+if "sessao_id" not in st.session_state:
+    st.session_state.sessao_id = uuid.uuid4().hex
 
-if "excel_buffer" not in st.session_state:
-    st.session_state.excel_buffer = None
+if "solicitacao_iniciada" not in st.session_state:
+    st.session_state.solicitacao_iniciada = False
 
 if "produtos" not in st.session_state:
-    st.session_state.produtos = []
+    st.session_state.produtos = ListaProdutos()
 
 if "loja" not in st.session_state:
     st.session_state.loja = ""
@@ -50,91 +77,367 @@ if "mensagem_lote" not in st.session_state:
     st.session_state.mensagem_lote = None
 if "mensagem_produto" not in st.session_state:
     st.session_state.mensagem_produto = None
+if "mensagem_historico" not in st.session_state:
+    st.session_state.mensagem_historico = None
+
+# Trocar a chave do upload descarta o arquivo já enviado para o lote
+if "versao_upload" not in st.session_state:
+    st.session_state.versao_upload = 0
+
+# Lote em segundo plano: id da tarefa acompanhada pela sessão. Também fica na URL
+# (?lote=<id>) para que uma sessão nova, após queda de conexão, retome o acompanhamento
+if "tarefa_lote" not in st.session_state:
+    st.session_state.tarefa_lote = st.query_params.get("lote")
+    st.session_state.resumo_lote = None
 
 # ===============================
 # MAPEAMENTOS
 # ===============================
-TIPO_PLACA_MAP = {
-    "1 - OFERTA": 1,
-    "2 - PROMOÇÃO": 2,
-    "3 - SUPER OFERTA": 3,
-    "4 - MEGA OFERTA": 4,
-    "5 - SINALIZAÇÃO SIMPLES": 5
-}
-
-TAMANHO_PLACA_MAP = {
-    "A - FOLHA HORIZONTAL": "A",
-    "B - FOLHA VERTICAL": "B",
-    "C - MEIA FOLHA": "C",
-    "D - 1/4 FOLHA": "D",
-    "E - PORTA ETIQUETA": "E"
-}
-
-TAMANHO_PLACA_IMAGEM_MAP = {
-    "A - FOLHA HORIZONTAL": "imagens/HORIZONTAL.png",
-    "B - FOLHA RETRATO": "imagens/VERTICAL.png",
-    "C - MEIA FOLHA": "imagens/MEIA_FOLHA.jpg",
-    "D - 1/4 FOLHA": "imagens/UM_QUARTO_FOLHA.jpg",
-    "E - PORTA ETIQUETA": "imagens/ETIQUETA_GONDOLA.JFIF"
-}
+# TIPO_PLACA_MAP e TAMANHO_PLACA_MAP ficam em solicitar_placa.produtos
+# TAMANHO_PLACA_IMAGEM_MAP fica em solicitar_placa.assets
 
 # ===============================
 # FUNÇÕES AUXILIARES
 # ===============================
-def criar_planilha_from_scratch():
-    """Cria uma nova planilha com todos os produtos do session state"""
-    wb = load_workbook("solicitar placa.xlsx")
-    ws = wb.active
-    
-    # Limpar todas as linhas de produtos (da linha 16 em diante)
-    for row in range(16, ws.max_row + 1):
-        for col in range(2, 9):  # Colunas B a H
-            ws.cell(row=row, column=col).value = None
-    
-    # Preencher cabeçalho
-    ws["C7"].value = st.session_state.loja
-    ws["D7"].value = f"DATA: {st.session_state.data_solicitacao}"
-    ws["B9"].value = f"SOLICITANTE: {st.session_state.nome_solicitante}"
-    
-    # Preencher produtos (máximo LIMITE_PRODUTOS)
-    for i, produto in enumerate(st.session_state.produtos[:LIMITE_PRODUTOS]):
-        linha = 16 + i
-        ws.cell(row=linha, column=2).value = produto["Tipo Placa"]  # Coluna B
-        ws.cell(row=linha, column=3).value = produto["Tamanho Placa"]  # Coluna C
-        ws.cell(row=linha, column=4).value = produto["Fornecedor"]   # Coluna D
-        ws.cell(row=linha, column=5).value = produto["Código de Barras"]  # Coluna E
-        ws.cell(row=linha, column=6).value = produto["Identificador de Origem"]  # Coluna F
-        ws.cell(row=linha, column=7).value = produto["Descrição"]  # Coluna G
-    
-    # Salvar em buffer
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    st.session_state.workbook = wb
-    st.session_state.excel_buffer = buffer
-    
-    return buffer
-
-def verificar_limite_produtos():
-    """Verifica se atingiu o limite de produtos e retorna mensagem se necessário"""
+def criar_planilha_from_scratch(loja, data_solicitacao, nome_solicitante, produtos):
+    """Gera o formulário (ou o ZIP com várias páginas) a partir do modelo carregado uma vez por processo"""
+    return modelo_padrao().exportar(loja, data_solicitacao, nome_solicitante, produtos)
+
+def gerar_e_registrar(loja, data_solicitacao, nome_solicitante, produtos):
+    """Gera o formulário e grava a solicitação no histórico"""
+    arquivo = criar_planilha_from_scratch(loja, data_solicitacao, nome_solicitante, produtos)
+    obter_historico().registrar(loja, data_solicitacao, nome_solicitante, produtos)
+    return arquivo
+
+@st.cache_resource
+def obter_cliente():
+    """Cliente da API compartilhado por todas as sessões do servidor"""
+    return VarejoFacilClient(
+        x_api_key=st.secrets["api"]["x_api_key"],
+        cookie=st.secrets["api"]["cookie"],
+        url_base=st.secrets["api"].get("url_base") or os.environ.get("VAREJO_FACIL_URL", URL_BASE),
+        # Um único limitador por processo: o orçamento vale para todas as sessões
+        limitador=LimitadorRequisicoes(
+            float(st.secrets["api"].get(
+                "requisicoes_por_segundo", os.environ.get("VAREJO_FACIL_RPS", REQUISICOES_POR_SEGUNDO)
+            ))
+        )
+    )
+
+@st.cache_resource
+def obter_catalogo():
+    """Espelho local do cadastro, se configurado, com a sincronização periódica em segundo plano"""
+    configuracao = st.secrets.get("catalogo", {})
+    caminho = os.environ.get("SOLICITAR_PLACA_CATALOGO") or configuracao.get("caminho")
+    if not caminho:
+        return None
+    catalogo = CatalogoLocal(caminho)
+    SincronizadorCatalogo(obter_cliente(), catalogo).iniciar_periodico(
+        configuracao.get("intervalo_minutos", INTERVALO_SINCRONIZACAO / 60) * 60
+    )
+    return catalogo
+
+@st.cache_resource
+def obter_indice():
+    """Índice de busca por descrição/código, montado a partir do espelho local (None sem espelho)"""
+    catalogo = obter_catalogo()
+    if catalogo is None:
+        return None
+    # Montado pelo aquecimento (ou na primeira busca, se ela vier antes)
+    indice = IndiceBusca(catalogo)
+    METRICAS.registrar_medidor("busca", indice.estatisticas)
+    return indice
+
+def usar_codigo_encontrado(codigo):
+    """Leva o código escolhido na busca para o campo de código de barras"""
+    st.session_state.codigo_individual = codigo
+
+@st.cache_resource
+def obter_consulta():
+    """Caches de consulta (e espelho local, se houver) compartilhados por todas as sessões do servidor"""
+    consulta = ConsultaProdutos(obter_cliente(), catalogo=obter_catalogo())
+    consulta.registrar_metricas()
+    return consulta
+
+@st.cache_resource
+def obter_tarefas():
+    """Fila de lotes em segundo plano compartilhada por todas as sessões do servidor"""
+    caminho = os.environ.get("SOLICITAR_PLACA_TAREFAS") or st.secrets.get("tarefas", {}).get("caminho")
+    tarefas = GerenciadorTarefas(obter_consulta(), caminho)
+    METRICAS.registrar_medidor("tarefas", tarefas.estatisticas)
+    return tarefas
+
+@st.cache_resource
+def obter_historico():
+    """Histórico das solicitações geradas (em memória se nenhum arquivo for configurado)"""
+    caminho = os.environ.get("SOLICITAR_PLACA_HISTORICO") or st.secrets.get("historico", {}).get("caminho")
+    historico = HistoricoSolicitacoes(caminho)
+    METRICAS.registrar_medidor("historico", historico.estatisticas)
+    return historico
+
+def carregar_do_historico(solicitacao_id):
+    """Substitui a solicitação da sessão por uma do histórico, com a data de hoje e sem consultar a API"""
+    carregada = obter_historico().carregar(solicitacao_id)
+    if carregada is None:
+        return False
+    cabecalho, produtos = carregada
+    st.session_state.loja = cabecalho["loja"]
+    st.session_state.nome_solicitante = cabecalho["solicitante"] or ""
+    st.session_state.data_solicitacao = datetime.now().strftime('%d/%m/%Y')
+    st.session_state.solicitacao_iniciada = True
+    st.session_state.produtos = ListaProdutos(produtos)
+    if st.session_state.tarefa_lote:
+        obter_tarefas().cancelar(st.session_state.tarefa_lote)
+        acompanhar_tarefa(None)
+    return True
+
+def acompanhar_tarefa(tarefa_id):
+    """Associa a sessão (e a URL) ao lote em segundo plano; None encerra o acompanhamento"""
+    st.session_state.tarefa_lote = tarefa_id
+    st.session_state.resumo_lote = None
+    if tarefa_id:
+        st.query_params["lote"] = tarefa_id
+    elif "lote" in st.query_params:
+        del st.query_params["lote"]
+
+def incluir_resultados_lote(tarefa):
+    """Inclui na lista os produtos que o lote já consultou, a partir do último incluído"""
+    if st.session_state.resumo_lote is None:
+        st.session_state.resumo_lote = {
+            "incluidos": 0, "adicionados": 0, "desatualizados": 0, "nao_processados": 0,
+            "falha": [], "erro": [], "duplicados": []
+        }
+        if not st.session_state.solicitacao_iniciada:
+            # Sessão nova retomando o lote pela URL: recupera os dados do solicitante
+            st.session_state.loja = tarefa.parametros["loja"]
+            st.session_state.nome_solicitante = tarefa.parametros["nome_solicitante"]
+            st.session_state.data_solicitacao = tarefa.parametros["data_solicitacao"]
+            st.session_state.solicitacao_iniciada = True
+    resumo = st.session_state.resumo_lote
+
+    for posicao, codigo, situacao, dados in obter_tarefas().resultados(tarefa.id, resumo["incluidos"]):
+        if situacao == ENCONTRADO:
+            produto_info = Produto.de_consulta(
+                codigo, dados, tarefa.parametros["tipo_placa"], tarefa.parametros["tamanho_placa"]
+            )
+            if st.session_state.produtos.adicionar(produto_info):
+                resumo["adicionados"] += 1
+                resumo["desatualizados"] += bool(dados.get("desatualizado"))
+            else:
+                resumo["duplicados"].append({"Código de Barras": codigo, "Erro": "Duplicado"})
+        elif situacao == NAO_ENCONTRADO:
+            resumo["falha"].append({"Código de Barras": codigo, "Erro": "Não encontrado"})
+        elif situacao == DUPLICADO:
+            resumo["duplicados"].append({"Código de Barras": codigo, "Erro": "Duplicado"})
+        elif situacao == NAO_PROCESSADO:
+            resumo["nao_processados"] += 1
+        else:
+            resumo["erro"].append({"Código de Barras": codigo, "Erro": dados})
+        resumo["incluidos"] = posicao + 1
+
+def mensagem_fim_lote(tarefa):
+    """Resumo exibido quando o lote termina (concluído, cancelado ou com falha)"""
+    resumo = st.session_state.resumo_lote
+    duplicados = len(resumo["duplicados"]) + len(tarefa.duplicados)
+
+    processados = resumo["incluidos"] - resumo["nao_processados"]
+    if tarefa.estado == CANCELADA:
+        mensagem_detalhada = f"⏹️ Lote cancelado: {processados} de {tarefa.total} códigos processados.\n\n"
+    elif tarefa.estado == FALHOU:
+        mensagem_detalhada = (f"❌ O lote foi interrompido por uma falha: {tarefa.erro} "
+                              f"({processados} de {tarefa.total} códigos processados).\n\n")
+    else:
+        mensagem_detalhada = f"✅ Lote processado com sucesso!\n\n"
+    mensagem_detalhada += f"📊 **Resumo:**\n"
+    mensagem_detalhada += f"- ✅ Produtos adicionados: {resumo['adicionados']}\n"
+    if resumo["desatualizados"]:
+        mensagem_detalhada += f"- 🕒 Com dados da última consulta (API indisponível): {resumo['desatualizados']}\n"
+    mensagem_detalhada += f"- ❌ Produtos não encontrados: {len(resumo['falha'])}\n"
+    mensagem_detalhada += f"- ⚠️ Produtos duplicados: {duplicados}\n"
+    if resumo["erro"]:
+        mensagem_detalhada += f"- 🔌 Falhas na API (não consultados, tente novamente): {len(resumo['erro'])}\n"
+    if tarefa.rejeitados:
+        mensagem_detalhada += f"- 🚫 Códigos inválidos no arquivo: {len(tarefa.rejeitados)}\n"
+
+    total_produtos = len(st.session_state.produtos)
+    mensagem_detalhada += f"\n📈 **Total no formulário:** {total_produtos} "
+    mensagem_detalhada += f"({quantidade_formularios(total_produtos)} página(s) de até {PRODUTOS_POR_FORMULARIO} produtos)"
+    if resumo["falha"]:
+        codigos_falha = " ".join(produto["Código de Barras"] for produto in resumo["falha"])
+        mensagem_detalhada += f"\n\n❌ **Códigos não encontrados:** `{codigos_falha}`"
+    if resumo["erro"]:
+        # Um código por linha, em bloco com botão de copiar: pronto para colar de novo no campo de códigos
+        codigos_erro = "\n".join(produto["Código de Barras"] for produto in resumo["erro"])
+        mensagem_detalhada += f"\n\n🔌 **Códigos não consultados por falha na API:**\n\n```\n{codigos_erro}\n```"
+    return mensagem_detalhada
+
+@st.fragment(run_every=INTERVALO_ACOMPANHAMENTO)
+def progresso_lote():
+    """Acompanha o lote em segundo plano, incluindo os produtos na lista à medida que são consultados"""
+    tarefa = obter_tarefas().obter(st.session_state.tarefa_lote)
+    if tarefa is None:
+        acompanhar_tarefa(None)
+        st.warning("⚠️ O lote acompanhado não está mais disponível no servidor.")
+        return
+
+    if tarefa.rejeitados:
+        st.warning(f"⚠️ {len(tarefa.rejeitados)} códigos inválidos foram ignorados (nenhuma consulta feita):")
+        st.dataframe(pd.DataFrame(tarefa.rejeitados), use_container_width=True)
+
+    incluir_resultados_lote(tarefa)
+
+    # O estado é lido antes dos resultados: finalizada, todos os itens já têm situação e foram incluídos
+    if tarefa.finalizada:
+        st.session_state.mensagem_lote = mensagem_fim_lote(tarefa)
+        acompanhar_tarefa(None)
+        # Atualizar também as outras abas com os produtos incluídos
+        st.rerun()
+
+    # Os códigos terminam fora de ordem: a barra conta todos, a lista inclui na ordem do arquivo
+    concluidos = tarefa.concluidos
+    st.progress(concluidos / tarefa.total if tarefa.total else 0.0)
+    st.text(f"Processando {concluidos} de {tarefa.total} produtos... "
+            "O lote continua no servidor mesmo se você trocar de aba.")
+    if st.button("⏹️ Cancelar lote", key="cancelar_lote"):
+        obter_tarefas().cancelar(tarefa.id)
+
+@st.cache_resource
+def obter_aquecimento():
+    """Modelo, previews, conexões com a API e índice de busca preparados em segundo plano, uma vez por processo"""
+    configuracao = st.secrets.get("aquecimento", {})
+    # Os recursos compartilhados são criados aqui; a thread de fundo só faz o trabalho pesado
+    cliente, consulta, indice = obter_cliente(), obter_consulta(), obter_indice()
+    etapas = [
+        ("modelo", aquecer_modelo),
+        ("previews", aquecer_previews),
+        ("conexoes", partial(cliente.abrir_conexoes, configuracao.get("conexoes", CONEXOES_AQUECIMENTO)))
+    ]
+    if indice is not None:
+        etapas.append(("busca", indice.atualizar_do_catalogo))
+    if configuracao.get("pre_carregar", 0):
+        etapas.append(("pre_carga", partial(pre_carregar, consulta, obter_historico(), configuracao["pre_carregar"])))
+
+    aquecimento = Aquecimento(etapas).iniciar()
+    METRICAS.registrar_medidor("aquecimento", aquecimento.estatisticas)
+    return aquecimento
+
+@st.cache_resource
+def servidor_metricas():
+    """Servidor local de /metrics e /pronto, iniciado uma vez por processo se a porta estiver configurada"""
+    porta = os.environ.get("SOLICITAR_PLACA_METRICAS_PORTA") or st.secrets.get("metricas", {}).get("porta")
+    if not porta:
+        return None
+    return iniciar_servidor_metricas(int(porta), pronto=obter_aquecimento().pronto)
+
+@st.cache_resource
+def carregar_previews():
+    """Imagens dos tamanhos de placa já reduzidas, preparadas uma vez por processo"""
+    return preparar_previews(list(TAMANHO_PLACA_MAP))
+
+def mostrar_preview(tamanho_placa):
+    """Exibe a imagem do tamanho de placa selecionado"""
+    imagem = carregar_previews().get(tamanho_placa)
+    if imagem is None:
+        st.warning(f"Imagem não encontrada: {TAMANHO_PLACA_IMAGEM_MAP.get(tamanho_placa, tamanho_placa)}")
+        st.info("Verifique se o arquivo existe na pasta 'imagens/'")
+        return
+
+    col_img1, col_img2, col_img3 = st.columns([1, 2, 1])
+    with col_img2:
+        st.markdown(f"**Visualização:** {tamanho_placa.split(' - ')[1]}")
+        st.image(imagem, width=LARGURA_PREVIEW)
+
+@st.cache_resource
+def obter_sessoes():
+    """Memória e dados derivados das sessões, com descarte das ociosas"""
+    sessoes = RegistroSessoes()
+    METRICAS.registrar_medidor("sessoes", sessoes.estatisticas)
+    return sessoes
+
+def memo_versao(nome, calcular):
+    """Resultado de `calcular()` reaproveitado até a lista de produtos mudar de versão (ou a sessão ficar ociosa)"""
+    return obter_sessoes().memo(st.session_state.sessao_id, nome, st.session_state.produtos.versao, calcular)
+
+def resumo_formularios():
+    """Texto com a quantidade de produtos e de páginas do formulário"""
     quantidade_atual = len(st.session_state.produtos)
-    
-    if quantidade_atual >= LIMITE_PRODUTOS:
-        produtos_excedentes = quantidade_atual - LIMITE_PRODUTOS
-        return f"⚠️ LIMITE ATINGIDO! O formulário suporta apenas {LIMITE_PRODUTOS} produtos. Você já tem {quantidade_atual} produtos ({produtos_excedentes} excedentes)."
-    
-    return None
+    paginas = quantidade_formularios(quantidade_atual)
+    texto = f"📊 **Produtos solicitados:** {quantidade_atual}"
+    if paginas > 1:
+        texto += f" | **Formulários:** {paginas} (até {PRODUTOS_POR_FORMULARIO} produtos cada)"
+    return texto
+
+def acesso_admin():
+    """True se a URL trouxer ?admin=<token> igual ao token em secrets [admin]"""
+    token = st.secrets.get("admin", {}).get("token")
+    return bool(token) and st.query_params.get("admin") == token
+
+def pagina_metricas():
+    """Página oculta com as métricas do processo (chamadas à API, caches, formulários e lotes)"""
+    st.subheader("🔧 Métricas do servidor")
+    metricas = METRICAS.como_dict()
+
+    st.markdown("**Chamadas à API do Varejo Fácil**")
+    chamadas = [
+        {"Endpoint": serie["rotulos"].get("endpoint"), "Status": serie["rotulos"].get("status"),
+         "Chamadas": serie["total"], "p50 (ms)": serie["p50"] * 1000,
+         "p95 (ms)": serie["p95"] * 1000, "p99 (ms)": serie["p99"] * 1000}
+        for serie in metricas["histogramas"].get("api_requisicao_segundos", [])
+    ]
+    if chamadas:
+        st.dataframe(pd.DataFrame(chamadas).sort_values(["Endpoint", "Status"]), use_container_width=True)
+    else:
+        st.info("Nenhuma chamada registrada desde o início do processo.")
+
+    st.markdown("**Formulários, lotes e aquecimento**")
+    tempos = [
+        {"Métrica": nome, **serie["rotulos"], "Total": serie["total"], "p50 (ms)": serie["p50"] * 1000,
+         "p95 (ms)": serie["p95"] * 1000, "p99 (ms)": serie["p99"] * 1000}
+        for nome in ("formulario_segundos", "lote_segundos", "aquecimento_segundos")
+        for serie in metricas["histogramas"].get(nome, [])
+    ]
+    if tempos:
+        st.dataframe(pd.DataFrame(tempos), use_container_width=True)
+    itens_lote = {serie["rotulos"]["resultado"]: serie["valor"] for serie in metricas["contadores"].get("lote_itens_total", [])}
+    if itens_lote:
+        st.markdown("Itens de lote por resultado: " + ", ".join(f"{nome}: {valor}" for nome, valor in itens_lote.items()))
+
+    st.markdown("**Caches**")
+    if metricas["medidores"]:
+        st.dataframe(pd.DataFrame(metricas["medidores"]).T, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 JSON", data=METRICAS.como_json(), file_name="metricas.json",
+                           mime="application/json", key="download_metricas_json")
+    with col2:
+        st.download_button("📥 Prometheus", data=METRICAS.como_prometheus(), file_name="metricas.prom",
+                           mime="text/plain", key="download_metricas_prometheus")
+
+obter_aquecimento()
+servidor_metricas()
+
+if acesso_admin():
+    obter_consulta()  # Registra os caches mesmo antes da primeira consulta
+    pagina_metricas()
+    st.stop()
 
 # ===============================
 # ABAS
 # ===============================
-tab_individual, tab_lote, tab_relatorio = st.tabs(["📝 INDIVIDUAL", "📦 LOTE", "📊 RELATÓRIO"])
+tab_individual, tab_lote, tab_relatorio, tab_historico = st.tabs(
+    ["📝 INDIVIDUAL", "📦 LOTE", "📊 RELATÓRIO", "🕘 HISTÓRICO"]
+)
+
+# Cada aba é um fragmento: interações que não alteram a lista de produtos
+# (seleções, consultas sem sucesso, uploads) reexecutam apenas a própria aba.
+# Inclusões e remoções chamam st.rerun() para atualizar as demais.
 
 # ======================================================
 # ABA INDIVIDUAL (antiga SOLICITAR)
 # ======================================================
-with tab_individual:
+@st.fragment
+def aba_individual():
     st.subheader("Dados do solicitante")
 
     col1, col2 = st.columns([2, 1])
@@ -143,14 +446,10 @@ with tab_individual:
         nome_solicitante = st.text_input("Nome do solicitante")
 
     with col2:
-        loja = st.selectbox("Loja", ["MIMI", "KAMI", "TOTAL MIX"])
+        loja = st.selectbox("Loja", LOJAS)
 
     # Exibir contador de produtos atual
-    quantidade_atual = len(st.session_state.produtos)
-    st.info(f"📊 **Produtos solicitados:** {quantidade_atual}/{LIMITE_PRODUTOS}")
-    
-    if quantidade_atual >= LIMITE_PRODUTOS:
-        st.warning(f"🚫 **LIMITE ATINGIDO!** Você já atingiu o limite máximo de {LIMITE_PRODUTOS} produtos.")
+    st.info(resumo_formularios())
 
     # Botão para iniciar solicitação
     if st.button("Iniciar solicitação", key="iniciar_individual"):
@@ -158,28 +457,21 @@ with tab_individual:
             st.warning("⚠️ Informe o nome do solicitante.")
             st.session_state.mensagem_sucesso = None
         else:
-            wb = load_workbook("solicitar placa.xlsx")
-            ws = wb.active
-
-            ws["C7"].value = loja
-            ws["D7"].value = f"DATA: {datetime.now().strftime('%d/%m/%Y')}"
-            ws["E7"].value = f"SOLICITANTE: {nome_solicitante}"
-            
-            # Salvar informações no session state
+            # Salvar informações no session state (o formulário só é gerado no download)
             st.session_state.loja = loja
             st.session_state.nome_solicitante = nome_solicitante
             st.session_state.data_solicitacao = datetime.now().strftime('%d/%m/%Y')
-
-            # Criar buffer da planilha
-            buffer = BytesIO()
-            wb.save(buffer)
-            buffer.seek(0)
-            
-            st.session_state.workbook = wb
-            st.session_state.excel_buffer = buffer
-            st.session_state.produtos = []
+            st.session_state.solicitacao_iniciada = True
+            st.session_state.produtos = ListaProdutos()
+            if st.session_state.tarefa_lote:
+                # O lote em andamento pertence à solicitação anterior
+                obter_tarefas().cancelar(st.session_state.tarefa_lote)
+                acompanhar_tarefa(None)
             st.session_state.mensagem_sucesso = "✅ Solicitação iniciada com sucesso!"
 
+            # Atualizar também as outras abas (fora deste fragmento)
+            st.rerun()
+
     # Exibir mensagem de sucesso se existir
     if st.session_state.mensagem_sucesso:
         st.success(st.session_state.mensagem_sucesso)
@@ -189,6 +481,26 @@ with tab_individual:
     st.markdown("---")
     st.subheader("Consulta de produto")
 
+    # Busca no espelho local (sem consultar a API a cada pesquisa)
+    indice = obter_indice()
+    if indice is not None:
+        texto_busca = st.text_input(
+            "🔎 Buscar por descrição, identificador de origem ou parte do código", key="busca_individual"
+        )
+        if texto_busca.strip():
+            encontrados = [produto for produto in indice.buscar(texto_busca) if produto["codigos"]]
+            if not encontrados:
+                st.caption("Nenhum produto encontrado no cadastro local.")
+            else:
+                rotulos_busca = {
+                    produto["codigos"][0]: f"{produto['codigos'][0]} - {produto['descricao']} ({produto['origem']})"
+                    for produto in encontrados
+                }
+                escolhido = st.selectbox("Resultados", list(rotulos_busca), format_func=rotulos_busca.get,
+                                         key="resultado_busca")
+                st.button("Usar este código", key="usar_resultado_busca",
+                          on_click=usar_codigo_encontrado, args=(escolhido,))
+
     col1, col2, col3 = st.columns([2, 2, 2])
     
     with col1:
@@ -201,99 +513,58 @@ with tab_individual:
         tamanho_placa = st.selectbox("Tamanho da placa", list(TAMANHO_PLACA_MAP.keys()), key="tamanho_individual")
     
     # Mostrar imagem do tamanho selecionado
-    if tamanho_placa in TAMANHO_PLACA_IMAGEM_MAP:
-        imagem_path = TAMANHO_PLACA_IMAGEM_MAP[tamanho_placa]
-        try:
-            col_img1, col_img2, col_img3 = st.columns([1, 2, 1])
-            with col_img2:
-                st.markdown(f"**Visualização:** {tamanho_placa.split(' - ')[1]}")
-                st.image(imagem_path, width=300)
-        except Exception as e:
-            st.warning(f"Imagem não encontrada: {imagem_path}")
-            st.info("Verifique se o arquivo existe na pasta 'imagens/'")
+    mostrar_preview(tamanho_placa)
+
+    forcar_atualizacao = st.checkbox(
+        "🔄 Ignorar cache e consultar novamente na API",
+        key="forcar_individual",
+        help="Use quando o cadastro do produto foi alterado recentemente no Varejo Fácil."
+    )
 
     # Botão para consultar produto
     if st.button("Consultar Produto", key="consultar_individual"):
-        if not st.session_state.workbook:
+        # Erros de digitação e leituras duplicadas do leitor são rejeitados sem ir à API
+        codigo_valido, motivo_invalido = validar_codigo(codigo_barras)
+        if not st.session_state.solicitacao_iniciada:
             st.error("❌ Inicie a solicitação antes.")
             st.session_state.mensagem_produto = None
         elif not codigo_barras.strip():
             st.warning("⚠️ Por favor, digite um código de barras válido.")
             st.session_state.mensagem_produto = None
-        elif any(p["Código de Barras"] == str(codigo_barras) for p in st.session_state.produtos):
-            st.error("❌ PRODUTO JÁ SOLICITADO. POR FAVOR, COLOQUE OUTRO CÓDIGO DE BARRAS.")
+        elif codigo_valido is None:
+            st.error(f"❌ Código de barras inválido: {motivo_invalido}.")
             st.session_state.mensagem_produto = None
-        elif len(st.session_state.produtos) >= LIMITE_PRODUTOS:
-            st.error(f"🚫 LIMITE ATINGIDO! O formulário suporta apenas {LIMITE_PRODUTOS} produtos. Não é possível adicionar mais produtos.")
+        elif codigo_valido in st.session_state.produtos:
+            st.error("❌ PRODUTO JÁ SOLICITADO. POR FAVOR, COLOQUE OUTRO CÓDIGO DE BARRAS.")
             st.session_state.mensagem_produto = None
         else:
-            headers = {
-                'x-api-key': st.secrets["api"]["x_api_key"],
-                'Cookie': st.secrets["api"]["cookie"]
-            }
-
             try:
-                url_1 = f"https://lojasmimi.varejofacil.com/api/v1/produto/produtos/consulta/0{codigo_barras}"
-                response_1 = requests.get(url_1, headers=headers)
+                dados = obter_consulta().consultar(codigo_valido, forcar_atualizacao=forcar_atualizacao)
 
-                if response_1.status_code != 200:
+                if dados is None:
                     st.error("❌ Produto não encontrado.")
                     st.session_state.mensagem_produto = None
                 else:
-                    dados_produto = response_1.json()
-                    produto_id = dados_produto.get("id")
-                    descricao = dados_produto.get("descricao")
-                    ref = dados_produto.get("identificadorDeOrigem")
-
                     # Exibir mensagem de sucesso imediatamente
                     st.session_state.mensagem_produto = "✅ Produto encontrado com sucesso!"
-                    
-                    url_2 = f"https://lojasmimi.varejofacil.com/api/v1/produto/produtos/{produto_id}/precos"
-                    requests.get(url_2, headers=headers)
-
-                    fornecedor_nome = "Não encontrado"
-                    url_3 = f"https://lojasmimi.varejofacil.com/api/v1/produto/produtos/{produto_id}/fornecedores"
-                    response_3 = requests.get(url_3, headers=headers)
-
-                    if response_3.status_code == 200:
-                        items = response_3.json().get("items", [])
-                        if items:
-                            fornecedor_id = items[0].get("fornecedorId")
-                            url_4 = f"https://lojasmimi.varejofacil.com/api/v1/pessoa/fornecedores?q=id=={fornecedor_id}"
-                            response_4 = requests.get(url_4, headers=headers)
-                            if response_4.status_code == 200:
-                                forn_items = response_4.json().get("items", [])
-                                if forn_items:
-                                    fornecedor_nome = forn_items[0].get("fantasia")
-
-                    produto_info = {
-                        "Código de Barras": str(codigo_barras),
-                        "Descrição": descricao,
-                        "Fornecedor": fornecedor_nome,
-                        "Identificador de Origem": ref,
-                        "Tipo Placa": TIPO_PLACA_MAP[tipo_placa],
-                        "Tamanho Placa": TAMANHO_PLACA_MAP[tamanho_placa]
-                    }
-
-                    st.session_state.produtos.append(produto_info)
-                    
-                    # Verificar limite após adicionar
-                    limite_msg = verificar_limite_produtos()
-                    if limite_msg:
-                        st.warning(limite_msg)
-                    
-                    # Recriar a planilha do zero
-                    criar_planilha_from_scratch()
-                    
-                    # Atualizar mensagem
-                    if len(st.session_state.produtos) <= LIMITE_PRODUTOS:
-                        st.session_state.mensagem_produto = "✅ Produto registrado corretamente!"
-                    else:
-                        st.session_state.mensagem_produto = f"⚠️ Produto registrado, mas ATENÇÃO: limite de {LIMITE_PRODUTOS} produtos excedido!"
+
+                    produto_info = Produto.de_consulta(
+                        codigo_valido, dados, TIPO_PLACA_MAP[tipo_placa], TAMANHO_PLACA_MAP[tamanho_placa]
+                    )
+
+                    st.session_state.produtos.adicionar(produto_info)
+                    st.session_state.mensagem_produto = "✅ Produto registrado corretamente!"
+                    if dados.get("desatualizado"):
+                        st.session_state.mensagem_produto += (
+                            " (API indisponível: usados os dados da última consulta, que podem estar desatualizados)"
+                        )
                     
                     # Forçar rerun para atualizar a lista
                     st.rerun()
 
+            except requests.RequestException as e:
+                st.error(f"❌ {descrever_falha(e)}. O produto não foi consultado; tente novamente em instantes.")
+                st.session_state.mensagem_produto = None
             except Exception as e:
                 st.exception(e)
                 st.session_state.mensagem_produto = None
@@ -303,10 +574,14 @@ with tab_individual:
         st.success(st.session_state.mensagem_produto)
         # Não limpamos imediatamente, deixamos visível
 
+with tab_individual:
+    aba_individual()
+
 # ======================================================
 # ABA LOTE
 # ======================================================
-with tab_lote:
+@st.fragment
+def aba_lote():
     st.subheader("Solicitação em Lote")
     
     # Texto explicativo adicionado
@@ -344,9 +619,15 @@ with tab_lote:
 
     st.markdown("---")
     
-    st.markdown("📤 **Passo 2:** Faça upload do arquivo Excel preenchido com os códigos de barras.")
+    st.markdown("📤 **Passo 2:** Faça upload do arquivo Excel (ou CSV/TXT) preenchido com os códigos de barras, ou cole os códigos abaixo.")
+
+    arquivo_lote = st.file_uploader(
+        "Selecione o arquivo",
+        type=[extensao.lstrip(".") for extensao in EXTENSOES_PLANILHA + EXTENSOES_TEXTO],
+        key=f"upload_lote_{st.session_state.versao_upload}"
+    )
 
-    arquivo_lote = st.file_uploader("Selecione o arquivo Excel", type=["xlsx"], key="upload_lote")
+    codigos_colados = st.text_area("Ou cole os códigos de barras (um por linha)", key="colar_lote", height=120)
 
     st.markdown("---")
     
@@ -361,236 +642,108 @@ with tab_lote:
         tamanho_placa_lote = st.selectbox("Tamanho da placa (LOTE)", list(TAMANHO_PLACA_MAP.keys()), key="tamanho_lote")
     
     # Mostrar imagem do tamanho selecionado na aba LOTE
-    if tamanho_placa_lote in TAMANHO_PLACA_IMAGEM_MAP:
-        imagem_path_lote = TAMANHO_PLACA_IMAGEM_MAP[tamanho_placa_lote]
-        try:
-            col_img_lote1, col_img_lote2, col_img_lote3 = st.columns([1, 2, 1])
-            with col_img_lote2:
-                st.markdown(f"**Visualização:** {tamanho_placa_lote.split(' - ')[1]}")
-                st.image(imagem_path_lote, width=300)
-        except Exception as e:
-            st.warning(f"Imagem não encontrada: {imagem_path_lote}")
-            st.info("Verifique se o arquivo existe na pasta 'imagens/'")
+    mostrar_preview(tamanho_placa_lote)
 
     # Exibir contador atual
-    quantidade_atual = len(st.session_state.produtos)
-    espaco_disponivel = max(0, LIMITE_PRODUTOS - quantidade_atual)
-    st.info(f"📊 **Produtos solicitados:** {quantidade_atual}/{LIMITE_PRODUTOS} | **Espaço disponível:** {espaco_disponivel}")
-    
-    if quantidade_atual >= LIMITE_PRODUTOS:
-        st.warning(f"🚫 **LIMITE ATINGIDO!** Você já atingiu o limite máximo de {LIMITE_PRODUTOS} produtos.")
-    elif espaco_disponivel < 10:
-        st.warning(f"⚠️ **ATENÇÃO:** Apenas {espaco_disponivel} espaços disponíveis no formulário.")
+    st.info(resumo_formularios())
 
     st.markdown("---")
     
     st.markdown("🚀 **Passo 4:** Clique no botão abaixo para processar todos os produtos de uma única vez.")
 
-    # Botão para processar lote
-    if st.button("▶️ PROCESSAR LOTE COMPLETO", key="processar_lote", type="primary"):
-        if not st.session_state.workbook:
+    # Botão para processar lote: a leitura e as consultas rodam em segundo plano,
+    # então o lote continua mesmo se a página for reexecutada ou a aba trocada
+    if st.button("▶️ PROCESSAR LOTE COMPLETO", key="processar_lote", type="primary",
+                 disabled=bool(st.session_state.tarefa_lote)):
+        if not st.session_state.solicitacao_iniciada:
             st.error("❌ Inicie a solicitação na aba INDIVIDUAL antes de processar o lote.")
             st.session_state.mensagem_lote = None
-        elif not arquivo_lote:
-            st.warning("⚠️ Faça upload de um arquivo válido.")
-            st.session_state.mensagem_lote = None
-        elif quantidade_atual >= LIMITE_PRODUTOS:
-            st.error(f"🚫 LIMITE ATINGIDO! O formulário já está com {LIMITE_PRODUTOS} produtos. Não é possível processar mais produtos.")
+        elif not arquivo_lote and not codigos_colados.strip():
+            st.warning("⚠️ Faça upload de um arquivo válido ou cole os códigos de barras.")
             st.session_state.mensagem_lote = None
         else:
             try:
-                df_lote = pd.read_excel(arquivo_lote)
-                codigos = df_lote["CODIGO DE BARRAS"].astype(str).tolist()
-                
-                # Verificar quantos produtos podem ser adicionados
-                espaco_disponivel = LIMITE_PRODUTOS - quantidade_atual
-                codigos_para_processar = codigos[:espaco_disponivel]
-                codigos_excedentes = codigos[espaco_disponivel:] if len(codigos) > espaco_disponivel else []
-                
-                # Aviso sobre produtos excedentes
-                if codigos_excedentes:
-                    st.warning(f"⚠️ **ATENÇÃO:** O arquivo contém {len(codigos)} produtos, mas apenas {espaco_disponivel} serão processados devido ao limite do formulário.")
-                    st.info(f"📋 {len(codigos_excedentes)} produtos serão ignorados por falta de espaço.")
-
-                produtos_sucesso = []
-                produtos_falha = []
-                produtos_duplicados = []
-
-                # Criar barra de progresso
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                total_processar = len(codigos_para_processar)
-
-                headers = {
-                    'x-api-key': st.secrets["api"]["x_api_key"],
-                    'Cookie': st.secrets["api"]["cookie"]
-                }
-
-                for i, codigo in enumerate(codigos_para_processar, start=1):
-                    time.sleep(0.05)
-                    progresso = i / total_processar
-                    progress_bar.progress(progresso)
-                    status_text.text(f"Processando {i} de {total_processar} produtos...")
-
-                    # Verificar duplicado
-                    if any(p["Código de Barras"] == codigo for p in st.session_state.produtos):
-                        produtos_duplicados.append({"Código de Barras": codigo, "Erro": "Duplicado"})
-                        continue
-
-                    url_1 = f"https://lojasmimi.varejofacil.com/api/v1/produto/produtos/consulta/0{codigo}"
-                    response_1 = requests.get(url_1, headers=headers)
-
-                    if response_1.status_code != 200:
-                        produtos_falha.append({"Código de Barras": codigo, "Erro": "Não encontrado"})
-                        continue
-
-                    dados_produto = response_1.json()
-                    produto_id = dados_produto.get("id")
-                    descricao = dados_produto.get("descricao")
-                    ref = dados_produto.get("identificadorDeOrigem")
-
-                    fornecedor_nome = "Não encontrado"
-                    url_3 = f"https://lojasmimi.varejofacil.com/api/v1/produto/produtos/{produto_id}/fornecedores"
-                    response_3 = requests.get(url_3, headers=headers)
-
-                    if response_3.status_code == 200:
-                        items = response_3.json().get("items", [])
-                        if items:
-                            fornecedor_id = items[0].get("fornecedorId")
-                            url_4 = f"https://lojasmimi.varejofacil.com/api/v1/pessoa/fornecedores?q=id=={fornecedor_id}"
-                            response_4 = requests.get(url_4, headers=headers)
-                            if response_4.status_code == 200:
-                                forn_items = response_4.json().get("items", [])
-                                if forn_items:
-                                    fornecedor_nome = forn_items[0].get("fantasia")
-
-                    produto_info = {
-                        "Código de Barras": codigo,
-                        "Descrição": descricao,
-                        "Fornecedor": fornecedor_nome,
-                        "Identificador de Origem": ref,
-                        "Tipo Placa": TIPO_PLACA_MAP[tipo_placa_lote],
-                        "Tamanho Placa": TAMANHO_PLACA_MAP[tamanho_placa_lote]
-                    }
-
-                    st.session_state.produtos.append(produto_info)
-                    produtos_sucesso.append(produto_info)
-
-                # Limpar barra de progresso
-                progress_bar.empty()
-                status_text.empty()
-
-                # Recriar a planilha do zero após processar todos os produtos
-                criar_planilha_from_scratch()
-
-                # Criar mensagem de sucesso detalhada
-                mensagem_detalhada = f"✅ Lote processado com sucesso!\n\n"
-                mensagem_detalhada += f"📊 **Resumo:**\n"
-                mensagem_detalhada += f"- ✅ Produtos adicionados: {len(produtos_sucesso)}\n"
-                mensagem_detalhada += f"- ❌ Produtos não encontrados: {len(produtos_falha)}\n"
-                mensagem_detalhada += f"- ⚠️ Produtos duplicados: {len(produtos_duplicados)}\n"
-                
-                if codigos_excedentes:
-                    mensagem_detalhada += f"- 🚫 Produtos excedentes (não processados): {len(codigos_excedentes)}\n"
-                
-                mensagem_detalhada += f"\n📈 **Total no formulário:** {len(st.session_state.produtos)}/{LIMITE_PRODUTOS}"
-                
-                st.session_state.mensagem_lote = mensagem_detalhada
-                
-                # Exibir mensagem imediatamente
-                st.success("✅ Lote processado com sucesso!")
-                st.markdown(mensagem_detalhada)
-
-                # Mostrar produtos que falharam
-                if produtos_falha:
-                    st.markdown("### ❌ Produtos não encontrados")
-                    df_falha = pd.DataFrame(produtos_falha)
-                    st.dataframe(df_falha, use_container_width=True)
-                
-                # Mostrar produtos duplicados
-                if produtos_duplicados:
-                    st.markdown("### ⚠️ Produtos duplicados (já existentes)")
-                    df_duplicados = pd.DataFrame(produtos_duplicados)
-                    st.dataframe(df_duplicados, use_container_width=True)
-                
-                # Mostrar produtos excedentes
-                if codigos_excedentes:
-                    st.markdown("### 🚫 Produtos excedentes (não processados por limite)")
-                    df_excedentes = pd.DataFrame({
-                        "Código de Barras": codigos_excedentes,
-                        "Motivo": f"Limite de {LIMITE_PRODUTOS} produtos atingido"
-                    })
-                    st.dataframe(df_excedentes, use_container_width=True)
-                    st.info(f"⚠️ **Recomendação:** Processe os {len(codigos_excedentes)} produtos restantes em um novo lote após limpar o formulário.")
-                    
-                # Forçar rerun para atualizar
-                st.rerun()
-
+                tarefa_id = obter_tarefas().enviar(
+                    {
+                        "tipo_placa": TIPO_PLACA_MAP[tipo_placa_lote],
+                        "tamanho_placa": TAMANHO_PLACA_MAP[tamanho_placa_lote],
+                        "loja": st.session_state.loja,
+                        "nome_solicitante": st.session_state.nome_solicitante,
+                        "data_solicitacao": st.session_state.data_solicitacao
+                    },
+                    arquivo=arquivo_lote.getvalue() if arquivo_lote else None,
+                    nome_arquivo=arquivo_lote.name if arquivo_lote else None,
+                    texto=None if arquivo_lote else codigos_colados,
+                    # Produtos já no formulário não são consultados de novo
+                    ignorar=st.session_state.produtos.codigos()
+                )
             except Exception as e:
                 st.exception(e)
                 st.session_state.mensagem_lote = None
+            else:
+                # Fora do try: o lote já está na fila, um erro daqui em diante não é falha no envio
+                acompanhar_tarefa(tarefa_id)
+                st.session_state.mensagem_lote = None
+                st.session_state.versao_upload += 1  # O lote já tem o conteúdo: libera o arquivo da sessão
+                st.rerun(scope="fragment")
+
+    # Lote em andamento: o progresso é atualizado sozinho até o fim
+    if st.session_state.tarefa_lote:
+        progresso_lote()
 
     # Exibir mensagem do lote se existir (para quando a página recarrega)
     if st.session_state.mensagem_lote:
         st.success("✅ Lote processado anteriormente")
         st.markdown(st.session_state.mensagem_lote)
 
+with tab_lote:
+    aba_lote()
+
 # ======================================================
 # ABA RELATÓRIO
 # ======================================================
-with tab_relatorio:
+@st.fragment
+def aba_relatorio():
     st.subheader("Produtos solicitados")
     
     # Mostrar contador
-    quantidade_atual = len(st.session_state.produtos)
-    st.info(f"📊 **Total de produtos:** {quantidade_atual}/{LIMITE_PRODUTOS}")
-    
-    if quantidade_atual > LIMITE_PRODUTOS:
-        st.error(f"🚫 **ATENÇÃO:** O formulário tem {quantidade_atual} produtos, mas suporta apenas {LIMITE_PRODUTOS}. "
-                f"Os primeiros {LIMITE_PRODUTOS} serão incluídos na planilha.")
+    st.info(resumo_formularios())
 
     if st.session_state.produtos:
-        # Mostrar apenas os produtos que cabem no formulário
-        produtos_para_exibir = st.session_state.produtos[:LIMITE_PRODUTOS]
-        produtos_excedentes = st.session_state.produtos[LIMITE_PRODUTOS:] if quantidade_atual > LIMITE_PRODUTOS else []
-        
-        df = pd.DataFrame(produtos_para_exibir)
+        produtos = st.session_state.produtos
+        df = memo_versao("relatorio", lambda: pd.DataFrame(produtos.como_registros()))
+
+        # Preços são consultados apenas sob demanda
+        if st.checkbox("💲 Mostrar preços", key="mostrar_precos"):
+            try:
+                df = memo_versao("relatorio_precos", lambda: pd.concat(
+                    [df, pd.DataFrame(obter_consulta().precos_lote(produtos.codigos()))], axis=1
+                ))
+            except requests.RequestException as e:
+                st.warning(f"⚠️ Não foi possível consultar os preços: {e}")
+
         st.dataframe(df, use_container_width=True)
-        
-        # Mostrar alerta sobre produtos excedentes
-        if produtos_excedentes:
-            st.warning(f"⚠️ **ATENÇÃO:** {len(produtos_excedentes)} produtos excedem o limite do formulário e NÃO serão incluídos na planilha:")
-            df_excedentes = pd.DataFrame(produtos_excedentes)
-            st.dataframe(df_excedentes, use_container_width=True)
-            st.error(f"🚫 **Ação necessária:** Remova {len(produtos_excedentes)} produtos para não perder informações.")
 
         st.markdown("---")
         st.subheader("🗑️ Remover produto")
 
-        # Criar opções para remoção (incluindo produtos excedentes)
-        options = []
-        for i, p in enumerate(st.session_state.produtos):
-            descricao_curta = p["Descrição"][:50] + "..." if len(p["Descrição"]) > 50 else p["Descrição"]
-            marcador = "🚫 " if i >= LIMITE_PRODUTOS else ""
-            options.append(f'{marcador}{p["Código de Barras"]} - {descricao_curta}')
-
-        remover = st.selectbox("Selecione o produto para remover", options, key="remover_produto")
+        # Opções para remoção: o valor é o próprio código de barras
+        rotulos = memo_versao("opcoes_remocao", lambda: {
+            produto.codigo_barras: f"{produto.codigo_barras} - {produto.descricao_curta()}" for produto in produtos
+        })
+        remover = st.selectbox(
+            "Selecione o produto para remover",
+            list(rotulos),
+            format_func=rotulos.get,
+            key="remover_produto"
+        )
 
         if st.button("Remover produto", key="remover_botao"):
-            # Encontrar o índice correto
-            idx = options.index(remover)
-            
-            # Remover do session state
-            produto_removido = st.session_state.produtos.pop(idx)
-            
-            # Recriar a planilha do zero
-            criar_planilha_from_scratch()
+            # Remover do session state pelo código de barras
+            produto_removido = st.session_state.produtos.remover(remover)
 
             # Exibir mensagem de sucesso
-            mensagem_remocao = f"🗑️ Produto '{produto_removido['Descrição'][:30]}...' removido com sucesso."
-            if len(st.session_state.produtos) < LIMITE_PRODUTOS:
-                mensagem_remocao += f" Agora há {LIMITE_PRODUTOS - len(st.session_state.produtos)} espaços disponíveis."
-            
+            mensagem_remocao = f"🗑️ Produto '{(produto_removido.descricao or '')[:30]}...' removido com sucesso."
             st.success(mensagem_remocao)
             
             # Forçar rerun para atualizar a lista
@@ -598,20 +751,104 @@ with tab_relatorio:
 
         st.markdown("---")
         
-        if st.session_state.excel_buffer:
-            # Informar quantos produtos serão incluídos
-            produtos_incluidos = min(len(st.session_state.produtos), LIMITE_PRODUTOS)
-            st.info(f"📄 **Na planilha serão incluídos:** {produtos_incluidos} produtos")
+        if st.session_state.solicitacao_iniciada:
+            # Informar quantos produtos e páginas serão gerados
+            quantidade_atual = len(st.session_state.produtos)
+            paginas = quantidade_formularios(quantidade_atual)
+            nome_arquivo, mime_arquivo = arquivo_exportacao(quantidade_atual)
+            st.info(f"📄 **Na planilha serão incluídos:** {quantidade_atual} produtos")
             
-            if len(st.session_state.produtos) > LIMITE_PRODUTOS:
-                st.warning(f"⚠️ **Atenção:** Apenas os primeiros {LIMITE_PRODUTOS} produtos serão incluídos na planilha.")
+            if paginas > 1:
+                st.info(f"🗂️ Os produtos serão divididos em **{paginas} formulários** de até "
+                        f"{PRODUTOS_POR_FORMULARIO} produtos, entregues em um arquivo ZIP.")
             
             st.download_button(
-                "📥 Baixar formulário Excel",
-                data=st.session_state.excel_buffer,
-                file_name="solicitar placa.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                "📥 Baixar formulário Excel" if paginas == 1 else f"📥 Baixar {paginas} formulários (ZIP)",
+                # Gerado apenas no clique, a partir de uma cópia do estado atual
+                data=partial(
+                    gerar_e_registrar,
+                    st.session_state.loja,
+                    st.session_state.data_solicitacao,
+                    st.session_state.nome_solicitante,
+                    list(st.session_state.produtos)
+                ),
+                file_name=nome_arquivo,
+                mime=mime_arquivo,
                 key="download_final"
             )
     else:
-        st.info("Nenhum produto solicitado ainda.")
\ No newline at end of file
+        st.info("Nenhum produto solicitado ainda.")
+
+with tab_relatorio:
+    aba_relatorio()
+
+# ======================================================
+# ABA HISTÓRICO
+# ======================================================
+@st.fragment
+def aba_historico():
+    st.subheader("Solicitações anteriores")
+
+    if st.session_state.mensagem_historico:
+        st.success(st.session_state.mensagem_historico)
+        st.session_state.mensagem_historico = None
+
+    col1, col2 = st.columns(2)
+    with col1:
+        loja = st.selectbox("Loja", ["Todas"] + LOJAS, key="historico_loja")
+    with col2:
+        codigo = st.text_input("Código de barras", key="historico_codigo")
+    hoje = datetime.now().date()
+    periodo = st.date_input(
+        "Período", (hoje - timedelta(days=DIAS_HISTORICO), hoje), format="DD/MM/YYYY", key="historico_periodo"
+    )
+    desde, ate = (tuple(periodo) + (None, None))[:2]
+
+    solicitacoes = obter_historico().listar(
+        loja=None if loja == "Todas" else loja, desde=desde, ate=ate, codigo_barras=codigo.strip() or None
+    )
+    if not solicitacoes:
+        st.info("Nenhuma solicitação encontrada no histórico.")
+        return
+
+    st.dataframe(
+        pd.DataFrame(solicitacoes).rename(columns={
+            "id": "Nº", "loja": "Loja", "solicitante": "Solicitante", "data": "Data",
+            "quantidade": "Produtos", "repeticoes": "Repetições"
+        }),
+        hide_index=True, use_container_width=True
+    )
+
+    rotulos = {s["id"]: f"Nº {s['id']} - {s['data']} - {s['loja']} - {s['solicitante'] or 'sem solicitante'} "
+                        f"({s['quantidade']} produtos)" for s in solicitacoes}
+    escolhida = st.selectbox("Solicitação", list(rotulos), format_func=rotulos.get, key="historico_escolhida")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("↩️ Carregar na solicitação atual", key="historico_carregar",
+                     help="Substitui os produtos da solicitação atual; a data passa a ser a de hoje"):
+            if carregar_do_historico(escolhida):
+                st.session_state.mensagem_historico = (
+                    f"✅ Solicitação Nº {escolhida} carregada com {len(st.session_state.produtos)} produtos."
+                )
+            st.rerun()
+    with col2:
+        carregada = obter_historico().carregar(escolhida)
+        if carregada is not None:
+            cabecalho, produtos = carregada
+            nome_arquivo, mime_arquivo = arquivo_exportacao(len(produtos))
+            # Exporta como foi gerada (data original), sem registrar de novo
+            st.download_button(
+                "📥 Baixar novamente",
+                data=partial(criar_planilha_from_scratch, cabecalho["loja"], cabecalho["data"],
+                             cabecalho["solicitante"] or "", produtos),
+                file_name=nome_arquivo, mime=mime_arquivo, key="historico_download"
+            )
+
+with tab_historico:
+    aba_historico()
+
+# Medição da memória da sessão (a cada execução completa do script)
+obter_sessoes().registrar(
+    st.session_state.sessao_id, st.session_state.to_dict(), len(st.session_state.produtos)
+)
@@ -0,0 +1 @@
+"""Benchmarks do núcleo contra um servidor local que imita a API do Varejo Fácil."""
@@ -0,0 +1,202 @@
+"""Mede o processamento em lote e a geração de formulários contra a API falsa.
+
+Para cada quantidade de códigos (padrão: 10, 100 e 1000) são medidas três
+fases: lote com caches vazios, o mesmo lote com caches cheios e a geração do
+formulário (com `--catalogo`, também o lote resolvido por um espelho local
+recém-sincronizado). Cada fase informa itens/s, pico de memória alocada (tracemalloc,
+em uma segunda execução para não distorcer o tempo) e as requisições
+recebidas pelo servidor. O resultado é gravado em JSON para ser
+comparado entre versões:
+
+    python -m benchmarks --latencia 30 --taxa-429 0.01
+    python -m benchmarks --comparar benchmarks/resultados/anterior.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.servidor_falso import ConfiguracaoServidor, ServidorFalso, gerar_codigos
+from solicitar_placa import ConsultaProdutos, ListaProdutos, Produto, VarejoFacilClient, modelo_padrao
+from solicitar_placa.catalogo import CatalogoLocal, SincronizadorCatalogo
+from solicitar_placa.limitador import REQUISICOES_POR_SEGUNDO, LimitadorRequisicoes
+
+# ===============================
+# CONSTANTES
+# ===============================
+QUANTIDADES_PADRAO = (10, 100, 1000)
+PASTA_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+
+def versao_codigo():
+    """Commit atual do repositório, se disponível"""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir(funcao, itens, servidor):
+    """Executa `funcao()` duas vezes: uma cronometrada e outra sob tracemalloc para o pico de memória.
+
+    As requisições contadas no servidor são as da execução cronometrada.
+    """
+    antes = dict(servidor.requisicoes)
+    inicio = time.perf_counter()
+    retorno = funcao()
+    segundos = time.perf_counter() - inicio
+
+    requisicoes = {}
+    for (rota, status), quantidade in sorted(servidor.requisicoes.items()):
+        diferenca = quantidade - antes.get((rota, status), 0)
+        if diferenca:
+            requisicoes[f"{rota} {status}"] = diferenca
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return retorno, {
+        "itens": itens,
+        "segundos": round(segundos, 4),
+        "itens_por_segundo": round(itens / segundos, 1) if segundos else None,
+        "pico_memoria_kb": round(pico / 1024, 1),
+        "requisicoes": requisicoes
+    }
+
+
+def _registrar(resultados, quantidade, fase, medida):
+    resultados.append({"quantidade": quantidade, "fase": fase, **medida})
+    print(f"{quantidade:>6} {fase:<14} {medida['segundos']:>9.3f}s "
+          f"{medida['itens_por_segundo'] or 0:>10.1f} itens/s {medida.get('pico_memoria_kb', 0):>10.1f} KB",
+          file=sys.stderr)
+
+
+def executar(quantidades, configuracao, max_simultaneas=None, requisicoes_por_segundo=REQUISICOES_POR_SEGUNDO,
+             com_catalogo=False):
+    """Lista de resultados (um por quantidade e fase)"""
+    resultados = []
+    with ServidorFalso(configuracao) as servidor, tempfile.TemporaryDirectory() as pasta:
+        cliente = VarejoFacilClient("benchmark", "benchmark", url_base=servidor.url_base,
+                                    limitador=LimitadorRequisicoes(requisicoes_por_segundo))
+        opcoes = {} if max_simultaneas is None else {"max_simultaneas": max_simultaneas}
+        modelo_padrao()  # Carregamento do modelo fora da medição, como no app
+
+        catalogo = None
+        if com_catalogo:
+            catalogo = CatalogoLocal(Path(pasta) / "catalogo.sqlite3")
+            inicio = time.perf_counter()
+            resumo = SincronizadorCatalogo(cliente, catalogo).sincronizar()
+            segundos = time.perf_counter() - inicio
+            _registrar(resultados, resumo["produtos"], "sincronizacao", {
+                "itens": resumo["produtos"], "segundos": round(segundos, 4),
+                "itens_por_segundo": round(resumo["produtos"] / segundos, 1) if segundos else None
+            })
+
+        for quantidade in quantidades:
+            codigos = gerar_codigos(quantidade)
+
+            # Caches vazios a cada execução; a conexão com o servidor é reaproveitada como no app
+            dados, frio = medir(lambda: ConsultaProdutos(cliente, **opcoes).consultar_lote(codigos),
+                                quantidade, servidor)
+            _registrar(resultados, quantidade, "lote_frio", frio)
+
+            consulta = ConsultaProdutos(cliente, **opcoes)
+            consulta.consultar_lote(codigos)
+            _, quente = medir(lambda: consulta.consultar_lote(codigos), quantidade, servidor)
+            _registrar(resultados, quantidade, "lote_quente", quente)
+
+            if catalogo is not None:
+                _, espelho = medir(
+                    lambda: ConsultaProdutos(cliente, catalogo=catalogo, **opcoes).consultar_lote(codigos),
+                    quantidade, servidor
+                )
+                _registrar(resultados, quantidade, "lote_espelho", espelho)
+
+            produtos = ListaProdutos(
+                Produto.de_consulta(codigo, d, 1, "C") for codigo, d in zip(codigos, dados) if isinstance(d, dict)
+            )
+            conteudo, formulario = medir(
+                lambda: modelo_padrao().exportar("MIMI", "01/01/2026", "BENCHMARK", list(produtos)),
+                len(produtos), servidor
+            )
+            formulario["bytes"] = len(conteudo)
+            _registrar(resultados, quantidade, "formulario", formulario)
+
+        cliente.session.close()
+    return resultados
+
+
+def comparar(atual, anterior):
+    """Imprime a variação de itens/s em relação a um resultado anterior"""
+    referencia = {(r["quantidade"], r["fase"]): r for r in anterior["resultados"]}
+    print(f"\nComparação com {anterior.get('versao') or 'resultado anterior'}:")
+    for resultado in atual["resultados"]:
+        antigo = referencia.get((resultado["quantidade"], resultado["fase"]))
+        if not antigo or not antigo["itens_por_segundo"] or not resultado["itens_por_segundo"]:
+            continue
+        variacao = resultado["itens_por_segundo"] / antigo["itens_por_segundo"] - 1
+        print(f"{resultado['quantidade']:>6} {resultado['fase']:<12} {variacao:>+8.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--quantidades", type=int, nargs="+", default=list(QUANTIDADES_PADRAO))
+    parser.add_argument("--latencia", type=float, default=20.0, help="Latência média da API falsa em ms")
+    parser.add_argument("--variacao", type=float, default=5.0, help="Variação da latência em ms (±)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração de respostas 429")
+    parser.add_argument("--taxa-nao-encontrado", type=float, default=0.05,
+                        help="Fração dos códigos que não existem no catálogo")
+    parser.add_argument("--limite-rps", type=float, default=0.0,
+                        help="Requisições por segundo que a API falsa aceita antes de responder 429")
+    parser.add_argument("--simultaneas", type=int, help="Consultas paralelas (padrão: o do app)")
+    parser.add_argument("--rps", type=float, default=REQUISICOES_POR_SEGUNDO,
+                        help="Orçamento de requisições por segundo do cliente (0 = sem limite)")
+    parser.add_argument("--catalogo", action="store_true",
+                        help="Sincroniza um espelho local e mede também o lote resolvido por ele")
+    parser.add_argument("-o", "--saida", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/)")
+    parser.add_argument("--comparar", metavar="ARQUIVO", help="Resultado anterior para comparação")
+    args = parser.parse_args(argv)
+
+    configuracao = ConfiguracaoServidor(
+        latencia_ms=args.latencia, variacao_ms=args.variacao, taxa_erro=args.taxa_erro,
+        taxa_429=args.taxa_429, taxa_nao_encontrado=args.taxa_nao_encontrado, limite_rps=args.limite_rps,
+        tamanho_catalogo=max(args.quantidades)
+    )
+    resultado = {
+        "versao": versao_codigo(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "servidor": asdict(configuracao),
+        "simultaneas": args.simultaneas,
+        "requisicoes_por_segundo": args.rps,
+        "resultados": executar(args.quantidades, configuracao, args.simultaneas, args.rps, args.catalogo)
+    }
+
+    saida = Path(args.saida) if args.saida else \
+        PASTA_RESULTADOS / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(resultado, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(saida)
+
+    if args.comparar:
+        comparar(resultado, json.loads(Path(args.comparar).read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
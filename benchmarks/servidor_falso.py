@@ -0,0 +1,249 @@
+"""Servidor HTTP local que imita os endpoints do Varejo Fácil usados pelo app.
+
+Atende `produto/produtos/consulta/0{codigo}`, `produto/produtos/{id}/precos`,
+`produto/produtos/{id}/fornecedores` e `pessoa/fornecedores?q=id==...`, além da
+listagem `produto/produtos?start=&count=&q=dataAlteracao=ge=...` e de
+`produto/produtos/{id}/codigos-auxiliares` usadas pelo espelho local, com
+latência, taxa de erros (500) e de limitação (429, sorteada ou por limite de
+requisições por segundo) configuráveis.
+
+Uso isolado:
+    python -m benchmarks.servidor_falso --porta 8765 --latencia 40 --taxa-429 0.02
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# ===============================
+# CONSTANTES
+# ===============================
+PREFIXO_API = "/api/v1"
+QUANTIDADE_FORNECEDORES = 50  # Fornecedores distintos no catálogo falso
+PREFIXO_EAN = 789000000000  # 12 dígitos; o 13º é o dígito verificador
+DATA_ALTERACAO = "2026-01-01T00:00:00"  # dataAlteracao de todo o catálogo falso
+
+ROTA_CONSULTA = re.compile(r"^produto/produtos/consulta/0(\d+)$")
+ROTA_PRECOS = re.compile(r"^produto/produtos/(\d+)/precos$")
+ROTA_FORNECEDORES_PRODUTO = re.compile(r"^produto/produtos/(\d+)/fornecedores$")
+ROTA_CODIGOS_PRODUTO = re.compile(r"^produto/produtos/(\d+)/codigos-auxiliares$")
+FILTRO_ALTERACAO = re.compile(r"dataAlteracao=ge=([\dT:-]+)")
+FILTRO_ID = re.compile(r"id==(\d+)")
+
+
+@dataclass
+class ConfiguracaoServidor:
+    latencia_ms: float = 0.0     # Atraso médio por requisição
+    variacao_ms: float = 0.0     # Variação uniforme (±) em torno da latência
+    taxa_erro: float = 0.0       # Fração de respostas 500
+    taxa_429: float = 0.0        # Fração de respostas 429 (Too Many Requests)
+    taxa_nao_encontrado: float = 0.0  # Fração dos códigos inexistentes no catálogo
+    limite_rps: float = 0.0      # Acima disso (janela de 1 s) responde 429, como a API real; 0 = sem limite
+    tamanho_catalogo: int = 1000  # Produtos devolvidos pela listagem (os códigos de `gerar_codigos`)
+    semente: int = 42
+
+
+def gerar_codigos(quantidade, inicio=0):
+    """Códigos EAN-13 válidos e distintos (os primeiros formam o catálogo listado pelo servidor)"""
+    codigos = []
+    for i in range(inicio, inicio + quantidade):
+        corpo = str(PREFIXO_EAN + i)
+        soma = sum(int(d) * (3 if posicao % 2 else 1) for posicao, d in enumerate(corpo))
+        codigos.append(corpo + str((10 - soma % 10) % 10))
+    return codigos
+
+
+def id_produto(codigo):
+    return int(codigo) % 10_000_000
+
+
+def produto_existe(codigo, taxa_nao_encontrado):
+    """Decide de forma determinística (pelo código) se o produto existe no catálogo falso"""
+    return random.Random(codigo).random() >= taxa_nao_encontrado
+
+
+class ServidorFalso:
+    """Servidor em thread de fundo; use como context manager ou chame iniciar/parar"""
+
+    def __init__(self, configuracao=None, host="127.0.0.1", porta=0):
+        self.configuracao = configuracao or ConfiguracaoServidor()
+        self._aleatorio = random.Random(self.configuracao.semente)
+        self._lock = threading.Lock()
+        self.requisicoes = {}  # (rota, status) -> quantidade
+        self._janela = deque()  # Horários das requisições do último segundo (limite_rps)
+        self._catalogo = {
+            id_produto(codigo): codigo for codigo in gerar_codigos(self.configuracao.tamanho_catalogo)
+            if produto_existe(codigo, self.configuracao.taxa_nao_encontrado)
+        }
+        self._servidor = ThreadingHTTPServer((host, porta), self._criar_handler())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url_base(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}{PREFIXO_API}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="servidor-falso", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def _sortear(self):
+        """(atraso em segundos, status forçado ou None) para a próxima requisição"""
+        cfg = self.configuracao
+        with self._lock:
+            atraso = cfg.latencia_ms + self._aleatorio.uniform(-cfg.variacao_ms, cfg.variacao_ms)
+            sorteio = self._aleatorio.random()
+            excedeu = False
+            if cfg.limite_rps:
+                agora = time.monotonic()
+                while self._janela and self._janela[0] <= agora - 1:
+                    self._janela.popleft()
+                excedeu = len(self._janela) >= cfg.limite_rps
+                if not excedeu:
+                    self._janela.append(agora)
+        if excedeu or sorteio < cfg.taxa_429:
+            return max(atraso, 0) / 1000, 429
+        if sorteio < cfg.taxa_429 + cfg.taxa_erro:
+            return max(atraso, 0) / 1000, 500
+        return max(atraso, 0) / 1000, None
+
+    def _contar(self, rota, status):
+        with self._lock:
+            self.requisicoes[(rota, status)] = self.requisicoes.get((rota, status), 0) + 1
+
+    def responder(self, caminho, consulta):
+        """(rota, status, corpo) para o caminho relativo ao prefixo da API"""
+        cfg = self.configuracao
+
+        m = ROTA_CONSULTA.match(caminho)
+        if m:
+            codigo = m.group(1)
+            if not produto_existe(codigo, cfg.taxa_nao_encontrado):
+                return "consulta", 404, {"message": "Produto não encontrado"}
+            return "consulta", 200, self._produto(codigo)
+
+        m = ROTA_PRECOS.match(caminho)
+        if m:
+            produto_id = int(m.group(1))
+            return "precos", 200, {"items": [{
+                "precoVenda1": round(1 + produto_id % 100 + 0.99, 2),
+                "precoOferta1": round(produto_id % 100 + 0.49, 2)
+            }]}
+
+        m = ROTA_FORNECEDORES_PRODUTO.match(caminho)
+        if m:
+            fornecedor_id = int(m.group(1)) % QUANTIDADE_FORNECEDORES + 1
+            return "fornecedores", 200, {"items": [{"fornecedorId": fornecedor_id}]}
+
+        m = ROTA_CODIGOS_PRODUTO.match(caminho)
+        if m:
+            codigo = self._catalogo.get(int(m.group(1)))
+            return "codigos-auxiliares", 200, {"items": [{"id": codigo}] if codigo else []}
+
+        if caminho == "produto/produtos":
+            filtro = FILTRO_ALTERACAO.search(consulta.get("q", [""])[0])
+            ids = [] if filtro and filtro.group(1) > DATA_ALTERACAO else sorted(self._catalogo)
+            inicio = int(consulta.get("start", ["0"])[0])
+            quantidade = int(consulta.get("count", ["50"])[0])
+            items = [self._produto(self._catalogo[i]) for i in ids[inicio:inicio + quantidade]]
+            return "produtos", 200, {"start": inicio, "count": len(items), "total": len(ids), "items": items}
+
+        if caminho == "pessoa/fornecedores":
+            ids = FILTRO_ID.findall(consulta.get("q", [""])[0])
+            items = [{"id": int(i), "fantasia": f"FORNECEDOR {i}"} for i in ids]
+            return "pessoa/fornecedores", 200, {"items": items, "total": len(items)}
+
+        return "desconhecida", 404, {"message": "Rota não encontrada"}
+
+    @staticmethod
+    def _produto(codigo):
+        produto_id = id_produto(codigo)
+        return {
+            "id": produto_id,
+            "descricao": f"PRODUTO TESTE {codigo}",
+            "identificadorDeOrigem": f"REF-{produto_id}",
+            "dataAlteracao": DATA_ALTERACAO
+        }
+
+    def _criar_handler(self):
+        servidor = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Mantém as conexões abertas (keep-alive) como a API real
+            disable_nagle_algorithm = True  # Cabeçalho e corpo saem em escritas separadas
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                caminho = url.path[len(PREFIXO_API):].lstrip("/") if url.path.startswith(PREFIXO_API) else ""
+                rota, status, corpo = servidor.responder(caminho, parse_qs(url.query))
+
+                atraso, status_forcado = servidor._sortear()
+                if atraso:
+                    time.sleep(atraso)
+                if status_forcado is not None:
+                    status, corpo = status_forcado, {"message": "Erro simulado"}
+
+                servidor._contar(rota, status)
+                dados = json.dumps(corpo).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        return _Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.servidor_falso",
+                                     description="API falsa do Varejo Fácil para testes locais")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latência média em ms")
+    parser.add_argument("--variacao", type=float, default=0.0, help="Variação da latência em ms (±)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração de respostas 429")
+    parser.add_argument("--taxa-nao-encontrado", type=float, default=0.0,
+                        help="Fração dos códigos que não existem no catálogo")
+    parser.add_argument("--limite-rps", type=float, default=0.0,
+                        help="Requisições por segundo aceitas antes de responder 429 (0 = sem limite)")
+    parser.add_argument("--tamanho-catalogo", type=int, default=1000, help="Produtos na listagem do cadastro")
+    args = parser.parse_args(argv)
+
+    configuracao = ConfiguracaoServidor(args.latencia, args.variacao, args.taxa_erro, args.taxa_429,
+                                        args.taxa_nao_encontrado, args.limite_rps, args.tamanho_catalogo)
+    servidor = ServidorFalso(configuracao, porta=args.porta)
+    print(f"API falsa em {servidor.url_base} (Ctrl+C para sair)")
+    try:
+        servidor._servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor._servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""Núcleo da solicitação de placas, compartilhado pelo app Streamlit e pela linha de comando."""
+
+from solicitar_placa.api import VarejoFacilClient
+from solicitar_placa.cache import CacheTTL
+from solicitar_placa.consulta import ConsultaProdutos
+from solicitar_placa.formulario import ModeloFormulario, modelo_padrao
+from solicitar_placa.produtos import ListaProdutos, Produto
+
+__all__ = [
+    "CacheTTL",
+    "ConsultaProdutos",
+    "ListaProdutos",
+    "ModeloFormulario",
+    "Produto",
+    "VarejoFacilClient",
+    "modelo_padrao"
+]
@@ -0,0 +1,5 @@
+import sys
+
+from solicitar_placa.cli import main
+
+sys.exit(main())
@@ -0,0 +1,248 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from solicitar_placa.disjuntor import CircuitoAberto, Disjuntor
+from solicitar_placa.limitador import LimitadorRequisicoes
+from solicitar_placa.metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+URL_BASE = "https://lojasmimi.varejofacil.com/api/v1"
+TIMEOUT_CONEXAO = 3.05  # Segundos para abrir a conexão
+TIMEOUT_LEITURA = 15    # Segundos aguardando a resposta
+MAX_CONEXOES = 16       # Conexões keep-alive mantidas no pool
+TAMANHO_GRUPO_FORNECEDORES = 20  # Fornecedores consultados por requisição
+MAX_TENTATIVAS = 4        # Tentativas por GET (a primeira + 3 repetições)
+ESPERA_BASE = 0.25        # Segundos; dobra a cada repetição, com jitter
+ESPERA_MAXIMA = 8.0       # Teto da espera entre tentativas (inclusive Retry-After)
+STATUS_REPETIR = {429, 500, 502, 503, 504}  # Respostas transitórias: o GET é repetido
+STATUS_ERRO = STATUS_REPETIR | {401, 403, 408}  # Respostas que indicam falha, não "não encontrado"
+TAMANHO_PAGINA = 500      # Itens por página nas listagens (start/count)
+FORMATO_DATA_FILTRO = "%Y-%m-%dT%H:%M:%S"  # Datas nos filtros FIQL (ex.: dataAlteracao=ge=...)
+
+
+class FornecedorIndisponivel(requests.RequestException):
+    """O produto foi encontrado, mas o nome do fornecedor não pôde ser consultado na API"""
+
+    def __init__(self, fornecedor_id):
+        super().__init__(f"Fornecedor {fornecedor_id} não consultado (falha na API)")
+        self.fornecedor_id = fornecedor_id
+
+
+class VarejoFacilClient:
+    """Cliente da API do Varejo Fácil com conexões reaproveitadas (keep-alive).
+
+    Uma única instância deve ser compartilhada por todo o processo: a
+    `requests.Session` interna mantém o pool de conexões TLS abertas e pode ser
+    usada por várias threads ao mesmo tempo.
+    """
+
+    def __init__(self, x_api_key, cookie, url_base=URL_BASE,
+                 timeout=(TIMEOUT_CONEXAO, TIMEOUT_LEITURA), max_conexoes=MAX_CONEXOES,
+                 limitador=None, max_tentativas=MAX_TENTATIVAS, disjuntor=None):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = timeout
+        self.limitador = limitador or LimitadorRequisicoes()
+        self.disjuntor = disjuntor or Disjuntor()
+        self.max_tentativas = max_tentativas
+        self.max_conexoes = max_conexoes
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "x-api-key": x_api_key,
+            "Cookie": cookie
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_conexoes)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def abrir_conexoes(self, quantidade):
+        """Abre até `quantidade` conexões keep-alive com a API (HEAD simultâneos na URL base).
+
+        Usado no aquecimento: as conexões voltam para o pool e a primeira
+        consulta já não paga o handshake TLS. As requisições saem juntas (se
+        fossem espaçadas pelo limitador, reaproveitariam uma única conexão) e
+        não passam pelo disjuntor: o status da URL base não diz nada sobre a
+        API. Retorna quantas responderam.
+        """
+        quantidade = max(1, min(quantidade, self.max_conexoes))
+        largada = threading.Barrier(quantidade)
+
+        def abrir(_):
+            try:
+                largada.wait(timeout=TIMEOUT_CONEXAO)
+                self.session.head(self.url_base, timeout=self.timeout)
+                return None
+            except (requests.RequestException, threading.BrokenBarrierError) as erro:
+                return erro
+
+        with ThreadPoolExecutor(max_workers=quantidade, thread_name_prefix="abrir-conexao") as executor:
+            erros = [erro for erro in executor.map(abrir, range(quantidade)) if erro is not None]
+        if erros:
+            logger.warning("%d de %d conexões com a API não foram abertas: %s", len(erros), quantidade, erros[0])
+        return quantidade - len(erros)
+
+    def _get(self, caminho, endpoint):
+        """GET relativo à URL base, dentro do orçamento do limitador e com repetições.
+
+        Respostas 429/5xx e falhas de rede são repetidas com espera exponencial
+        e jitter (respeitando Retry-After); a última resposta é devolvida ou a
+        última exceção propagada. Com o disjuntor aberto a chamada falha na hora
+        com `CircuitoAberto`. A latência e o status de cada tentativa entram nas
+        métricas agrupados por `endpoint` (o caminho sem ids nem códigos).
+        """
+        for tentativa in range(1, self.max_tentativas + 1):
+            teste = self.disjuntor.permitir()
+            response = None
+            with self.limitador.reservar():
+                inicio = time.perf_counter()
+                try:
+                    with METRICAS.medir("api_requisicao_segundos", endpoint=endpoint) as rotulos:
+                        response = self.session.get(f"{self.url_base}/{caminho}", timeout=self.timeout)
+                        rotulos["status"] = response.status_code
+                except (requests.ConnectionError, requests.Timeout):
+                    latencia = time.perf_counter() - inicio
+                    self.limitador.registrar(None, latencia)
+                    self.disjuntor.registrar(None, latencia, teste)
+                    if tentativa == self.max_tentativas:
+                        raise
+                except requests.RequestException:
+                    self.disjuntor.registrar(None, time.perf_counter() - inicio, teste)  # Não deixa o teste pendente
+                    raise
+                else:
+                    latencia = time.perf_counter() - inicio
+                    self.limitador.registrar(response.status_code, latencia)
+                    self.disjuntor.registrar(response.status_code, latencia, teste)
+                    if response.status_code not in STATUS_REPETIR or tentativa == self.max_tentativas:
+                        return response
+
+            METRICAS.incrementar("api_repeticoes_total", endpoint=endpoint,
+                                 motivo=response.status_code if response is not None else "rede")
+            time.sleep(self._espera(tentativa, response))
+
+    @staticmethod
+    def _espera(tentativa, response):
+        """Segundos até a próxima tentativa: Retry-After, se houver, ou backoff exponencial com jitter"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(ESPERA_MAXIMA, int(retry_after) + random.uniform(0, ESPERA_BASE))
+        return random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+
+    def _get_json(self, caminho, endpoint):
+        """GET que retorna o JSON da resposta, ou None se o recurso não existir.
+
+        Status de falha (429, 5xx, autenticação) levantam `requests.HTTPError`,
+        para não serem confundidos com "não encontrado".
+        """
+        response = self._get(caminho, endpoint)
+        if response.status_code in STATUS_ERRO:
+            response.raise_for_status()
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def consultar_produto(self, codigo):
+        """Consulta o produto pelo código de barras. Retorna None se não encontrado"""
+        return self._get_json(f"produto/produtos/consulta/0{codigo}", "produto/produtos/consulta")
+
+    def precos(self, produto_id):
+        """Lista de preços do produto, ou None se a consulta falhar"""
+        return self._get_json(f"produto/produtos/{produto_id}/precos", "produto/produtos/precos")
+
+    def fornecedor_de(self, produto_id):
+        """Id do fornecedor principal do produto, ou None"""
+        dados = self._get_json(f"produto/produtos/{produto_id}/fornecedores", "produto/produtos/fornecedores")
+        items = (dados or {}).get("items", [])
+        if not items:
+            return None
+        return items[0].get("fornecedorId")
+
+    def codigos_do_produto(self, produto_id):
+        """Códigos de barras (auxiliares) cadastrados para o produto"""
+        dados = self._get_json(f"produto/produtos/{produto_id}/codigos-auxiliares",
+                               "produto/produtos/codigos-auxiliares")
+        return [str(item["id"]) for item in (dados or {}).get("items", []) if item.get("id")]
+
+    def listar_produtos(self, alterados_desde=None, tamanho_pagina=TAMANHO_PAGINA):
+        """Gera os produtos do cadastro, página a página; só os alterados desde a data, se informada"""
+        filtro = f"&q=dataAlteracao=ge={alterados_desde.strftime(FORMATO_DATA_FILTRO)}" if alterados_desde else ""
+        inicio = 0
+        while True:
+            dados = self._get_json(f"produto/produtos?start={inicio}&count={tamanho_pagina}{filtro}",
+                                   "produto/produtos")
+            items = (dados or {}).get("items", [])
+            yield from items
+            inicio += len(items)
+            if len(items) < tamanho_pagina or inicio >= (dados or {}).get("total", inicio):
+                return
+
+    def fantasia_fornecedor(self, fornecedor_id):
+        """Nome fantasia do fornecedor, ou None"""
+        dados = self._get_json(f"pessoa/fornecedores?q=id=={fornecedor_id}", "pessoa/fornecedores")
+        items = (dados or {}).get("items", [])
+        if not items:
+            return None
+        return items[0].get("fantasia")
+
+    def fantasias_fornecedores(self, fornecedor_ids):
+        """Mapa id -> nome fantasia, consultando vários fornecedores por requisição.
+
+        Os ids são agrupados em um único filtro `q=id==1,id==2,...` (OU); os que
+        não vierem na resposta do grupo são consultados individualmente. Ids
+        cuja consulta falhou ficam fora do mapa (None = fornecedor sem fantasia).
+        """
+        ids = list(dict.fromkeys(i for i in fornecedor_ids if i is not None))
+        nomes = {}
+
+        for inicio in range(0, len(ids), TAMANHO_GRUPO_FORNECEDORES):
+            grupo = ids[inicio:inicio + TAMANHO_GRUPO_FORNECEDORES]
+            por_texto = {str(i): i for i in grupo}
+            filtro = ",".join(f"id=={i}" for i in grupo)
+            try:
+                dados = self._get_json(f"pessoa/fornecedores?q={filtro}", "pessoa/fornecedores")
+            except requests.RequestException:
+                dados = None
+            for item in (dados or {}).get("items", []):
+                fornecedor_id = por_texto.get(str(item.get("id")))
+                if fornecedor_id is not None:
+                    nomes[fornecedor_id] = item.get("fantasia")
+
+            for fornecedor_id in grupo:
+                if fornecedor_id not in nomes:
+                    try:
+                        nomes[fornecedor_id] = self.fantasia_fornecedor(fornecedor_id)
+                    except requests.RequestException:
+                        pass  # Fica fora do mapa: quem chamou não deve guardar o fornecedor como inexistente
+
+        return nomes
+
+    def nome_fornecedor_do_produto(self, produto_id):
+        """Nome fantasia do fornecedor principal do produto, ou None"""
+        fornecedor_id = self.fornecedor_de(produto_id)
+        if fornecedor_id is None:
+            return None
+        return self.fantasia_fornecedor(fornecedor_id)
+
+
+def descrever_falha(erro):
+    """Texto curto para exibir uma falha de consulta à API"""
+    if isinstance(erro, CircuitoAberto):
+        return "Falha na API (indisponível no momento)"
+    if isinstance(erro, FornecedorIndisponivel):
+        return "Falha na API (fornecedor não consultado)"
+    if isinstance(erro, requests.HTTPError) and erro.response is not None:
+        return f"Falha na API (HTTP {erro.response.status_code})"
+    if isinstance(erro, requests.Timeout):
+        return "Falha na API (tempo esgotado)"
+    if isinstance(erro, requests.ConnectionError):
+        return "Falha na API (sem conexão)"
+    return f"Falha na API ({erro.__class__.__name__})"
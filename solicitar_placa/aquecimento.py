@@ -0,0 +1,105 @@
+"""Aquecimento do processo: prepara o que a primeira interação pagaria.
+
+Depois de um reinício, o primeiro "Consultar Produto" esperaria a leitura do
+modelo 'solicitar placa.xlsx', a redução das imagens de preview, a abertura das
+conexões TLS com o Varejo Fácil e a montagem do índice de busca. As etapas
+rodam uma vez por processo, em uma thread de fundo, assim que o app sobe; cada
+uma é medida e uma falha não impede as seguintes.
+"""
+
+import logging
+import threading
+import time
+
+from solicitar_placa.assets import previews
+from solicitar_placa.formulario import modelo_padrao
+from solicitar_placa.metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+CONEXOES_AQUECIMENTO = 4   # Conexões keep-alive abertas com a API no aquecimento
+MAX_PRE_CARGA = 500        # Teto de códigos mais solicitados consultados no aquecimento
+
+
+def aquecer_modelo():
+    """Lê o modelo do formulário e gera uma página vazia (carrega também o código de gravação)"""
+    modelo_padrao().renderizar("", "", "", [])
+
+
+def aquecer_previews():
+    """Reduz e recodifica as imagens de preview de todos os tamanhos"""
+    return len(previews())
+
+
+def pre_carregar(consulta, historico, quantidade):
+    """Consulta os códigos mais solicitados no histórico, enchendo os caches de produtos e fornecedores"""
+    codigos = historico.codigos_mais_solicitados(min(quantidade, MAX_PRE_CARGA))
+    if codigos:
+        consulta.consultar_lote(codigos)
+    return len(codigos)
+
+
+class Aquecimento:
+    """Etapas (nome, função) executadas uma vez, em ordem, em uma thread de fundo.
+
+    `pronto()` é a verificação de prontidão: verdadeiro quando todas as etapas
+    terminaram (com ou sem falha). Uma instância por processo
+    (st.cache_resource no app).
+    """
+
+    def __init__(self, etapas):
+        self.etapas = list(etapas)
+        self.duracoes = {}
+        self.falhas = {}
+        self.duracao = None
+        self._inicio = None
+        self._pronto = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        """Começa o aquecimento em segundo plano (só na primeira chamada). Retorna a própria instância"""
+        if self._thread is None:
+            self._inicio = time.perf_counter()
+            self._thread = threading.Thread(target=self._executar, name="aquecimento", daemon=True)
+            self._thread.start()
+        return self
+
+    def _executar(self):
+        for nome, funcao in self.etapas:
+            inicio = time.perf_counter()
+            try:
+                funcao()
+            except Exception as erro:
+                logger.warning("Falha no aquecimento (%s): %s", nome, erro)
+                self.falhas[nome] = str(erro)
+            finally:
+                self.duracoes[nome] = time.perf_counter() - inicio
+                METRICAS.observar("aquecimento_segundos", self.duracoes[nome], etapa=nome)
+
+        self.duracao = time.perf_counter() - self._inicio
+        self._pronto.set()
+        logger.info(
+            "Aquecimento concluído em %.2f s (%s)", self.duracao,
+            ", ".join(f"{nome}: {segundos:.2f} s" for nome, segundos in self.duracoes.items())
+        )
+
+    def pronto(self):
+        return self._pronto.is_set()
+
+    def aguardar(self, timeout=None):
+        """Bloqueia até o aquecimento terminar. Retorna False se o tempo acabar antes"""
+        return self._pronto.wait(timeout)
+
+    def estatisticas(self):
+        decorrido = self.duracao
+        if decorrido is None and self._inicio is not None:
+            decorrido = time.perf_counter() - self._inicio
+        return {
+            "pronto": int(self.pronto()),
+            "segundos": round(decorrido or 0.0, 3),
+            "etapas": len(self.duracoes),
+            "falhas": len(self.falhas)
+        }
@@ -0,0 +1,82 @@
+import logging
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+PASTA_IMAGENS = Path(__file__).resolve().parent.parent / "imagens"
+LARGURA_PREVIEW = 300  # Largura em que as imagens são exibidas no app
+QUALIDADE_JPEG = 85
+
+# Tamanho da placa (mesma chave do selectbox) -> arquivo em imagens/
+TAMANHO_PLACA_IMAGEM_MAP = {
+    "A - FOLHA HORIZONTAL": "HORIZONTAL.png",
+    "B - FOLHA VERTICAL": "VERTICAL.png",
+    "C - MEIA FOLHA": "MEIA_FOLHA.jpg",
+    "D - 1/4 FOLHA": "UM_QUARTO_FOLHA.jpg",
+    "E - PORTA ETIQUETA": "ETIQUETA_GONDOLA.jfif"
+}
+
+
+def verificar_previews(tamanhos, pasta=PASTA_IMAGENS):
+    """Lista de problemas entre as opções de tamanho, o mapa de imagens e os arquivos"""
+    problemas = []
+    arquivos = {caminho.name for caminho in Path(pasta).iterdir()} if Path(pasta).is_dir() else set()
+
+    for tamanho in tamanhos:
+        nome = TAMANHO_PLACA_IMAGEM_MAP.get(tamanho)
+        if nome is None:
+            problemas.append(f"Tamanho '{tamanho}' sem imagem no mapa")
+        elif nome not in arquivos:
+            problemas.append(f"Arquivo '{nome}' do tamanho '{tamanho}' não encontrado em {pasta}")
+
+    for tamanho in TAMANHO_PLACA_IMAGEM_MAP:
+        if tamanho not in tamanhos:
+            problemas.append(f"Imagem mapeada para o tamanho inexistente '{tamanho}'")
+
+    return problemas
+
+
+def reduzir_imagem(caminho, largura=LARGURA_PREVIEW):
+    """Bytes da imagem reduzida à largura de exibição (nunca ampliada)"""
+    original = Path(caminho).read_bytes()
+    with Image.open(BytesIO(original)) as imagem:
+        formato = imagem.format
+        if imagem.width > largura:
+            altura = round(imagem.height * largura / imagem.width)
+            imagem = imagem.resize((largura, altura), Image.LANCZOS)
+
+        buffer = BytesIO()
+        if formato == "PNG":
+            imagem.save(buffer, format="PNG", optimize=True)
+        else:
+            imagem.convert("RGB").save(buffer, format="JPEG", quality=QUALIDADE_JPEG, optimize=True)
+
+    reduzida = buffer.getvalue()
+    return reduzida if len(reduzida) < len(original) else original
+
+
+@lru_cache(maxsize=None)
+def previews(largura=LARGURA_PREVIEW, pasta=PASTA_IMAGENS):
+    """Imagens de todos os tamanhos já reduzidas, carregadas uma vez por processo"""
+    imagens = {}
+    for tamanho, nome in TAMANHO_PLACA_IMAGEM_MAP.items():
+        caminho = Path(pasta) / nome
+        try:
+            imagens[tamanho] = reduzir_imagem(caminho, largura)
+        except OSError:
+            logger.warning("Imagem de preview não encontrada: %s", caminho)
+    return imagens
+
+
+def preparar_previews(tamanhos, largura=LARGURA_PREVIEW):
+    """Confere o mapa de imagens (registrando os problemas no log) e devolve as previews"""
+    for problema in verificar_previews(tamanhos):
+        logger.warning(problema)
+    return previews(largura)
@@ -0,0 +1,251 @@
+"""Busca de produtos por descrição, identificador de origem ou parte do código de barras.
+
+O índice fica em memória no processo e é alimentado pelo espelho local
+(solicitar_placa.catalogo), que já recebe a listagem paginada do cadastro e as
+alterações incrementais. Termos (palavras da descrição, identificador de
+origem e códigos) apontam para os produtos; trigramas e prefixos curtos
+apontam para as palavras, o que permite achar pedaços delas sem percorrer o
+cadastro. Termos só com dígitos (códigos de barras, ids) ficam em um único
+texto pesquisado com `str.find`, bem mais econômico que trigramas de dígitos.
+"""
+
+import bisect
+import heapq
+import itertools
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from solicitar_placa.metricas import METRICAS
+
+# ===============================
+# CONSTANTES
+# ===============================
+MAX_RESULTADOS = 10           # Produtos devolvidos por busca
+INTERVALO_ATUALIZACAO = 15    # Segundos entre conferências de produtos novos/alterados no espelho
+TAMANHO_PREFIXO = 2           # Termos mais curtos que um trigrama são buscados por prefixo
+MIN_DIGITOS_TRECHO = 3        # Trechos de código mais curtos só casam com o número inteiro
+MAX_NUMEROS_TRECHO = 500      # Códigos considerados por trecho numérico muito comum (ex.: "789")
+
+_SEPARADORES = re.compile(r"[^0-9A-Z]+")
+
+# Pontuação de cada termo da busca conforme o casamento com o termo do produto
+PONTOS_EXATO = 3
+PONTOS_PREFIXO = 2
+PONTOS_TRECHO = 1
+
+
+def normalizar_texto(texto):
+    """Termos em maiúsculas, sem acentos nem pontuação"""
+    sem_acentos = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    # intern: a mesma palavra em milhares de produtos ocupa uma só string
+    return [sys.intern(termo) for termo in _SEPARADORES.split(sem_acentos.upper()) if termo]
+
+
+def _trigramas(termo):
+    return {termo[i:i + 3] for i in range(len(termo) - 2)}
+
+
+class IndiceBusca:
+    """Índice invertido em memória dos produtos do espelho local, seguro entre threads.
+
+    `atualizar` recebe os produtos gravados no espelho desde a última vez;
+    `buscar` confere o espelho no máximo a cada `intervalo_atualizacao` segundos.
+    """
+
+    def __init__(self, catalogo=None, intervalo_atualizacao=INTERVALO_ATUALIZACAO):
+        self.catalogo = catalogo
+        self.intervalo_atualizacao = intervalo_atualizacao
+        self._lock = threading.RLock()
+        self._produtos = {}    # id -> (descricao, origem, codigos, termos), em tuplas para ocupar pouco
+        self._postagens = {}   # termo -> id, ou set(ids) se o termo aparece em mais de um produto
+        self._trigramas = {}   # trigrama -> set(termos)
+        self._prefixos = {}    # prefixo curto -> set(termos)
+        self._numeros = set()  # Termos só com dígitos
+        self._texto_numeros = None  # (texto "\n".join, início de cada número, números), refeito após mudanças
+        self._marca = None     # Maior `sincronizado_em` já indexado
+        self._remocoes = None  # `versao_remocoes` do espelho na última reconstrução
+        self._conferido_em = float("-inf")
+
+    def _ids(self, termo):
+        postagens = self._postagens[termo]
+        return postagens if isinstance(postagens, set) else (postagens,)
+
+    def _adicionar_termo(self, termo, produto_id):
+        postagens = self._postagens.get(termo)
+        if isinstance(postagens, set):
+            postagens.add(produto_id)
+            return
+        if postagens is not None:
+            if postagens != produto_id:
+                self._postagens[termo] = {postagens, produto_id}
+            return
+
+        # A maioria dos códigos e identificadores é de um único produto: guarda só o id
+        self._postagens[termo] = produto_id
+        if termo.isdigit():
+            self._numeros.add(termo)
+            self._texto_numeros = None
+            return
+        for trigrama in _trigramas(termo):
+            self._trigramas.setdefault(trigrama, set()).add(termo)
+        for tamanho in range(1, TAMANHO_PREFIXO + 1):
+            self._prefixos.setdefault(termo[:tamanho], set()).add(termo)
+
+    def _remover_termo(self, termo, produto_id):
+        postagens = self._postagens[termo]
+        if isinstance(postagens, set):
+            postagens.discard(produto_id)
+            if len(postagens) > 1:
+                return
+            if postagens:
+                self._postagens[termo] = postagens.pop()
+                return
+        elif postagens != produto_id:
+            return
+        del self._postagens[termo]
+        if termo.isdigit():
+            self._numeros.discard(termo)
+            self._texto_numeros = None
+            return
+        for chave, indice in [(t, self._trigramas) for t in _trigramas(termo)] + \
+                             [(termo[:n], self._prefixos) for n in range(1, TAMANHO_PREFIXO + 1)]:
+            termos = indice.get(chave)
+            if termos is not None:
+                termos.discard(termo)
+                if not termos:
+                    del indice[chave]
+
+    def remover(self, produto_id):
+        with self._lock:
+            produto = self._produtos.pop(produto_id, None)
+            if produto is not None:
+                for termo in produto[3]:
+                    self._remover_termo(termo, produto_id)
+
+    def atualizar(self, produtos):
+        """Inclui ou substitui (produto_id, descricao, identificador_origem, codigos).
+
+        Os códigos são indexados como o espelho os guarda (sem zeros à esquerda).
+        """
+        with self._lock:
+            for produto_id, descricao, origem, codigos in produtos:
+                self.remover(produto_id)
+                codigos = tuple(codigos)
+                termos = tuple(set(normalizar_texto(descricao)) | set(normalizar_texto(origem)) | set(codigos))
+                self._produtos[produto_id] = (descricao, origem, codigos, termos)
+                for termo in termos:
+                    self._adicionar_termo(termo, produto_id)
+            if self._texto_numeros is None:
+                self._montar_texto_numeros()
+
+    def atualizar_do_catalogo(self):
+        """Indexa os produtos gravados no espelho desde a última atualização. Retorna quantos"""
+        if self.catalogo is None:
+            return 0
+        with self._lock:
+            self._conferido_em = time.monotonic()
+            remocoes = self.catalogo.versao_remocoes()
+            if remocoes != self._remocoes:
+                # Produtos ou códigos removidos do espelho não voltam na listagem incremental: reconstrói
+                self._produtos, self._postagens, self._trigramas, self._prefixos = {}, {}, {}, {}
+                self._numeros, self._texto_numeros = set(), None
+                self._marca = None
+                self._remocoes = remocoes
+            linhas = self.catalogo.produtos_para_busca(self._marca)
+            self.atualizar((produto_id, descricao, origem, codigos) for produto_id, descricao, origem, codigos, _ in linhas)
+            self._marca = max([linha[4] for linha in linhas if linha[4]] + [self._marca or ""]) or None
+            return len(linhas)
+
+    def _montar_texto_numeros(self):
+        numeros = sorted(self._numeros)
+        inicios = list(itertools.accumulate((len(n) + 1 for n in numeros), initial=0))[:-1]
+        self._texto_numeros = ("\n".join(numeros), inicios, numeros)
+
+    def _numeros_com(self, parte):
+        """Termos numéricos que contêm `parte` (busca no texto único de números)"""
+        if self._texto_numeros is None:
+            self._montar_texto_numeros()
+        texto, inicios, numeros = self._texto_numeros
+
+        encontrados = {parte} if parte in self._postagens else set()
+        posicao = texto.find(parte)
+        while posicao >= 0 and len(encontrados) < MAX_NUMEROS_TRECHO:
+            indice = bisect.bisect_right(inicios, posicao) - 1
+            encontrados.add(numeros[indice])
+            posicao = texto.find(parte, inicios[indice] + len(numeros[indice]))
+        return encontrados
+
+    def _termos_para(self, parte):
+        """Termos do índice que contêm `parte`, com a pontuação de cada um"""
+        if parte.isdigit():
+            parte = parte.lstrip("0") or parte  # Como os códigos no espelho (chave_codigo)
+            if len(parte) < MIN_DIGITOS_TRECHO:
+                return {parte: PONTOS_EXATO} if parte in self._postagens else {}
+            return {termo: PONTOS_EXATO if termo == parte else PONTOS_PREFIXO if termo.startswith(parte)
+                    else PONTOS_TRECHO for termo in self._numeros_com(parte)}
+
+        if len(parte) < 3:
+            candidatos = self._prefixos.get(parte[:TAMANHO_PREFIXO], set())
+            return {termo: PONTOS_EXATO if termo == parte else PONTOS_PREFIXO
+                    for termo in candidatos if termo.startswith(parte)}
+
+        conjuntos = sorted((self._trigramas.get(t, set()) for t in _trigramas(parte)), key=len)
+        candidatos = set.intersection(*conjuntos) if conjuntos[0] else set()
+        pontos = {}
+        for termo in candidatos:
+            if termo == parte:
+                pontos[termo] = PONTOS_EXATO
+            elif termo.startswith(parte):
+                pontos[termo] = PONTOS_PREFIXO
+            elif parte in termo:
+                pontos[termo] = PONTOS_TRECHO
+        return pontos
+
+    def buscar(self, texto, limite=MAX_RESULTADOS):
+        """Produtos que contêm todos os termos do texto (no começo ou no meio de palavras e códigos).
+
+        Retorna dicionários com produto_id, descricao, origem e codigos, dos mais relevantes aos menos.
+        """
+        if time.monotonic() - self._conferido_em > self.intervalo_atualizacao:
+            self.atualizar_do_catalogo()
+
+        with METRICAS.medir("busca_segundos"), self._lock:
+            pontuacao = None
+            for parte in dict.fromkeys(normalizar_texto(texto)):
+                da_parte = {}
+                for termo, pontos in self._termos_para(parte).items():
+                    for produto_id in self._ids(termo):
+                        if pontos > da_parte.get(produto_id, 0):
+                            da_parte[produto_id] = pontos
+                if pontuacao is None:
+                    pontuacao = da_parte
+                else:
+                    pontuacao = {i: pontos + da_parte[i] for i, pontos in pontuacao.items() if i in da_parte}
+                if not pontuacao:
+                    return []
+
+            melhores = heapq.nsmallest(
+                limite, (pontuacao or {}).items(),
+                key=lambda item: (-item[1], len(self._produtos[item[0]][0] or ""), item[0])
+            )
+            resultados = []
+            for produto_id, _ in melhores:
+                descricao, origem, codigos, _ = self._produtos[produto_id]
+                resultados.append({"produto_id": produto_id, "descricao": descricao, "origem": origem,
+                                   "codigos": list(codigos)})
+            return resultados
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "produtos": len(self._produtos),
+                "termos": len(self._postagens),
+                "trigramas": len(self._trigramas)
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._produtos)
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# ===============================
+# CONSTANTES
+# ===============================
+TTL_PADRAO = 6 * 60 * 60     # Segundos que uma entrada permanece válida
+TAMANHO_MAXIMO_PADRAO = 5000  # Entradas mantidas antes de descartar as menos usadas
+
+_AUSENTE = object()  # Chave que a função de `executar_varios` não devolveu
+
+
+class CacheTTL:
+    """Cache em memória com expiração (TTL) e descarte LRU, seguro entre threads.
+
+    Pensado para ser compartilhado por todas as sessões do servidor: a mesma
+    instância atende consultas de qualquer usuário e das threads do lote.
+    Com `manter_vencidos` as entradas expiradas só saem pelo descarte LRU e
+    continuam disponíveis em `obter_vencido`.
+    """
+
+    def __init__(self, ttl=TTL_PADRAO, tamanho_maximo=TAMANHO_MAXIMO_PADRAO, relogio=time.monotonic,
+                 manter_vencidos=False):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self.manter_vencidos = manter_vencidos
+        self._relogio = relogio
+        self._dados = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obter(self, chave):
+        """Valor em cache para a chave, ou None se ausente ou expirado"""
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return None
+
+            expira_em, valor = entrada
+            if expira_em <= self._relogio():
+                if not self.manter_vencidos:
+                    del self._dados[chave]
+                self.misses += 1
+                return None
+
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def obter_vencido(self, chave):
+        """Último valor guardado para a chave, mesmo expirado (com `manter_vencidos`), ou None.
+
+        Usado como último recurso quando a origem falha; não conta nos acertos.
+        """
+        with self._lock:
+            entrada = self._dados.get(chave)
+            return None if entrada is None else entrada[1]
+
+    def guardar(self, chave, valor):
+        """Armazena o valor, descartando as entradas menos usadas se passar do limite"""
+        with self._lock:
+            self._dados[chave] = (self._relogio() + self.ttl, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+
+    def invalidar(self, chave):
+        """Remove a chave para forçar uma nova consulta na próxima vez"""
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def limpar(self):
+        """Remove todas as entradas e zera os contadores"""
+        with self._lock:
+            self._dados.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def estatisticas(self):
+        """Contadores de acerto/erro e ocupação atual do cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": self.hits / total if total else 0.0,
+                "tamanho": len(self._dados),
+                "tamanho_maximo": self.tamanho_maximo,
+                "ttl": self.ttl
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dados)
+
+
+class ChamadaUnica:
+    """Coalescência de chamadas simultâneas pela mesma chave (single-flight), segura entre threads.
+
+    Enquanto a consulta de uma chave está em andamento, quem pedir a mesma
+    chave espera o resultado (ou a exceção) dela em vez de repetir a
+    requisição. Nada é guardado depois que a chamada termina: a reutilização
+    posterior fica a cargo do CacheTTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}  # chave -> Future
+        self.executadas = 0
+        self.coalescidas = 0
+
+    def executar(self, chave, funcao):
+        """Resultado de `funcao()`, compartilhado com as chamadas simultâneas pela mesma chave"""
+        return self.executar_varios([chave], lambda chaves: {chave: funcao()})[chave]
+
+    def executar_varios(self, chaves, funcao):
+        """Mapa chave -> valor; `funcao(chaves)` recebe só as chaves que não estão em andamento.
+
+        As chaves que `funcao` não devolver ficam fora do mapa também para quem
+        esperou por elas (ex.: fornecedores cuja consulta falhou).
+        """
+        proprias = {}
+        alheias = {}
+        with self._lock:
+            for chave in dict.fromkeys(chaves):
+                futuro = self._em_andamento.get(chave)
+                if futuro is None:
+                    proprias[chave] = self._em_andamento[chave] = Future()
+                else:
+                    alheias[chave] = futuro
+            self.executadas += len(proprias)
+            self.coalescidas += len(alheias)
+
+        resultados = {}
+        try:
+            if proprias:
+                resultados = dict(funcao(list(proprias)))
+        except BaseException as erro:
+            for futuro in proprias.values():
+                futuro.set_exception(erro)
+            raise
+        else:
+            for chave, futuro in proprias.items():
+                futuro.set_result(resultados.get(chave, _AUSENTE))
+        finally:
+            with self._lock:
+                for chave in proprias:
+                    del self._em_andamento[chave]
+
+        for chave, futuro in alheias.items():
+            valor = futuro.result()
+            if valor is not _AUSENTE:
+                resultados[chave] = valor
+        return resultados
+
+    def estatisticas(self):
+        """Chamadas executadas, chamadas que aproveitaram outra em andamento e em andamento agora"""
+        with self._lock:
+            return {
+                "executadas": self.executadas,
+                "coalescidas": self.coalescidas,
+                "em_andamento": len(self._em_andamento)
+            }
@@ -0,0 +1,319 @@
+"""Espelho local (SQLite) do cadastro de produtos e fornecedores do Varejo Fácil.
+
+O espelho é opcional: quando configurado, as consultas por código de barras
+são resolvidas nele e só vão à API quando o código não está no espelho. Ele é
+preenchido por `SincronizadorCatalogo` (listagem paginada dos produtos, completa
+na primeira vez e depois só dos alterados) e também recebe cada produto
+consultado ao vivo.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from solicitar_placa.consulta import montar_dados_produto
+from solicitar_placa.metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+INTERVALO_SINCRONIZACAO = 30 * 60  # Segundos entre sincronizações incrementais
+MARGEM_SINCRONIZACAO = timedelta(minutes=5)  # Sobreposição entre sincronizações (relógios diferentes)
+MAX_SINCRONIZACOES_SIMULTANEAS = 4  # Produtos detalhados em paralelo (fornecedor e códigos)
+TAMANHO_GRUPO_SQL = 500  # Parâmetros por consulta IN (...)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS produtos (
+    id INTEGER PRIMARY KEY,
+    descricao TEXT,
+    identificador_origem TEXT,
+    fornecedor_id INTEGER,
+    fornecedor_verificado INTEGER NOT NULL DEFAULT 0,
+    sincronizado_em TEXT
+);
+CREATE TABLE IF NOT EXISTS codigos (
+    codigo TEXT PRIMARY KEY,
+    produto_id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS codigos_produto ON codigos (produto_id);
+CREATE INDEX IF NOT EXISTS produtos_sincronizacao ON produtos (sincronizado_em);
+CREATE TABLE IF NOT EXISTS fornecedores (
+    id INTEGER PRIMARY KEY,
+    fantasia TEXT
+);
+CREATE TABLE IF NOT EXISTS estado (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+def chave_codigo(codigo):
+    """Código de barras sem zeros à esquerda, para casar 0789... com 789..."""
+    return str(codigo).strip().lstrip("0")
+
+
+class CatalogoLocal:
+    """Produtos, códigos de barras e fornecedores em um arquivo SQLite, seguro entre threads.
+
+    Cada thread usa a sua conexão; o modo WAL deixa as leituras das sessões
+    correrem enquanto a sincronização grava.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = str(caminho)
+        self._local = threading.local()
+        with self._conexao() as conexao:
+            conexao.executescript(ESQUEMA)
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+        return conexao
+
+    def buscar_varios(self, codigos):
+        """Mapa código -> dados do produto (formato de `montar_dados_produto`) para os códigos no espelho.
+
+        Produtos cujo fornecedor ainda não foi verificado ficam de fora: a
+        consulta ao vivo completa e grava o que falta.
+        """
+        por_chave = {}
+        for codigo in codigos:
+            por_chave.setdefault(chave_codigo(codigo), []).append(codigo)
+
+        encontrados = {}
+        chaves = list(por_chave)
+        conexao = self._conexao()
+        for inicio in range(0, len(chaves), TAMANHO_GRUPO_SQL):
+            grupo = chaves[inicio:inicio + TAMANHO_GRUPO_SQL]
+            linhas = conexao.execute(
+                f"""SELECT c.codigo, p.id, p.descricao, p.identificador_origem, p.fornecedor_id, f.id, f.fantasia
+                    FROM codigos c
+                    JOIN produtos p ON p.id = c.produto_id
+                    LEFT JOIN fornecedores f ON f.id = p.fornecedor_id
+                    WHERE c.codigo IN ({",".join("?" * len(grupo))}) AND p.fornecedor_verificado""",
+                grupo
+            )
+            for chave, produto_id, descricao, origem, fornecedor_id, fornecedor_salvo, fantasia in linhas:
+                if fornecedor_id is not None and fornecedor_salvo is None:
+                    continue  # Nome do fornecedor ainda não resolvido
+                dados = montar_dados_produto(
+                    {"id": produto_id, "descricao": descricao, "identificadorDeOrigem": origem}, fantasia
+                )
+                for codigo in por_chave[chave]:
+                    encontrados[codigo] = dados
+
+        METRICAS.incrementar("catalogo_consultas_total", len(encontrados), resultado="encontrado")
+        METRICAS.incrementar("catalogo_consultas_total", len(codigos) - len(encontrados), resultado="ausente")
+        return encontrados
+
+    def buscar(self, codigo):
+        """Dados do produto no espelho, ou None"""
+        return self.buscar_varios([codigo]).get(codigo)
+
+    def guardar_produto(self, dados_produto, codigos=(), fornecedor_id=None, fornecedor_verificado=False):
+        """Grava (ou atualiza) um produto da API e os seus códigos de barras"""
+        self.guardar_produtos([(dados_produto, codigos, fornecedor_id, fornecedor_verificado)])
+
+    def guardar_produtos(self, registros):
+        """Grava vários (dados_produto, codigos, fornecedor_id, fornecedor_verificado) em uma transação"""
+        agora = datetime.now().isoformat(timespec="seconds")
+        with self._conexao() as conexao:
+            for dados_produto, codigos, fornecedor_id, verificado in registros:
+                conexao.execute(
+                    """INSERT INTO produtos (id, descricao, identificador_origem, fornecedor_id,
+                                             fornecedor_verificado, sincronizado_em)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (id) DO UPDATE SET
+                           descricao = excluded.descricao,
+                           identificador_origem = excluded.identificador_origem,
+                           fornecedor_id = CASE WHEN excluded.fornecedor_verificado
+                                                THEN excluded.fornecedor_id ELSE produtos.fornecedor_id END,
+                           fornecedor_verificado = MAX(produtos.fornecedor_verificado, excluded.fornecedor_verificado),
+                           sincronizado_em = excluded.sincronizado_em""",
+                    (dados_produto["id"], dados_produto.get("descricao"), dados_produto.get("identificadorDeOrigem"),
+                     fornecedor_id, int(verificado), agora)
+                )
+                chaves = [chave_codigo(codigo) for codigo in codigos]
+                if chaves and conexao.execute(
+                    f"SELECT 1 FROM codigos WHERE codigo IN ({','.join('?' * len(chaves))}) AND produto_id != ?",
+                    chaves + [dados_produto["id"]]
+                ).fetchone():
+                    self._contar_remocao(conexao)  # Código passou para outro produto: sai do anterior
+                conexao.executemany(
+                    "INSERT OR REPLACE INTO codigos (codigo, produto_id) VALUES (?, ?)",
+                    [(chave, dados_produto["id"]) for chave in chaves]
+                )
+
+    def guardar_fornecedores(self, nomes):
+        """Grava o mapa id -> nome fantasia (None = fornecedor sem fantasia)"""
+        with self._conexao() as conexao:
+            conexao.executemany(
+                "INSERT OR REPLACE INTO fornecedores (id, fantasia) VALUES (?, ?)", list(nomes.items())
+            )
+
+    def fornecedores_pendentes(self, todos=False):
+        """Ids de fornecedores referenciados por produtos e ainda sem registro (ou todos os referenciados)"""
+        return [linha[0] for linha in self._conexao().execute(
+            f"""SELECT DISTINCT p.fornecedor_id FROM produtos p
+                LEFT JOIN fornecedores f ON f.id = p.fornecedor_id
+                WHERE p.fornecedor_id IS NOT NULL {"" if todos else "AND f.id IS NULL"}"""
+        )]
+
+    def remover_produtos_exceto(self, produto_ids):
+        """Remove os produtos (e códigos) que não estão em `produto_ids`. Retorna quantos foram removidos"""
+        with self._conexao() as conexao:
+            conexao.execute("CREATE TEMP TABLE IF NOT EXISTS manter (id INTEGER PRIMARY KEY)")
+            conexao.execute("DELETE FROM manter")
+            conexao.executemany("INSERT OR IGNORE INTO manter (id) VALUES (?)", [(i,) for i in produto_ids])
+            removidos = conexao.execute("DELETE FROM produtos WHERE id NOT IN (SELECT id FROM manter)").rowcount
+            conexao.execute("DELETE FROM codigos WHERE produto_id NOT IN (SELECT id FROM produtos)")
+            if removidos:
+                self._contar_remocao(conexao)
+        return removidos
+
+    @staticmethod
+    def _contar_remocao(conexao):
+        conexao.execute(
+            """INSERT INTO estado (chave, valor) VALUES ('remocoes', '1')
+               ON CONFLICT (chave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1"""
+        )
+
+    def versao_remocoes(self):
+        """Contador de remoções (produtos excluídos ou códigos que mudaram de produto).
+
+        Essas mudanças não aparecem em `produtos_para_busca(gravados_desde)`;
+        quem mantém uma cópia do espelho a refaz quando o contador muda.
+        """
+        return self.ler_estado("remocoes")
+
+    def produtos_para_busca(self, gravados_desde=None):
+        """(id, descricao, identificador_origem, codigos, sincronizado_em) dos produtos do espelho.
+
+        Com `gravados_desde` (texto ISO de `sincronizado_em`), só os gravados a partir dele.
+        """
+        linhas = self._conexao().execute(
+            """SELECT p.id, p.descricao, p.identificador_origem, GROUP_CONCAT(c.codigo), p.sincronizado_em
+               FROM produtos p LEFT JOIN codigos c ON c.produto_id = p.id
+               WHERE ? IS NULL OR p.sincronizado_em >= ?
+               GROUP BY p.id""", (gravados_desde, gravados_desde)
+        )
+        return [(produto_id, descricao, origem, codigos.split(",") if codigos else [], sincronizado_em)
+                for produto_id, descricao, origem, codigos, sincronizado_em in linhas]
+
+    def ler_estado(self, chave):
+        linha = self._conexao().execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def gravar_estado(self, chave, valor):
+        with self._conexao() as conexao:
+            conexao.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)", (chave, valor))
+
+    def estatisticas(self):
+        conexao = self._conexao()
+        return {
+            "produtos": conexao.execute("SELECT COUNT(*) FROM produtos").fetchone()[0],
+            "codigos": conexao.execute("SELECT COUNT(*) FROM codigos").fetchone()[0],
+            "fornecedores": conexao.execute("SELECT COUNT(*) FROM fornecedores").fetchone()[0],
+            "ultima_sincronizacao": self.ler_estado("ultima_sincronizacao")
+        }
+
+
+class SincronizadorCatalogo:
+    """Preenche o espelho a partir das listagens da API.
+
+    A primeira sincronização (ou `completa=True`) percorre todo o cadastro e
+    remove do espelho os produtos que deixaram de existir; as seguintes pedem
+    só os produtos com `dataAlteracao` a partir da última sincronização (com
+    uma margem de sobreposição). Para cada produto listado são buscados o
+    fornecedor principal e os códigos de barras; os nomes dos fornecedores
+    novos são resolvidos em grupo no final.
+    """
+
+    def __init__(self, cliente, catalogo, max_simultaneas=MAX_SINCRONIZACOES_SIMULTANEAS):
+        self.cliente = cliente
+        self.catalogo = catalogo
+        self.max_simultaneas = max_simultaneas
+        self._lock = threading.Lock()  # Uma sincronização por vez
+
+    def _detalhar(self, dados_produto):
+        """(dados_produto, codigos, fornecedor_id, fornecedor_verificado) de um produto listado"""
+        produto_id = dados_produto["id"]
+        try:
+            codigos = self.cliente.codigos_do_produto(produto_id)
+        except requests.RequestException:
+            codigos = []
+        try:
+            return dados_produto, codigos, self.cliente.fornecedor_de(produto_id), True
+        except requests.RequestException:
+            return dados_produto, codigos, None, False
+
+    def sincronizar(self, completa=False):
+        """Executa uma sincronização e devolve o resumo (quantidades e duração)"""
+        with self._lock:
+            inicio = time.perf_counter()
+            iniciada_em = datetime.now()
+            ultima = self.catalogo.ler_estado("ultima_sincronizacao")
+            completa = completa or ultima is None
+            desde = None if completa else datetime.fromisoformat(ultima) - MARGEM_SINCRONIZACAO
+
+            produto_ids = []
+            codigos = sem_fornecedor = 0
+            pendentes = []  # Gravados em grupos, uma transação por grupo
+            with ThreadPoolExecutor(max_workers=self.max_simultaneas) as executor:
+                for registro in executor.map(self._detalhar, self.cliente.listar_produtos(desde)):
+                    produto_ids.append(registro[0]["id"])
+                    codigos += len(registro[1])
+                    sem_fornecedor += not registro[3]
+                    pendentes.append(registro)
+                    if len(pendentes) >= TAMANHO_GRUPO_SQL:
+                        self.catalogo.guardar_produtos(pendentes)
+                        pendentes = []
+            self.catalogo.guardar_produtos(pendentes)
+
+            removidos = self.catalogo.remover_produtos_exceto(produto_ids) if completa else 0
+
+            # Na completa os nomes fantasia também são renovados
+            fornecedores = self.catalogo.fornecedores_pendentes(todos=completa)
+            nomes = self.cliente.fantasias_fornecedores(fornecedores)
+            self.catalogo.guardar_fornecedores(nomes)
+
+            self.catalogo.gravar_estado("ultima_sincronizacao", iniciada_em.isoformat(timespec="seconds"))
+            resumo = {
+                "completa": completa,
+                "produtos": len(produto_ids),
+                "codigos": codigos,
+                "sem_fornecedor_verificado": sem_fornecedor,
+                "removidos": removidos,
+                "fornecedores": len(nomes),
+                "segundos": round(time.perf_counter() - inicio, 1)
+            }
+            METRICAS.observar("catalogo_sincronizacao_segundos", time.perf_counter() - inicio,
+                              tipo="completa" if completa else "incremental")
+            logger.info("Catálogo sincronizado: %s", resumo)
+            return resumo
+
+    def iniciar_periodico(self, intervalo=INTERVALO_SINCRONIZACAO):
+        """Sincroniza agora e depois a cada `intervalo` segundos, em uma thread de fundo"""
+        def executar():
+            while True:
+                try:
+                    self.sincronizar()
+                except Exception:
+                    logger.exception("Falha na sincronização do catálogo")
+                time.sleep(intervalo)
+
+        thread = threading.Thread(target=executar, name="sincronizacao-catalogo", daemon=True)
+        thread.start()
+        return thread
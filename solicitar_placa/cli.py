@@ -0,0 +1,219 @@
+"""Linha de comando para gerar formulários sem abrir o app.
+
+Exemplos:
+    python -m solicitar_placa lote codigos.xlsx --tipo 1 --tamanho C --loja MIMI -o forms/
+    python -m solicitar_placa sincronizar --catalogo catalogo.sqlite3
+    python -m solicitar_placa historico --historico historico.sqlite3 --loja MIMI
+    python -m solicitar_placa historico --historico historico.sqlite3 --exportar 12 -o forms/
+"""
+
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from solicitar_placa.api import URL_BASE, VarejoFacilClient, descrever_falha
+from solicitar_placa.catalogo import CatalogoLocal, SincronizadorCatalogo
+from solicitar_placa.consulta import ConsultaProdutos
+from solicitar_placa.formulario import modelo_padrao
+from solicitar_placa.historico import HistoricoSolicitacoes
+from solicitar_placa.ingestao import ler_codigos
+from solicitar_placa.limitador import REQUISICOES_POR_SEGUNDO, LimitadorRequisicoes
+from solicitar_placa.metricas import METRICAS
+from solicitar_placa.produtos import LOJAS, TAMANHO_PLACA_MAP, TIPO_PLACA_MAP, ListaProdutos, Produto
+
+# ===============================
+# CONSTANTES
+# ===============================
+ARQUIVO_SECRETS = Path(".streamlit") / "secrets.toml"
+NOME_RELATORIO = "nao_processados.csv"
+VARIAVEL_CATALOGO = "SOLICITAR_PLACA_CATALOGO"
+VARIAVEL_HISTORICO = "SOLICITAR_PLACA_HISTORICO"
+
+
+def credenciais_api(arquivo_secrets=ARQUIVO_SECRETS):
+    """(x_api_key, cookie) das variáveis de ambiente ou do secrets.toml do Streamlit"""
+    x_api_key = os.environ.get("VAREJO_FACIL_API_KEY")
+    cookie = os.environ.get("VAREJO_FACIL_COOKIE")
+    if x_api_key and cookie:
+        return x_api_key, cookie
+
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        tomllib = None
+
+    arquivo_secrets = Path(arquivo_secrets)
+    if tomllib is not None and arquivo_secrets.exists():
+        with arquivo_secrets.open("rb") as arquivo:
+            api = tomllib.load(arquivo).get("api", {})
+        return x_api_key or api.get("x_api_key"), cookie or api.get("cookie")
+
+    return x_api_key, cookie
+
+
+def _mostrar_progresso(concluidos, total):
+    print(f"\rProcessando {concluidos} de {total} produtos...", end="", file=sys.stderr, flush=True)
+    if concluidos == total:
+        print(file=sys.stderr)
+
+
+def criar_cliente():
+    """Cliente da API com as credenciais, a URL e o orçamento do ambiente, ou None sem credenciais"""
+    x_api_key, cookie = credenciais_api()
+    if not x_api_key or not cookie:
+        print("Credenciais da API não encontradas: defina VAREJO_FACIL_API_KEY e VAREJO_FACIL_COOKIE "
+              f"ou crie {ARQUIVO_SECRETS}.", file=sys.stderr)
+        return None
+
+    url_base = os.environ.get("VAREJO_FACIL_URL", URL_BASE)
+    limitador = LimitadorRequisicoes(float(os.environ.get("VAREJO_FACIL_RPS", REQUISICOES_POR_SEGUNDO)))
+    return VarejoFacilClient(x_api_key, cookie, url_base=url_base, limitador=limitador)
+
+
+def comando_lote(args):
+    """Lê os códigos, consulta os produtos e grava os formulários no diretório de saída"""
+    cliente = criar_cliente()
+    if cliente is None:
+        return 2
+
+    with open(args.arquivo, "rb") as arquivo:
+        leitura = ler_codigos(arquivo, args.arquivo)
+
+    catalogo = CatalogoLocal(args.catalogo) if args.catalogo else None
+    consulta = ConsultaProdutos(cliente, catalogo=catalogo)
+    consulta.registrar_metricas()
+    resultados = consulta.consultar_lote(leitura.codigos, ao_concluir=_mostrar_progresso)
+
+    produtos = ListaProdutos()
+    nao_processados = [
+        {"Código de Barras": r["Valor"], "Motivo": r["Motivo"]} for r in leitura.rejeitados
+    ]
+    for codigo, dados in zip(leitura.codigos, resultados):
+        if dados is None:
+            nao_processados.append({"Código de Barras": codigo, "Motivo": "Não encontrado"})
+        elif isinstance(dados, requests.RequestException):
+            nao_processados.append({"Código de Barras": codigo, "Motivo": descrever_falha(dados)})
+        else:
+            produtos.adicionar(Produto.de_consulta(codigo, dados, args.tipo, args.tamanho))
+
+    saida = Path(args.saida)
+    caminhos = modelo_padrao().gravar_paginas(
+        saida, args.loja, args.data, args.solicitante, list(produtos)
+    ) if produtos else []
+    if produtos and args.historico:
+        HistoricoSolicitacoes(args.historico).registrar(args.loja, args.data, args.solicitante, list(produtos))
+
+    if nao_processados:
+        saida.mkdir(parents=True, exist_ok=True)
+        with (saida / NOME_RELATORIO).open("w", newline="", encoding="utf-8") as arquivo:
+            escritor = csv.DictWriter(arquivo, fieldnames=["Código de Barras", "Motivo"], delimiter=";")
+            escritor.writeheader()
+            escritor.writerows(nao_processados)
+
+    print(f"Produtos adicionados: {len(produtos)}")
+    print(f"Não processados: {len(nao_processados)}")
+    print(f"Duplicados no arquivo: {len(leitura.duplicados)}")
+    for caminho in caminhos:
+        print(caminho)
+
+    if args.metricas:
+        Path(args.metricas).write_text(METRICAS.como_json(), encoding="utf-8")
+
+    return 0 if produtos else 1
+
+
+def comando_sincronizar(args):
+    """Atualiza o espelho local do cadastro (completo na primeira vez, depois só os alterados)"""
+    if not args.catalogo:
+        print(f"Informe o arquivo do espelho com --catalogo ou {VARIAVEL_CATALOGO}.", file=sys.stderr)
+        return 2
+    cliente = criar_cliente()
+    if cliente is None:
+        return 2
+
+    resumo = SincronizadorCatalogo(cliente, CatalogoLocal(args.catalogo)).sincronizar(completa=args.completa)
+    for chave, valor in resumo.items():
+        print(f"{chave}: {valor}")
+    return 0
+
+
+def comando_historico(args):
+    """Lista as solicitações do histórico ou grava de novo os formulários de uma delas"""
+    if not args.historico:
+        print(f"Informe o arquivo do histórico com --historico ou {VARIAVEL_HISTORICO}.", file=sys.stderr)
+        return 2
+    historico = HistoricoSolicitacoes(args.historico)
+
+    if args.exportar is not None:
+        carregada = historico.carregar(args.exportar)
+        if carregada is None:
+            print(f"Solicitação {args.exportar} não encontrada no histórico.", file=sys.stderr)
+            return 1
+        cabecalho, produtos = carregada
+        for caminho in modelo_padrao().gravar_paginas(
+            Path(args.saida), cabecalho["loja"], args.data or cabecalho["data"], cabecalho["solicitante"] or "",
+            produtos
+        ):
+            print(caminho)
+        return 0
+
+    solicitacoes = historico.listar(loja=args.loja, codigo_barras=args.codigo)
+    for solicitacao in solicitacoes:
+        repeticoes = f" ({solicitacao['repeticoes']}x)" if solicitacao["repeticoes"] > 1 else ""
+        print(f"{solicitacao['id']}\t{solicitacao['data']}\t{solicitacao['loja']}\t"
+              f"{solicitacao['solicitante'] or ''}\t{solicitacao['quantidade']} produtos{repeticoes}")
+    return 0 if solicitacoes else 1
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="python -m solicitar_placa", description="Solicitação de placas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    lote = subparsers.add_parser("lote", help="Gera os formulários para uma lista de códigos de barras")
+    lote.add_argument("arquivo", help="Arquivo .xlsx (coluna CODIGO DE BARRAS), .csv ou .txt")
+    lote.add_argument("--tipo", type=int, required=True, choices=sorted(TIPO_PLACA_MAP.values()),
+                      help="Tipo de placa: " + ", ".join(TIPO_PLACA_MAP))
+    lote.add_argument("--tamanho", required=True, type=str.upper, choices=sorted(TAMANHO_PLACA_MAP.values()),
+                      help="Tamanho da placa: " + ", ".join(TAMANHO_PLACA_MAP))
+    lote.add_argument("--loja", required=True, choices=LOJAS)
+    lote.add_argument("--solicitante", default="", help="Nome do solicitante impresso no formulário")
+    lote.add_argument("--data", default=datetime.now().strftime("%d/%m/%Y"),
+                      help="Data da solicitação (padrão: hoje)")
+    lote.add_argument("-o", "--saida", default=".", help="Diretório onde os formulários serão gravados")
+    lote.add_argument("--metricas", metavar="ARQUIVO",
+                      help="Grava em JSON as chamadas à API e os tempos medidos na execução")
+    lote.add_argument("--catalogo", default=os.environ.get(VARIAVEL_CATALOGO), metavar="ARQUIVO",
+                      help=f"Espelho local (SQLite) consultado antes da API (padrão: ${VARIAVEL_CATALOGO})")
+    lote.add_argument("--historico", default=os.environ.get(VARIAVEL_HISTORICO), metavar="ARQUIVO",
+                      help=f"Histórico (SQLite) onde a solicitação é registrada (padrão: ${VARIAVEL_HISTORICO})")
+    lote.set_defaults(funcao=comando_lote)
+
+    sincronizar = subparsers.add_parser("sincronizar", help="Atualiza o espelho local do cadastro de produtos")
+    sincronizar.add_argument("--catalogo", default=os.environ.get(VARIAVEL_CATALOGO), metavar="ARQUIVO",
+                             help=f"Arquivo SQLite do espelho (padrão: ${VARIAVEL_CATALOGO})")
+    sincronizar.add_argument("--completa", action="store_true",
+                             help="Percorre todo o cadastro e remove os produtos que deixaram de existir")
+    sincronizar.set_defaults(funcao=comando_sincronizar)
+
+    historico = subparsers.add_parser("historico", help="Lista ou exporta de novo solicitações já geradas")
+    historico.add_argument("--historico", default=os.environ.get(VARIAVEL_HISTORICO), metavar="ARQUIVO",
+                           help=f"Arquivo SQLite do histórico (padrão: ${VARIAVEL_HISTORICO})")
+    historico.add_argument("--loja", choices=LOJAS, help="Só as solicitações da loja")
+    historico.add_argument("--codigo", help="Só as solicitações com este código de barras")
+    historico.add_argument("--exportar", type=int, metavar="ID",
+                           help="Grava os formulários da solicitação, sem consultar a API")
+    historico.add_argument("--data", help="Data impressa ao exportar (padrão: a da solicitação)")
+    historico.add_argument("-o", "--saida", default=".", help="Diretório onde os formulários serão gravados")
+    historico.set_defaults(funcao=comando_historico)
+
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    return args.funcao(args)
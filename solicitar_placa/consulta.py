@@ -0,0 +1,345 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from solicitar_placa.api import FornecedorIndisponivel
+from solicitar_placa.cache import CacheTTL, ChamadaUnica
+from solicitar_placa.metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+MAX_CONSULTAS_SIMULTANEAS = 16  # Threads do lote; a concorrência efetiva é regulada pelo limitador do cliente
+CACHE_PRODUTOS_TTL = 6 * 60 * 60  # Segundos que um produto consultado fica em cache
+CACHE_PRODUTOS_TAMANHO = 5000  # Máximo de códigos de barras mantidos em cache
+CACHE_FORNECEDORES_TTL = 24 * 60 * 60  # Segundos que o nome fantasia de um fornecedor fica em cache
+CACHE_PRECOS_TTL = 10 * 60  # Segundos que os preços de um produto ficam em cache
+ESPERA_REVALIDACAO = 2.0  # Segundos entre tentativas de atualizar um produto servido desatualizado
+
+FORNECEDOR_NAO_ENCONTRADO = "Não encontrado"
+
+
+def montar_dados_produto(dados_produto, fornecedor_nome):
+    """Campos do produto usados no formulário a partir da resposta da API"""
+    return {
+        "produto_id": dados_produto.get("id"),
+        "Descrição": dados_produto.get("descricao"),
+        "Fornecedor": fornecedor_nome or FORNECEDOR_NAO_ENCONTRADO,
+        "Identificador de Origem": dados_produto.get("identificadorDeOrigem")
+    }
+
+
+def resumir_precos(dados_precos):
+    """Preço de venda e de oferta a partir da resposta de /precos"""
+    if isinstance(dados_precos, dict):
+        dados_precos = dados_precos.get("items", [])
+    if not dados_precos:
+        return {"Preço Venda": None, "Preço Oferta": None}
+
+    preco = dados_precos[0]
+    return {
+        "Preço Venda": preco.get("precoVenda1"),
+        "Preço Oferta": preco.get("precoOferta1")
+    }
+
+
+class ConsultaProdutos:
+    """Resolve códigos de barras em produtos, combinando a API e os caches.
+
+    Uma instância por processo atende o app (todas as sessões) ou a linha de
+    comando; os caches são compartilhados entre as threads das consultas.
+    Com um `catalogo` (espelho local, ver solicitar_placa.catalogo) os códigos
+    fora do cache são procurados nele antes da API, e os produtos consultados
+    ao vivo são gravados nele.
+
+    Consultas simultâneas do mesmo código de barras ou fornecedor (várias
+    sessões pedindo os mesmos produtos de uma promoção) são coalescidas: só
+    uma vai à API e as demais aguardam o resultado dela.
+
+    Se a API falhar (ou o disjuntor do cliente estiver aberto), produtos já
+    consultados antes são servidos com os dados da última consulta, marcados
+    com `"desatualizado": True`, e atualizados em segundo plano quando a API voltar.
+    """
+
+    def __init__(self, cliente, cache_produtos=None, cache_fornecedores=None, cache_precos=None,
+                 max_simultaneas=MAX_CONSULTAS_SIMULTANEAS, catalogo=None):
+        self.cliente = cliente
+        self.catalogo = catalogo
+        # `is None`: um CacheTTL vazio é falso (tem __len__)
+        if cache_produtos is None:
+            cache_produtos = CacheTTL(ttl=CACHE_PRODUTOS_TTL, tamanho_maximo=CACHE_PRODUTOS_TAMANHO, manter_vencidos=True)
+        self.cache_produtos = cache_produtos
+        self.cache_fornecedores = CacheTTL(ttl=CACHE_FORNECEDORES_TTL) if cache_fornecedores is None else cache_fornecedores
+        self.cache_precos = CacheTTL(ttl=CACHE_PRECOS_TTL) if cache_precos is None else cache_precos
+        self.max_simultaneas = max_simultaneas
+        self.em_andamento_produtos = ChamadaUnica()
+        self.em_andamento_fornecedores = ChamadaUnica()
+        self._revalidar = set()  # Códigos servidos desatualizados, à espera da API
+        self._revalidando = False
+        self._lock_revalidacao = threading.Lock()
+
+    def registrar_metricas(self, registro=METRICAS):
+        """Inclui as estatísticas dos caches e do limitador na exportação das métricas"""
+        registro.registrar_medidor("limitador", self.cliente.limitador.estatisticas)
+        registro.registrar_medidor("disjuntor", self.cliente.disjuntor.estatisticas)
+        registro.registrar_medidor("cache_produtos", self.cache_produtos.estatisticas)
+        registro.registrar_medidor("cache_fornecedores", self.cache_fornecedores.estatisticas)
+        registro.registrar_medidor("cache_precos", self.cache_precos.estatisticas)
+        registro.registrar_medidor("coalescencia_produtos", self.em_andamento_produtos.estatisticas)
+        registro.registrar_medidor("coalescencia_fornecedores", self.em_andamento_fornecedores.estatisticas)
+        if self.catalogo is not None:
+            registro.registrar_medidor("catalogo", self.catalogo.estatisticas)
+
+    def _guardar_no_catalogo(self, consultados, nomes):
+        """Grava no espelho os (codigo, dados_produto, fornecedor_id) consultados ao vivo"""
+        if self.catalogo is None or not consultados:
+            return
+        self.catalogo.guardar_produtos([
+            (dados_produto, [codigo], fornecedor_id, True)
+            for codigo, dados_produto, fornecedor_id in consultados
+            if fornecedor_id is None or fornecedor_id in nomes
+        ])
+        self.catalogo.guardar_fornecedores(nomes)
+
+    def resolver_fornecedores(self, fornecedor_ids):
+        """Nomes fantasia dos fornecedores, consultando na API apenas os ids distintos fora do cache.
+
+        Ids cuja consulta falhou ficam fora do resultado; os sem fantasia vêm com None.
+        """
+        nomes = {}
+        faltantes = []
+        for fornecedor_id in set(fornecedor_ids):
+            if fornecedor_id is None:
+                continue
+            nome = self.cache_fornecedores.obter(fornecedor_id)
+            if nome is None:
+                faltantes.append(fornecedor_id)
+            else:
+                nomes[fornecedor_id] = nome
+
+        consultados = self.em_andamento_fornecedores.executar_varios(faltantes, self.cliente.fantasias_fornecedores)
+        for fornecedor_id, nome in consultados.items():
+            if nome is not None:
+                self.cache_fornecedores.guardar(fornecedor_id, nome)
+            nomes[fornecedor_id] = nome
+
+        return nomes
+
+    def consultar(self, codigo, forcar_atualizacao=False):
+        """Consulta produto e fornecedor (usando o cache). Retorna None se o produto não for encontrado.
+
+        Falhas da API no produto ou no fornecedor (429/5xx após as repetições, rede, disjuntor aberto)
+        levantam `requests.RequestException`, a menos que haja dados de uma
+        consulta anterior para servir como desatualizados.
+        """
+        if not forcar_atualizacao:
+            dados = self.cache_produtos.obter(codigo)
+            if dados is None and self.catalogo is not None:
+                dados = self.catalogo.buscar(codigo)
+                if dados is not None:
+                    self.cache_produtos.guardar(codigo, dados)
+            if dados is not None:
+                return dados
+
+        try:
+            return self._consultar_ao_vivo(codigo)
+        except requests.RequestException:
+            dados = self._servir_desatualizado(codigo)
+            if dados is None:
+                raise
+            return dados
+
+    def _consultar_ao_vivo(self, codigo):
+        """Consulta na API e atualiza o cache e o espelho local"""
+        resposta = self._consultar_produto_e_fornecedor(codigo)
+        if resposta is None:
+            self.cache_produtos.invalidar(codigo)
+            return None
+
+        dados_produto, fornecedor_id = resposta
+        nomes = self.resolver_fornecedores([fornecedor_id])
+        self._guardar_no_catalogo([(codigo, dados_produto, fornecedor_id)], nomes)
+        if fornecedor_id is not None and fornecedor_id not in nomes:
+            # Falha na consulta do fornecedor: não é o mesmo que produto sem fornecedor
+            raise FornecedorIndisponivel(fornecedor_id)
+
+        dados = montar_dados_produto(dados_produto, nomes.get(fornecedor_id))
+        self.cache_produtos.guardar(codigo, dados)
+        return dados
+
+    def _servir_desatualizado(self, codigo):
+        """Dados da última consulta do código (mesmo vencidos), agendando a atualização; None se não houver"""
+        dados = self.cache_produtos.obter_vencido(codigo)
+        if dados is None:
+            return None
+        METRICAS.incrementar("produtos_desatualizados_total")
+        with self._lock_revalidacao:
+            self._revalidar.add(codigo)
+            if self._revalidando:
+                return {**dados, "desatualizado": True}
+            self._revalidando = True
+        threading.Thread(target=self._revalidar_pendentes, name="revalidacao-produtos", daemon=True).start()
+        return {**dados, "desatualizado": True}
+
+    def _revalidar_pendentes(self):
+        """Atualiza, um a um, os produtos servidos desatualizados assim que a API aceitar chamadas"""
+        while True:
+            with self._lock_revalidacao:
+                if not self._revalidar:
+                    self._revalidando = False
+                    return
+                codigo = self._revalidar.pop()
+
+            time.sleep(self.cliente.disjuntor.espera())
+            try:
+                self._consultar_ao_vivo(codigo)
+            except requests.RequestException:
+                with self._lock_revalidacao:
+                    self._revalidar.add(codigo)
+                time.sleep(ESPERA_REVALIDACAO)
+            except Exception:
+                logger.exception("Falha ao atualizar o produto %s", codigo)
+
+    def _consultar_produto_e_fornecedor(self, codigo):
+        """Consulta o produto e o id do seu fornecedor. Retorna None se o produto não for encontrado.
+
+        Se o mesmo código já estiver sendo consultado por outra thread, aguarda e reaproveita o resultado.
+        """
+        return self.em_andamento_produtos.executar(codigo, lambda: self._consultar_na_api(codigo))
+
+    def _consultar_na_api(self, codigo):
+        dados_produto = self.cliente.consultar_produto(codigo)
+        if dados_produto is None:
+            return None
+        return dados_produto, self.cliente.fornecedor_de(dados_produto.get("id"))
+
+    def consultar_lote(self, codigos, ao_concluir=None, ao_resultado=None):
+        """Consulta vários códigos em paralelo, mantendo a ordem original nos resultados.
+
+        Códigos já em cache ou no espelho local não vão à API. Os demais seguem a cadeia
+        produto -> fornecedor em uma única thread; os fornecedores fora do cache
+        dos produtos que terminam juntos são resolvidos em uma consulta agrupada.
+        `ao_concluir(concluidos, total)` e `ao_resultado(indice, resultado)` são
+        chamados na thread de quem chamou assim que cada código fica pronto,
+        para atualizar a barra de progresso e gravar o resultado sem esperar o lote.
+
+        Cada resultado é o dicionário do produto (com `"desatualizado": True` se
+        veio da última consulta por falha da API), None (não encontrado) ou a
+        `requests.RequestException` da consulta que falhou (ver `descrever_falha`).
+        """
+        resultados = [None] * len(codigos)
+        if not codigos:
+            return resultados
+
+        inicio = time.perf_counter()
+        contagem = dict.fromkeys(
+            ("cache", "catalogo", "encontrado", "nao_encontrado", "desatualizado", "erro"), 0
+        )
+
+        def concluir(i, resultado, tipo):
+            resultados[i] = resultado
+            contagem[tipo] += 1
+            if ao_resultado:
+                ao_resultado(i, resultado)
+            if ao_concluir:
+                ao_concluir(sum(contagem.values()), len(codigos))
+
+        def falhou(i, erro):
+            dados = self._servir_desatualizado(codigos[i])
+            if dados is None:
+                concluir(i, erro, "erro")
+            else:
+                concluir(i, dados, "desatualizado")
+
+        def concluir_encontrados(itens, nomes):
+            """Itens {índice: (dados_produto, fornecedor_id)} com os nomes dos fornecedores já resolvidos"""
+            self._guardar_no_catalogo(
+                [(codigos[i], dados_produto, fornecedor_id) for i, (dados_produto, fornecedor_id) in itens.items()],
+                nomes
+            )
+            for i, (dados_produto, fornecedor_id) in itens.items():
+                if fornecedor_id is not None and fornecedor_id not in nomes:
+                    # Falha na consulta do fornecedor: tratado como falha da API, não como "Não encontrado"
+                    falhou(i, FornecedorIndisponivel(fornecedor_id))
+                    continue
+                dados = montar_dados_produto(dados_produto, nomes.get(fornecedor_id))
+                self.cache_produtos.guardar(codigos[i], dados)
+                concluir(i, dados, "encontrado")
+
+        pendentes = []
+        for i, codigo in enumerate(codigos):
+            dados = self.cache_produtos.obter(codigo)
+            if dados is None:
+                pendentes.append(i)
+            else:
+                concluir(i, dados, "cache")
+
+        if self.catalogo is not None and pendentes:
+            no_catalogo = self.catalogo.buscar_varios([codigos[i] for i in pendentes])
+            restantes = []
+            for i in pendentes:
+                dados = no_catalogo.get(codigos[i])
+                if dados is None:
+                    restantes.append(i)
+                    continue
+                self.cache_produtos.guardar(codigos[i], dados)
+                concluir(i, dados, "catalogo")
+            pendentes = restantes
+
+        with ThreadPoolExecutor(max_workers=self.max_simultaneas) as executor:
+            futuros = {
+                executor.submit(self._consultar_produto_e_fornecedor, codigos[i]): i
+                for i in pendentes
+            }
+            em_andamento = set(futuros)
+            while em_andamento:
+                prontos, em_andamento = wait(em_andamento, return_when=FIRST_COMPLETED)
+                aguardando = {}  # índice -> (dados_produto, fornecedor_id) com o fornecedor fora do cache
+                for futuro in prontos:
+                    i = futuros[futuro]
+                    try:
+                        resposta = futuro.result()
+                    except requests.RequestException as erro:
+                        falhou(i, erro)
+                        continue
+                    if resposta is None:
+                        concluir(i, None, "nao_encontrado")
+                        continue
+
+                    fornecedor_id = resposta[1]
+                    nome = None if fornecedor_id is None else self.cache_fornecedores.obter(fornecedor_id)
+                    if fornecedor_id is None or nome is not None:
+                        concluir_encontrados({i: resposta}, {} if fornecedor_id is None else {fornecedor_id: nome})
+                    else:
+                        aguardando[i] = resposta
+                # Fornecedores dos produtos que terminaram juntos: uma consulta agrupada por rodada
+                if aguardando:
+                    concluir_encontrados(aguardando, self.resolver_fornecedores(f for _, f in aguardando.values()))
+
+        METRICAS.observar("lote_segundos", time.perf_counter() - inicio)
+        for resultado, quantidade in contagem.items():
+            METRICAS.incrementar("lote_itens_total", quantidade, resultado=resultado)
+        return resultados
+
+    def precos(self, codigo):
+        """Preços do produto (usando os caches). Só é chamada quando o usuário pede os preços"""
+        dados = self.consultar(codigo)
+        if dados is None:
+            return resumir_precos(None)
+
+        produto_id = dados["produto_id"]
+        precos = self.cache_precos.obter(produto_id)
+        if precos is None:
+            precos = resumir_precos(self.cliente.precos(produto_id))
+            self.cache_precos.guardar(produto_id, precos)
+        return precos
+
+    def precos_lote(self, codigos):
+        """Preços de vários códigos em paralelo, na ordem original"""
+        with ThreadPoolExecutor(max_workers=self.max_simultaneas) as executor:
+            return list(executor.map(self.precos, codigos))
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import requests
+
+# ===============================
+# CONSTANTES
+# ===============================
+FALHAS_PARA_ABRIR = 5     # Falhas seguidas (rede, 5xx ou resposta lenta) que abrem o circuito
+LATENCIA_LENTA = 5.0      # Segundos; respostas mais lentas contam como falha
+TEMPO_ABERTO = 30.0       # Segundos recusando chamadas antes de testar a API de novo
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class CircuitoAberto(requests.RequestException):
+    """A API está indisponível e a chamada foi recusada sem ir à rede"""
+
+    def __init__(self, restante):
+        super().__init__(f"API indisponível; nova tentativa em {restante:.0f} s")
+        self.restante = restante
+
+
+class Disjuntor:
+    """Circuit breaker das chamadas à API, seguro entre threads.
+
+    Fechado, deixa passar tudo e conta as falhas seguidas; ao atingir o limite
+    abre e recusa as chamadas (CircuitoAberto) por `tempo_aberto` segundos.
+    Depois disso deixa passar uma única chamada de teste (meio aberto): se
+    der certo o circuito fecha, se falhar volta a abrir. Só o resultado do
+    teste (registrado com o token devolvido por `permitir`) decide; chamadas
+    que começaram antes da abertura e terminam durante o teste são ignoradas.
+    """
+
+    def __init__(self, falhas_para_abrir=FALHAS_PARA_ABRIR, latencia_lenta=LATENCIA_LENTA,
+                 tempo_aberto=TEMPO_ABERTO, relogio=time.monotonic):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.latencia_lenta = latencia_lenta
+        self.tempo_aberto = tempo_aberto
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self.recusadas = 0
+        self._relogio = relogio
+        self._aberto_em = 0.0
+        self._teste = None  # Token da chamada de teste em andamento
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Levanta CircuitoAberto se a chamada não deve ir à API agora.
+
+        Retorna o token da chamada de teste (meio aberto) ou None; o token
+        deve ser repassado a `registrar`.
+        """
+        with self._lock:
+            if self.estado == ABERTO:
+                restante = self._aberto_em + self.tempo_aberto - self._relogio()
+                if restante > 0:
+                    self.recusadas += 1
+                    raise CircuitoAberto(restante)
+                self.estado = MEIO_ABERTO
+            if self.estado == MEIO_ABERTO:
+                if self._teste is not None:
+                    self.recusadas += 1
+                    raise CircuitoAberto(0)
+                self._teste = object()
+                return self._teste
+            return None
+
+    def registrar(self, status, latencia, teste=None):
+        """Resultado de uma chamada permitida (status None = falha de rede; `teste` = token de `permitir`)"""
+        falha = status is None or status >= 500 or latencia > self.latencia_lenta
+        with self._lock:
+            if teste is not None and teste is self._teste:
+                self._teste = None
+            elif self.estado == MEIO_ABERTO:
+                return  # Chamada anterior à abertura: só o teste decide
+            if not falha:
+                self.estado = FECHADO
+                self.falhas_seguidas = 0
+                return
+            self.falhas_seguidas += 1
+            if self.estado == MEIO_ABERTO or self.falhas_seguidas >= self.falhas_para_abrir:
+                if self.estado != ABERTO:
+                    self.aberturas += 1
+                self.estado = ABERTO
+                self._aberto_em = self._relogio()
+
+    def espera(self):
+        """Segundos até o circuito aceitar uma chamada de teste (0 se não estiver aberto)"""
+        with self._lock:
+            if self.estado != ABERTO:
+                return 0.0
+            return max(0.0, self._aberto_em + self.tempo_aberto - self._relogio())
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "aberto": int(self.estado != FECHADO),
+                "falhas_seguidas": self.falhas_seguidas,
+                "aberturas": self.aberturas,
+                "recusadas": self.recusadas
+            }
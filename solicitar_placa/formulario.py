@@ -0,0 +1,190 @@
+import math
+import re
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from solicitar_placa.metricas import METRICAS
+
+# ===============================
+# CONSTANTES
+# ===============================
+CAMINHO_MODELO = Path(__file__).resolve().parent.parent / "solicitar placa.xlsx"
+PLANILHA_MODELO = "xl/worksheets/sheet1.xml"
+
+PRIMEIRA_LINHA_PRODUTOS = 16
+LINHAS_POR_FORMULARIO = 23  # Linhas 16 a 38 do modelo
+
+# Coluna do formulário -> atributo do Produto
+COLUNAS_PRODUTO = [
+    ("B", "tipo_placa"),
+    ("C", "tamanho_placa"),
+    ("D", "fornecedor"),
+    ("E", "codigo_barras"),
+    ("F", "identificador_origem"),
+    ("G", "descricao")
+]
+
+NOME_ARQUIVO = "solicitar placa"
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MIME_ZIP = "application/zip"
+
+CELULA_LOJA = "C7"
+CELULA_DATA = "D7"
+CELULA_SOLICITANTE = "B9"
+
+# Caracteres de controle não permitidos em XML 1.0
+_CARACTERES_INVALIDOS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_ESTILO = re.compile(r'\ss="(\d+)"')
+
+
+def _celula(ref, estilo, valor):
+    """XML de uma célula com o valor informado (número ou texto inline)"""
+    atributos = f' r="{ref}"' + (f' s="{estilo}"' if estilo else "")
+
+    if valor is None or valor == "":
+        return f"<c{atributos}/>"
+
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f"<c{atributos}><v>{valor}</v></c>"
+
+    texto = escape(_CARACTERES_INVALIDOS.sub("", str(valor)))
+    return f'<c{atributos} t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+class ModeloFormulario:
+    """Modelo 'solicitar placa.xlsx' lido uma única vez e preenchido por substituição de XML.
+
+    O XML da planilha é dividido em trechos fixos e nas células que recebem
+    valores (cabeçalho e colunas B-G das linhas de produto). Gerar um
+    formulário é apenas juntar esses trechos e recompactar o arquivo, sem
+    carregar o workbook no openpyxl.
+    """
+
+    def __init__(self, conteudo_xlsx):
+        with zipfile.ZipFile(BytesIO(conteudo_xlsx)) as arquivo:
+            self._entradas = [(info, arquivo.read(info)) for info in arquivo.infolist()]
+
+        xml = next(dados for info, dados in self._entradas if info.filename == PLANILHA_MODELO).decode("utf-8")
+
+        refs = [CELULA_LOJA, CELULA_DATA, CELULA_SOLICITANTE]
+        for linha in range(PRIMEIRA_LINHA_PRODUTOS, PRIMEIRA_LINHA_PRODUTOS + LINHAS_POR_FORMULARIO):
+            refs.extend(f"{coluna}{linha}" for coluna, _ in COLUNAS_PRODUTO)
+
+        encontradas = []
+        for ref in refs:
+            match = re.search(rf'<c r="{ref}"([^>]*?)(?:/>|>.*?</c>)', xml, re.DOTALL)
+            if match is None:
+                raise ValueError(f"Célula {ref} não encontrada no modelo do formulário")
+            estilo = _ESTILO.search(match.group(1))
+            encontradas.append((match.start(), match.end(), ref, estilo.group(1) if estilo else None))
+        encontradas.sort()
+
+        # Trechos fixos intercalados com as células preenchidas
+        self._trechos = []
+        self._celulas = []  # (ref, estilo) na ordem do documento
+        inicio = 0
+        for comeco, fim, ref, estilo in encontradas:
+            self._trechos.append(xml[inicio:comeco])
+            self._celulas.append((ref, estilo))
+            inicio = fim
+        self._trechos.append(xml[inicio:])
+
+    @classmethod
+    def de_arquivo(cls, caminho=CAMINHO_MODELO):
+        """Lê o modelo do disco"""
+        return cls(Path(caminho).read_bytes())
+
+    def _xml_planilha(self, valores):
+        """XML da planilha com os valores {ref: valor} aplicados"""
+        partes = [self._trechos[0]]
+        for (ref, estilo), trecho in zip(self._celulas, self._trechos[1:]):
+            partes.append(_celula(ref, estilo, valores.get(ref)))
+            partes.append(trecho)
+        return "".join(partes).encode("utf-8")
+
+    def renderizar(self, loja, data_solicitacao, solicitante, produtos):
+        """Bytes de um formulário preenchido com até LINHAS_POR_FORMULARIO produtos"""
+        valores = {
+            CELULA_LOJA: loja,
+            CELULA_DATA: f"DATA: {data_solicitacao}",
+            CELULA_SOLICITANTE: f"SOLICITANTE: {solicitante}"
+        }
+        for i, produto in enumerate(produtos[:LINHAS_POR_FORMULARIO]):
+            linha = PRIMEIRA_LINHA_PRODUTOS + i
+            for coluna, campo in COLUNAS_PRODUTO:
+                valores[f"{coluna}{linha}"] = getattr(produto, campo)
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as arquivo:
+            for info, dados in self._entradas:
+                if info.filename == PLANILHA_MODELO:
+                    dados = self._xml_planilha(valores)
+                arquivo.writestr(info, dados, compress_type=zipfile.ZIP_DEFLATED)
+        return buffer.getvalue()
+
+    def renderizar_paginas(self, loja, data_solicitacao, solicitante, produtos):
+        """Gera um formulário por página de LINHAS_POR_FORMULARIO produtos, um de cada vez"""
+        for inicio in range(0, max(len(produtos), 1), LINHAS_POR_FORMULARIO):
+            yield self.renderizar(loja, data_solicitacao, solicitante,
+                                  produtos[inicio:inicio + LINHAS_POR_FORMULARIO])
+
+    def gravar_zip(self, destino, loja, data_solicitacao, solicitante, produtos):
+        """Grava todas as páginas em um ZIP (caminho ou arquivo aberto), uma página por vez na memória"""
+        total = quantidade_formularios(len(produtos))
+        with zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED) as arquivo:
+            paginas = self.renderizar_paginas(loja, data_solicitacao, solicitante, produtos)
+            for numero, conteudo in enumerate(paginas, start=1):
+                arquivo.writestr(nome_pagina(numero, total), conteudo)
+
+    def gravar_paginas(self, diretorio, loja, data_solicitacao, solicitante, produtos):
+        """Grava cada página como um .xlsx no diretório. Retorna os caminhos gravados"""
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        total = quantidade_formularios(len(produtos))
+
+        caminhos = []
+        with METRICAS.medir("formulario_segundos", formato="arquivos"):
+            paginas = self.renderizar_paginas(loja, data_solicitacao, solicitante, produtos)
+            for numero, conteudo in enumerate(paginas, start=1):
+                nome = f"{NOME_ARQUIVO}.xlsx" if total == 1 else nome_pagina(numero, total)
+                caminho = diretorio / nome
+                caminho.write_bytes(conteudo)
+                caminhos.append(caminho)
+        return caminhos
+
+    def exportar(self, loja, data_solicitacao, solicitante, produtos):
+        """Formulário único (.xlsx) ou ZIP com várias páginas, conforme `arquivo_exportacao`"""
+        if quantidade_formularios(len(produtos)) == 1:
+            with METRICAS.medir("formulario_segundos", formato="xlsx"):
+                return self.renderizar(loja, data_solicitacao, solicitante, produtos)
+
+        with METRICAS.medir("formulario_segundos", formato="zip"):
+            buffer = BytesIO()
+            self.gravar_zip(buffer, loja, data_solicitacao, solicitante, produtos)
+            return buffer.getvalue()
+
+
+def arquivo_exportacao(quantidade_produtos):
+    """Nome do arquivo e tipo MIME da exportação para a quantidade de produtos"""
+    if quantidade_formularios(quantidade_produtos) == 1:
+        return f"{NOME_ARQUIVO}.xlsx", MIME_XLSX
+    return f"{NOME_ARQUIVO}.zip", MIME_ZIP
+
+
+def quantidade_formularios(quantidade_produtos):
+    """Número de formulários necessários para a quantidade de produtos"""
+    return max(1, math.ceil(quantidade_produtos / LINHAS_POR_FORMULARIO))
+
+
+def nome_pagina(numero, total):
+    """Nome do arquivo de uma página dentro do ZIP"""
+    return f"{NOME_ARQUIVO} ({numero:0{len(str(total))}d} de {total}).xlsx"
+
+
+@lru_cache(maxsize=None)
+def modelo_padrao(caminho=CAMINHO_MODELO):
+    """Modelo do formulário carregado uma vez por processo"""
+    return ModeloFormulario.de_arquivo(caminho)
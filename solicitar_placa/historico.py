@@ -0,0 +1,253 @@
+"""Histórico local (SQLite) das solicitações geradas.
+
+Cada formulário baixado vira um registro com loja, solicitante, data e as
+linhas dos produtos como foram exportadas. Uma solicitação antiga pode voltar
+para a sessão e ser exportada de novo sem consultar a API. O histórico só
+recebe inclusões; a compactação automática junta as solicitações antigas
+repetidas (promoções recorrentes com os mesmos produtos, tipos e tamanhos) em
+um único registro e apaga as que passaram do prazo de retenção.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from solicitar_placa.catalogo import chave_codigo
+from solicitar_placa.produtos import CAMPOS_EXIBICAO, Produto
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+MAX_LISTAGEM = 200            # Solicitações devolvidas por consulta ao histórico
+IDADE_COMPACTACAO = 90        # Dias; solicitações repetidas mais antigas que isso viram um só registro
+RETENCAO_HISTORICO = 2 * 365  # Dias que uma solicitação fica no histórico
+INTERVALO_COMPACTACAO = 24 * 60 * 60  # Segundos entre compactações automáticas
+FORMATO_DATA = "%d/%m/%Y"     # Data impressa no formulário (gravada em ISO para ordenar e filtrar)
+
+CAMPOS_ITEM = tuple(CAMPOS_EXIBICAO)
+
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS solicitacoes (
+    id INTEGER PRIMARY KEY,
+    loja TEXT NOT NULL,
+    solicitante TEXT,
+    data TEXT NOT NULL,
+    criada_em REAL NOT NULL,
+    quantidade INTEGER NOT NULL,
+    assinatura TEXT NOT NULL,
+    repeticoes INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS solicitacoes_loja_data ON solicitacoes (loja, data);
+CREATE INDEX IF NOT EXISTS solicitacoes_data ON solicitacoes (data);
+CREATE INDEX IF NOT EXISTS solicitacoes_assinatura ON solicitacoes (assinatura);
+CREATE TABLE IF NOT EXISTS itens (
+    solicitacao_id INTEGER NOT NULL,
+    posicao INTEGER NOT NULL,
+    chave TEXT NOT NULL,
+    {", ".join(f"{campo} TEXT" for campo in CAMPOS_ITEM)},
+    PRIMARY KEY (solicitacao_id, posicao)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS itens_codigo ON itens (chave);
+CREATE TABLE IF NOT EXISTS estado (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+def data_iso(data_solicitacao):
+    """Data do formulário (dd/mm/aaaa, date ou datetime) no formato ISO gravado no histórico"""
+    if isinstance(data_solicitacao, (date, datetime)):
+        return data_solicitacao.strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(str(data_solicitacao).strip(), FORMATO_DATA).strftime("%Y-%m-%d")
+    except ValueError:
+        return date.today().isoformat()
+
+
+def assinatura_solicitacao(loja, produtos):
+    """Identifica a solicitação pela loja e pelos produtos com tipo e tamanho de placa (sem data nem solicitante)"""
+    conteudo = "\n".join(
+        [loja] + [f"{chave_codigo(p.codigo_barras)};{p.tipo_placa};{p.tamanho_placa}" for p in produtos]
+    )
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+
+class HistoricoSolicitacoes:
+    """Solicitações geradas, indexadas por loja, data e código de barras, seguro entre threads.
+
+    Uma instância por processo (st.cache_resource no app). Sem `caminho` o
+    histórico fica em memória e vale só enquanto o servidor estiver no ar.
+    """
+
+    def __init__(self, caminho=None, intervalo_compactacao=INTERVALO_COMPACTACAO):
+        self.intervalo_compactacao = intervalo_compactacao
+        self._lock = threading.Lock()
+        self._banco = sqlite3.connect(caminho or ":memory:", check_same_thread=False)
+        with self._lock, self._banco:
+            if caminho:
+                self._banco.execute("PRAGMA journal_mode=WAL")
+            # Só tem efeito em arquivo novo: libera as páginas apagadas pela compactação
+            self._banco.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._banco.executescript(ESQUEMA)
+
+    def _executar_sql(self, sql, parametros=()):
+        with self._lock, self._banco:
+            return self._banco.execute(sql, parametros).fetchall()
+
+    def registrar(self, loja, data_solicitacao, solicitante, produtos):
+        """Grava a solicitação exportada. Retorna o id.
+
+        Baixar de novo a mesma solicitação (mesma loja, data, solicitante e
+        produtos) não cria outro registro: devolve o id do último.
+        """
+        produtos = list(produtos)
+        data = data_iso(data_solicitacao)
+        assinatura = assinatura_solicitacao(loja, produtos)
+        with self._lock, self._banco:
+            existente = self._banco.execute(
+                "SELECT id FROM solicitacoes WHERE assinatura = ? AND data = ? AND solicitante IS ? "
+                "ORDER BY id DESC LIMIT 1", (assinatura, data, solicitante)
+            ).fetchone()
+            if existente:
+                return existente[0]
+            solicitacao_id = self._banco.execute(
+                "INSERT INTO solicitacoes (loja, solicitante, data, criada_em, quantidade, assinatura) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (loja, solicitante, data, time.time(), len(produtos), assinatura)
+            ).lastrowid
+            self._banco.executemany(
+                f"INSERT INTO itens (solicitacao_id, posicao, chave, {', '.join(CAMPOS_ITEM)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(CAMPOS_ITEM))})",
+                [(solicitacao_id, posicao, chave_codigo(produto.codigo_barras),
+                  *(None if getattr(produto, campo) is None else str(getattr(produto, campo))
+                    for campo in CAMPOS_ITEM))
+                 for posicao, produto in enumerate(produtos)]
+            )
+        self._compactar_se_preciso()
+        return solicitacao_id
+
+    def listar(self, loja=None, desde=None, ate=None, codigo_barras=None, limite=MAX_LISTAGEM):
+        """Solicitações (mais recentes primeiro) filtradas por loja, período e código de barras.
+
+        Retorna dicionários com id, loja, solicitante, data (dd/mm/aaaa),
+        quantidade e repeticoes (solicitações iguais juntadas pela compactação).
+        """
+        condicoes, parametros = [], []
+        if loja:
+            condicoes.append("s.loja = ?")
+            parametros.append(loja)
+        if desde:
+            condicoes.append("s.data >= ?")
+            parametros.append(data_iso(desde))
+        if ate:
+            condicoes.append("s.data <= ?")
+            parametros.append(data_iso(ate))
+        if codigo_barras:
+            condicoes.append("s.id IN (SELECT solicitacao_id FROM itens WHERE chave = ?)")
+            parametros.append(chave_codigo(codigo_barras))
+
+        linhas = self._executar_sql(
+            "SELECT s.id, s.loja, s.solicitante, s.data, s.quantidade, s.repeticoes FROM solicitacoes s"
+            + (" WHERE " + " AND ".join(condicoes) if condicoes else "")
+            + " ORDER BY s.data DESC, s.id DESC LIMIT ?", (*parametros, limite)
+        )
+        return [
+            {"id": solicitacao_id, "loja": loja, "solicitante": solicitante,
+             "data": datetime.strptime(data, "%Y-%m-%d").strftime(FORMATO_DATA),
+             "quantidade": quantidade, "repeticoes": repeticoes}
+            for solicitacao_id, loja, solicitante, data, quantidade, repeticoes in linhas
+        ]
+
+    def carregar(self, solicitacao_id):
+        """(cabeçalho, produtos) da solicitação, ou None se não existir.
+
+        O cabeçalho traz loja, solicitante e data (dd/mm/aaaa); os produtos são
+        as linhas exportadas, na ordem do formulário.
+        """
+        cabecalho = self._executar_sql(
+            "SELECT loja, solicitante, data FROM solicitacoes WHERE id = ?", (solicitacao_id,)
+        )
+        if not cabecalho:
+            return None
+        loja, solicitante, data = cabecalho[0]
+        linhas = self._executar_sql(
+            f"SELECT {', '.join(CAMPOS_ITEM)} FROM itens WHERE solicitacao_id = ? ORDER BY posicao",
+            (solicitacao_id,)
+        )
+        produtos = [Produto(*linha) for linha in linhas]
+        for produto in produtos:
+            # O tipo de placa é numérico no formulário
+            if produto.tipo_placa is not None and str(produto.tipo_placa).isdigit():
+                produto.tipo_placa = int(produto.tipo_placa)
+        return {
+            "loja": loja, "solicitante": solicitante,
+            "data": datetime.strptime(data, "%Y-%m-%d").strftime(FORMATO_DATA)
+        }, produtos
+
+    def codigos_mais_solicitados(self, limite, dias=IDADE_COMPACTACAO):
+        """Códigos de barras mais presentes nas solicitações dos últimos `dias` (repetições contam)"""
+        desde = (date.today() - timedelta(days=dias)).isoformat()
+        linhas = self._executar_sql(
+            """SELECT MAX(i.codigo_barras) FROM itens i JOIN solicitacoes s ON s.id = i.solicitacao_id
+               WHERE s.data >= ? GROUP BY i.chave ORDER BY SUM(s.repeticoes) DESC, MAX(s.data) DESC LIMIT ?""",
+            (desde, limite)
+        )
+        return [codigo for codigo, in linhas]
+
+    def _compactar_se_preciso(self):
+        ultima = self._executar_sql("SELECT valor FROM estado WHERE chave = 'ultima_compactacao'")
+        if ultima and time.time() - float(ultima[0][0]) < self.intervalo_compactacao:
+            return
+        try:
+            self.compactar()
+        except sqlite3.Error:
+            logger.exception("Falha ao compactar o histórico de solicitações")
+
+    def compactar(self, idade=IDADE_COMPACTACAO, retencao=RETENCAO_HISTORICO, hoje=None):
+        """Junta as solicitações repetidas antigas e apaga as vencidas.
+
+        Solicitações com mais de `idade` dias que repetem outra (mesma
+        assinatura) saem do histórico e somam as repetições na mais recente,
+        que é mantida. Solicitações com mais de `retencao` dias são apagadas.
+        Retorna {"juntadas": n, "removidas": n}.
+        """
+        hoje = hoje or date.today()
+        limite_idade = (hoje - timedelta(days=idade)).isoformat()
+        limite_retencao = (hoje - timedelta(days=retencao)).isoformat()
+
+        with self._lock, self._banco:
+            repetidas = self._banco.execute(
+                """SELECT s.id, s.repeticoes, (SELECT MAX(r.id) FROM solicitacoes r WHERE r.assinatura = s.assinatura)
+                   FROM solicitacoes s
+                   WHERE s.data < ? AND s.id < (SELECT MAX(r.id) FROM solicitacoes r WHERE r.assinatura = s.assinatura)""",
+                (limite_idade,)
+            ).fetchall()
+            self._banco.executemany(
+                "UPDATE solicitacoes SET repeticoes = repeticoes + ? WHERE id = ?",
+                [(repeticoes, mantida) for _, repeticoes, mantida in repetidas]
+            )
+            vencidas = [linha[0] for linha in self._banco.execute(
+                "SELECT id FROM solicitacoes WHERE data < ?", (limite_retencao,)
+            )]
+            apagar = [(solicitacao_id,) for solicitacao_id, _, _ in repetidas] + [(i,) for i in vencidas]
+            self._banco.executemany("DELETE FROM itens WHERE solicitacao_id = ?", apagar)
+            self._banco.executemany("DELETE FROM solicitacoes WHERE id = ?", apagar)
+            self._banco.execute(
+                "INSERT OR REPLACE INTO estado (chave, valor) VALUES ('ultima_compactacao', ?)", (str(time.time()),)
+            )
+        if apagar:
+            self._executar_sql("PRAGMA incremental_vacuum")
+            logger.info("Histórico compactado: %d juntadas, %d removidas", len(repetidas), len(vencidas))
+        return {"juntadas": len(repetidas), "removidas": len(vencidas)}
+
+    def estatisticas(self):
+        linhas = self._executar_sql(
+            "SELECT COUNT(*), COALESCE(SUM(quantidade), 0), MIN(data) FROM solicitacoes"
+        )
+        solicitacoes, produtos, mais_antiga = linhas[0]
+        return {"solicitacoes": solicitacoes, "produtos": produtos, "mais_antiga": mais_antiga}
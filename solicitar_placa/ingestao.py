@@ -0,0 +1,237 @@
+import csv
+import io
+import itertools
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from openpyxl import load_workbook
+
+# ===============================
+# CONSTANTES
+# ===============================
+COLUNA_CODIGO = "CODIGO DE BARRAS"
+EXTENSOES_PLANILHA = (".xlsx", ".xlsm")
+EXTENSOES_TEXTO = (".csv", ".txt")
+TAMANHO_EAN8 = 8
+TAMANHO_EAN13 = 13
+TAMANHO_GTIN14 = 14
+# Pesos do dígito verificador GTIN para os 13 primeiros dígitos do código com 14 posições
+PESOS_GTIN = np.array([3, 1] * 6 + [3], dtype=np.int32)
+
+_DIGITOS = re.compile(r"[0-9]+")
+_DECIMAL_ZERADO = re.compile(r"[.,]0+$")
+_SEPARADORES = re.compile(r"[\s\-]")
+_NOTACAO_CIENTIFICA = re.compile(r"([0-9]+)(?:[.,]([0-9]+))?[eE]\+?([0-9]+)")
+
+
+@dataclass
+class ResultadoIngestao:
+    """Códigos lidos de um arquivo ou texto, já normalizados e sem repetição"""
+    codigos: list = field(default_factory=list)
+    duplicados: list = field(default_factory=list)   # Códigos repetidos no próprio arquivo
+    rejeitados: list = field(default_factory=list)   # {"Linha", "Valor", "Motivo"}
+    _origens: list = field(default_factory=list, repr=False)  # (linha, valor) de cada código aceito
+    _origens_duplicados: list = field(default_factory=list, repr=False)  # (linha, valor) de cada duplicado
+
+    def adicionar(self, linha, valor, vistos):
+        """Normaliza um valor lido e o classifica como código, duplicado ou rejeitado"""
+        codigo, motivo = normalizar_codigo(valor)
+        if codigo is None:
+            if motivo is not None:
+                self.rejeitados.append({"Linha": linha, "Valor": str(valor), "Motivo": motivo})
+        elif codigo in vistos:
+            self.duplicados.append(codigo)
+            self._origens_duplicados.append((linha, valor))
+        else:
+            vistos.add(codigo)
+            self.codigos.append(codigo)
+            self._origens.append((linha, valor))
+
+    def verificar_digitos(self):
+        """Rejeita de uma vez os códigos da coluna cujo dígito verificador não confere"""
+        invalidos = digitos_invalidos(self.codigos)
+        if not invalidos:
+            return
+
+        esperados = {self.codigos[indice]: esperado for indice, esperado in invalidos.items()}
+        for indice, esperado in invalidos.items():
+            linha, valor = self._origens[indice]
+            self.rejeitados.append({"Linha": linha, "Valor": str(valor), "Motivo": motivo_digito(esperado)})
+        # As repetições de um código inválido também são rejeitadas, cada uma com a sua linha
+        for codigo, (linha, valor) in zip(self.duplicados, self._origens_duplicados):
+            if codigo in esperados:
+                self.rejeitados.append({"Linha": linha, "Valor": str(valor), "Motivo": motivo_digito(esperados[codigo])})
+        self.rejeitados.sort(key=lambda rejeitado: rejeitado["Linha"])
+
+        manter = [i for i, codigo in enumerate(self.codigos) if codigo not in esperados]
+        self.codigos = [self.codigos[i] for i in manter]
+        self._origens = [self._origens[i] for i in manter]
+        manter = [i for i, codigo in enumerate(self.duplicados) if codigo not in esperados]
+        self.duplicados = [self.duplicados[i] for i in manter]
+        self._origens_duplicados = [self._origens_duplicados[i] for i in manter]
+
+
+def normalizar_codigo(valor):
+    """Converte o valor lido em texto só com dígitos.
+
+    Retorna (codigo, None) se válido, (None, motivo) se inválido ou
+    (None, None) para células vazias, que são apenas ignoradas.
+    """
+    if valor is None or isinstance(valor, bool):
+        return None, None
+
+    if isinstance(valor, int):
+        texto = str(valor)
+    elif isinstance(valor, float):
+        if not valor.is_integer():
+            return None, "Número com casas decimais"
+        texto = str(int(valor))
+    else:
+        texto = str(valor).strip()
+        if not texto:
+            return None, None
+
+        cientifico = _NOTACAO_CIENTIFICA.fullmatch(texto)
+        if cientifico:
+            # Ex.: "7,89123E+12" exportado pelo Excel perde os últimos dígitos
+            casas = len(cientifico.group(2) or "")
+            if casas < int(cientifico.group(3)):
+                return None, "Notação científica (dígitos perdidos)"
+            try:
+                texto = str(int(Decimal(texto.replace(",", "."))))
+            except (InvalidOperation, ValueError):
+                return None, "Valor inválido"
+
+        texto = _SEPARADORES.sub("", _DECIMAL_ZERADO.sub("", texto))
+
+    if not _DIGITOS.fullmatch(texto):
+        return None, "Contém caracteres não numéricos"
+    return ajustar_tamanho_gtin(texto)
+
+
+def ajustar_tamanho_gtin(texto):
+    """Leva o código só com dígitos à forma canônica: EAN-8, EAN-13 ou GTIN-14.
+
+    Zeros à esquerda não mudam o GTIN, então são removidos e o código volta a
+    ser completado até o menor dos três tamanhos que o comporta: "12345670" e
+    "00012345670" viram o mesmo EAN-8; GTIN-14 iniciado em 0, UPC-A de 12
+    dígitos e células numéricas que perderam o zero viram EAN-13. Retorna
+    (codigo, None) ou (None, motivo).
+    """
+    if len(texto) < TAMANHO_EAN8:
+        return None, f"Código curto demais ({len(texto)} dígitos; EAN-8, EAN-13 ou GTIN-14)"
+
+    significativo = texto.lstrip("0")
+    if len(significativo) > TAMANHO_GTIN14:
+        return None, f"Código longo demais ({len(texto)} dígitos; máximo {TAMANHO_GTIN14})"
+    if len(significativo) <= TAMANHO_EAN8:
+        return significativo.zfill(TAMANHO_EAN8), None
+    if len(significativo) <= TAMANHO_EAN13:
+        return significativo.zfill(TAMANHO_EAN13), None
+    return significativo, None
+
+
+def digitos_invalidos(codigos):
+    """Mapa índice -> dígito esperado dos códigos cujo dígito verificador não confere.
+
+    Calculado para a lista inteira de uma vez (matriz de dígitos com numpy);
+    os códigos já devem ter passado por `normalizar_codigo`.
+    """
+    if not codigos:
+        return {}
+    texto = "".join(codigo.zfill(TAMANHO_GTIN14) for codigo in codigos).encode("ascii")
+    digitos = (np.frombuffer(texto, dtype=np.uint8) - ord("0")).reshape(len(codigos), TAMANHO_GTIN14)
+    esperados = (10 - (digitos[:, :-1] @ PESOS_GTIN) % 10) % 10
+    return {int(i): int(esperados[i]) for i in np.flatnonzero(esperados != digitos[:, -1])}
+
+
+def motivo_digito(esperado):
+    return f"Dígito verificador inválido (o último dígito deveria ser {esperado})"
+
+
+def validar_codigo(valor):
+    """Normaliza e valida um código digitado: (codigo, None) se plausível, (None, motivo) se não"""
+    codigo, motivo = normalizar_codigo(valor)
+    if codigo is None:
+        return None, motivo or "Código vazio"
+    invalidos = digitos_invalidos([codigo])
+    if invalidos:
+        return None, motivo_digito(invalidos[0])
+    return codigo, None
+
+
+def _cabecalho(valor):
+    """Nome de coluna comparável (sem espaços extras, maiúsculo)"""
+    return " ".join(str(valor or "").split()).upper()
+
+
+def ler_planilha(arquivo):
+    """Lê apenas a coluna CODIGO DE BARRAS de um .xlsx em modo streaming"""
+    resultado = ResultadoIngestao()
+    vistos = set()
+
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        primeira = next(linhas, None) or ()
+        cabecalhos = [_cabecalho(v) for v in primeira]
+        if COLUNA_CODIGO not in cabecalhos:
+            raise ValueError(f"Coluna '{COLUNA_CODIGO}' não encontrada na primeira linha do arquivo.")
+        coluna = cabecalhos.index(COLUNA_CODIGO)
+
+        for numero, linha in enumerate(linhas, start=2):
+            valor = linha[coluna] if coluna < len(linha) else None
+            resultado.adicionar(numero, valor, vistos)
+    finally:
+        wb.close()
+
+    resultado.verificar_digitos()
+    return resultado
+
+
+def ler_texto(linhas):
+    """Lê códigos de CSV/TXT ou texto colado, linha a linha.
+
+    Se a primeira linha tiver a coluna CODIGO DE BARRAS, apenas ela é usada;
+    caso contrário cada linha traz um código na primeira coluna.
+    """
+    resultado = ResultadoIngestao()
+    vistos = set()
+
+    linhas = iter(linhas)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return resultado
+
+    delimitador = ";" if ";" in primeira else ("\t" if "\t" in primeira else ",")
+    leitor = csv.reader(itertools.chain([primeira], linhas), delimiter=delimitador)
+    coluna = 0
+
+    for numero, celulas in enumerate(leitor, start=1):
+        if numero == 1:
+            cabecalhos = [_cabecalho(c) for c in celulas]
+            if COLUNA_CODIGO in cabecalhos:
+                coluna = cabecalhos.index(COLUNA_CODIGO)
+                continue
+
+        valor = celulas[coluna] if coluna < len(celulas) else None
+        resultado.adicionar(numero, valor, vistos)
+
+    resultado.verificar_digitos()
+    return resultado
+
+
+def ler_codigos(arquivo, nome_arquivo=None):
+    """Lê os códigos de um arquivo enviado (.xlsx, .csv ou .txt)"""
+    nome = (nome_arquivo or getattr(arquivo, "name", "") or "").lower()
+
+    if nome.endswith(EXTENSOES_TEXTO):
+        texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            return ler_texto(linha.rstrip("\r\n") for linha in texto)
+        finally:
+            texto.detach()
+
+    return ler_planilha(arquivo)
@@ -0,0 +1,88 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# ===============================
+# CONSTANTES
+# ===============================
+# Teto de segurança, não a vazão esperada: o Varejo Fácil não publica um limite e
+# sinaliza excesso com 429, ao qual a concorrência adaptativa já reage. Cada produto
+# custa ~2 requisições (produto + fornecedor), então o teto vale ~100 itens/s para o
+# processo inteiro; com CONCORRENCIA_MAXIMA chamadas em voo ele só passa a valer
+# quando a API responde em menos de 80 ms. Ajustável por `requisicoes_por_segundo`
+# no secrets.toml ou VAREJO_FACIL_RPS.
+REQUISICOES_POR_SEGUNDO = 200  # Orçamento de requisições do processo inteiro (todas as sessões); 0 = sem limite
+CONCORRENCIA_INICIAL = 8
+CONCORRENCIA_MINIMA = 1
+CONCORRENCIA_MAXIMA = 16
+LATENCIA_ALVO = 2.0         # Segundos; respostas mais lentas contam como sinal de sobrecarga
+INTERVALO_REDUCAO = 1.0     # Segundos mínimos entre duas reduções (várias 429 simultâneas contam uma vez)
+
+
+class LimitadorRequisicoes:
+    """Orçamento de requisições por segundo e concorrência adaptativa (AIMD), seguro entre threads.
+
+    Cada requisição reserva uma vaga de concorrência e um horário de saída
+    espaçado de 1/rps. Respostas 429/503, falhas de rede e latência acima do
+    alvo reduzem o limite de concorrência pela metade; respostas normais o
+    aumentam em 1/limite (cerca de +1 a cada "rodada" de requisições).
+    """
+
+    def __init__(self, requisicoes_por_segundo=REQUISICOES_POR_SEGUNDO, concorrencia_inicial=CONCORRENCIA_INICIAL,
+                 concorrencia_minima=CONCORRENCIA_MINIMA, concorrencia_maxima=CONCORRENCIA_MAXIMA,
+                 latencia_alvo=LATENCIA_ALVO, relogio=time.monotonic, dormir=time.sleep):
+        self.intervalo = 1 / requisicoes_por_segundo if requisicoes_por_segundo else 0.0
+        self.concorrencia_minima = concorrencia_minima
+        self.concorrencia_maxima = concorrencia_maxima
+        self.latencia_alvo = latencia_alvo
+        self.limite = float(concorrencia_inicial)
+        self.em_uso = 0
+        self.reducoes = 0
+        self._relogio = relogio
+        self._dormir = dormir
+        self._proxima_saida = 0.0
+        self._ultima_reducao = float("-inf")
+        self._condicao = threading.Condition()
+
+    @contextmanager
+    def reservar(self):
+        """Bloqueia até haver vaga de concorrência e orçamento para uma requisição"""
+        with self._condicao:
+            while self.em_uso >= int(self.limite):
+                self._condicao.wait()
+            self.em_uso += 1
+            agora = self._relogio()
+            espera = max(0.0, self._proxima_saida - agora)
+            self._proxima_saida = max(agora, self._proxima_saida) + self.intervalo
+
+        try:
+            if espera:
+                self._dormir(espera)
+            yield
+        finally:
+            with self._condicao:
+                self.em_uso -= 1
+                self._condicao.notify()
+
+    def registrar(self, status, latencia):
+        """Ajusta o limite de concorrência pela resposta (status None = falha de rede)"""
+        sobrecarga = status is None or status in (429, 503) or latencia > self.latencia_alvo
+        with self._condicao:
+            if sobrecarga:
+                agora = self._relogio()
+                if agora - self._ultima_reducao >= INTERVALO_REDUCAO:
+                    self._ultima_reducao = agora
+                    self.limite = max(self.concorrencia_minima, self.limite / 2)
+                    self.reducoes += 1
+            elif status < 500:
+                self.limite = min(self.concorrencia_maxima, self.limite + 1 / self.limite)
+                self._condicao.notify_all()
+
+    def estatisticas(self):
+        with self._condicao:
+            return {
+                "limite_concorrencia": int(self.limite),
+                "em_uso": self.em_uso,
+                "reducoes": self.reducoes,
+                "requisicoes_por_segundo": round(1 / self.intervalo, 2) if self.intervalo else 0
+            }
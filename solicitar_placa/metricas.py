@@ -0,0 +1,207 @@
+"""Contadores e histogramas de latência do processo, exportáveis em JSON ou texto Prometheus."""
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===============================
+# CONSTANTES
+# ===============================
+# Limites superiores (segundos) dos intervalos dos histogramas
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTIS = (0.5, 0.95, 0.99)
+
+
+def _chave(rotulos):
+    return tuple(sorted((nome, str(valor)) for nome, valor in rotulos.items()))
+
+
+def _formatar_rotulos(chave):
+    if not chave:
+        return ""
+    pares = ",".join(f'{nome}="{valor}"' for nome, valor in chave)
+    return "{" + pares + "}"
+
+
+class Histograma:
+    """Histograma de intervalos fixos; os quantis são estimados por interpolação"""
+
+    __slots__ = ("limites", "contagens", "total", "soma")
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # Último intervalo: acima do maior limite
+        self.total = 0
+        self.soma = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.total += 1
+        self.soma += valor
+
+    def quantil(self, q):
+        """Valor estimado abaixo do qual está a fração q das observações"""
+        if not self.total:
+            return None
+        alvo = q * self.total
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            if contagem and acumulado + contagem >= alvo:
+                inferior = self.limites[i - 1] if i > 0 else 0.0
+                if i == len(self.limites):
+                    return inferior
+                return inferior + (self.limites[i] - inferior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return self.limites[-1]
+
+
+class RegistroMetricas:
+    """Registro de métricas do processo, seguro entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}    # nome -> {chave rótulos: valor}
+        self._histogramas = {}   # nome -> {chave rótulos: Histograma}
+        self._medidores = {}     # nome -> função que retorna {campo: número}
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        with self._lock:
+            serie = self._contadores.setdefault(nome, {})
+            chave = _chave(rotulos)
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        with self._lock:
+            serie = self._histogramas.setdefault(nome, {})
+            chave = _chave(rotulos)
+            if chave not in serie:
+                serie[chave] = Histograma()
+            serie[chave].observar(valor)
+
+    @contextmanager
+    def medir(self, nome, **rotulos):
+        """Registra no histograma `nome` o tempo gasto dentro do bloco.
+
+        O dicionário devolvido pode receber rótulos conhecidos só no fim
+        (ex.: o status da resposta).
+        """
+        inicio = time.perf_counter()
+        try:
+            yield rotulos
+        except BaseException:
+            rotulos.setdefault("status", "erro")
+            raise
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    def registrar_medidor(self, nome, funcao):
+        """Valores lidos no momento da exportação (ex.: estatísticas de cache)"""
+        with self._lock:
+            self._medidores[nome] = funcao
+
+    def limpar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def como_dict(self):
+        """Retrato das métricas, com p50/p95/p99 de cada histograma"""
+        with self._lock:
+            contadores = {
+                nome: [{"rotulos": dict(chave), "valor": valor} for chave, valor in serie.items()]
+                for nome, serie in self._contadores.items()
+            }
+            histogramas = {
+                nome: [
+                    {
+                        "rotulos": dict(chave),
+                        "total": h.total,
+                        "soma": h.soma,
+                        **{f"p{int(q * 100)}": h.quantil(q) for q in QUANTIS}
+                    }
+                    for chave, h in serie.items()
+                ]
+                for nome, serie in self._histogramas.items()
+            }
+            medidores = dict(self._medidores)
+
+        return {
+            "contadores": contadores,
+            "histogramas": histogramas,
+            "medidores": {nome: funcao() for nome, funcao in medidores.items()}
+        }
+
+    def como_json(self):
+        return json.dumps(self.como_dict(), ensure_ascii=False, indent=2)
+
+    def como_prometheus(self, prefixo="solicitar_placa"):
+        """Métricas no formato de texto do Prometheus"""
+        linhas = []
+        with self._lock:
+            for nome, serie in sorted(self._contadores.items()):
+                linhas.append(f"# TYPE {prefixo}_{nome} counter")
+                for chave, valor in serie.items():
+                    linhas.append(f"{prefixo}_{nome}{_formatar_rotulos(chave)} {valor}")
+
+            for nome, serie in sorted(self._histogramas.items()):
+                linhas.append(f"# TYPE {prefixo}_{nome} histogram")
+                for chave, h in serie.items():
+                    acumulado = 0
+                    for limite, contagem in zip(h.limites + ("+Inf",), h.contagens):
+                        acumulado += contagem
+                        rotulos = _formatar_rotulos(chave + (("le", str(limite)),))
+                        linhas.append(f"{prefixo}_{nome}_bucket{rotulos} {acumulado}")
+                    linhas.append(f"{prefixo}_{nome}_sum{_formatar_rotulos(chave)} {h.soma}")
+                    linhas.append(f"{prefixo}_{nome}_count{_formatar_rotulos(chave)} {h.total}")
+            medidores = dict(self._medidores)
+
+        for nome, funcao in sorted(medidores.items()):
+            for campo, valor in funcao().items():
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    linhas.append(f"# TYPE {prefixo}_{nome}_{campo} gauge")
+                    linhas.append(f"{prefixo}_{nome}_{campo} {valor}")
+
+        return "\n".join(linhas) + "\n"
+
+
+# Registro único do processo, usado pelo cliente da API, consultas e formulário
+METRICAS = RegistroMetricas()
+
+
+def iniciar_servidor_metricas(porta, host="127.0.0.1", registro=METRICAS, pronto=None):
+    """Serve /metrics (Prometheus) e /metrics.json em uma thread de fundo. Retorna o servidor.
+
+    Com `pronto` (função sem argumentos), serve também /pronto: 200 quando ela
+    retorna verdadeiro, 503 enquanto o processo ainda está se preparando.
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/pronto" and pronto is not None:
+                if not pronto():
+                    self.send_error(503, "Aquecimento em andamento")
+                    return
+                corpo, tipo = "pronto\n", "text/plain"
+            elif self.path == "/metrics":
+                corpo, tipo = registro.como_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                corpo, tipo = registro.como_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            dados = corpo.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", f"{tipo}; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), _Handler)
+    threading.Thread(target=servidor.serve_forever, name="servidor-metricas", daemon=True).start()
+    return servidor
@@ -0,0 +1,140 @@
+from itertools import count, islice
+
+# ===============================
+# MAPEAMENTOS
+# ===============================
+LOJAS = ["MIMI", "KAMI", "TOTAL MIX"]
+
+TIPO_PLACA_MAP = {
+    "1 - OFERTA": 1,
+    "2 - PROMOÇÃO": 2,
+    "3 - SUPER OFERTA": 3,
+    "4 - MEGA OFERTA": 4,
+    "5 - SINALIZAÇÃO SIMPLES": 5
+}
+
+TAMANHO_PLACA_MAP = {
+    "A - FOLHA HORIZONTAL": "A",
+    "B - FOLHA VERTICAL": "B",
+    "C - MEIA FOLHA": "C",
+    "D - 1/4 FOLHA": "D",
+    "E - PORTA ETIQUETA": "E"
+}
+
+# Versões únicas no processo: identificam o conteúdo de qualquer lista para memoização
+_VERSOES = count(1)
+
+# Campo do produto -> nome da coluna exibida no relatório
+CAMPOS_EXIBICAO = {
+    "codigo_barras": "Código de Barras",
+    "descricao": "Descrição",
+    "fornecedor": "Fornecedor",
+    "identificador_origem": "Identificador de Origem",
+    "tipo_placa": "Tipo Placa",
+    "tamanho_placa": "Tamanho Placa"
+}
+
+
+class Produto:
+    """Linha do formulário: um produto com o tipo e tamanho de placa escolhidos"""
+
+    __slots__ = tuple(CAMPOS_EXIBICAO)
+
+    def __init__(self, codigo_barras, descricao, fornecedor, identificador_origem, tipo_placa, tamanho_placa):
+        self.codigo_barras = codigo_barras
+        self.descricao = descricao
+        self.fornecedor = fornecedor
+        self.identificador_origem = identificador_origem
+        self.tipo_placa = tipo_placa
+        self.tamanho_placa = tamanho_placa
+
+    @classmethod
+    def de_consulta(cls, codigo_barras, dados, tipo_placa, tamanho_placa):
+        """Produto a partir do resultado de ConsultaProdutos.consultar"""
+        return cls(
+            codigo_barras=codigo_barras,
+            descricao=dados["Descrição"],
+            fornecedor=dados["Fornecedor"],
+            identificador_origem=dados["Identificador de Origem"],
+            tipo_placa=tipo_placa,
+            tamanho_placa=tamanho_placa
+        )
+
+    def como_dict(self):
+        """Produto com os nomes de coluna exibidos no relatório"""
+        return {nome: getattr(self, campo) for campo, nome in CAMPOS_EXIBICAO.items()}
+
+    def descricao_curta(self, tamanho=50):
+        """Descrição truncada para listas de seleção"""
+        descricao = self.descricao or ""
+        return descricao[:tamanho] + "..." if len(descricao) > tamanho else descricao
+
+    def __repr__(self):
+        return f"Produto({self.codigo_barras!r}, {self.descricao!r})"
+
+
+class ListaProdutos:
+    """Produtos da solicitação na ordem de inclusão, indexados pelo código de barras.
+
+    O dicionário interno preserva a ordem de inserção, então verificar,
+    incluir e remover um código são operações O(1). `versao` muda a cada
+    alteração e serve de chave para as visões derivadas (relatório, opções).
+    """
+
+    __slots__ = ("_itens", "versao")
+
+    def __init__(self, produtos=()):
+        self._itens = {}
+        self.versao = next(_VERSOES)
+        for produto in produtos:
+            self.adicionar(produto)
+
+    def adicionar(self, produto):
+        """Inclui o produto. Retorna False se o código de barras já estiver na lista"""
+        if produto.codigo_barras in self._itens:
+            return False
+        self._itens[produto.codigo_barras] = produto
+        self.versao = next(_VERSOES)
+        return True
+
+    def remover(self, codigo_barras):
+        """Remove e retorna o produto com o código informado, ou None"""
+        produto = self._itens.pop(codigo_barras, None)
+        if produto is not None:
+            self.versao = next(_VERSOES)
+        return produto
+
+    def obter(self, codigo_barras):
+        """Produto com o código informado, ou None"""
+        return self._itens.get(codigo_barras)
+
+    def limpar(self):
+        self._itens.clear()
+        self.versao = next(_VERSOES)
+
+    def codigos(self):
+        """Códigos de barras na ordem de inclusão"""
+        return list(self._itens)
+
+    def como_registros(self):
+        """Lista de dicionários para montar o DataFrame do relatório"""
+        return [produto.como_dict() for produto in self._itens.values()]
+
+    def __contains__(self, codigo_barras):
+        return codigo_barras in self._itens
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __iter__(self):
+        return iter(self._itens.values())
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio, fim, passo = indice.indices(len(self._itens))
+            return list(islice(self._itens.values(), inicio, fim, passo))
+        if indice < 0:
+            indice += len(self._itens)
+        if not 0 <= indice < len(self._itens):
+            raise IndexError("índice fora da lista de produtos")
+        return next(islice(self._itens.values(), indice, None))
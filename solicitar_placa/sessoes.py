@@ -0,0 +1,106 @@
+"""Memória das sessões do app: estimativa por sessão e descarte dos dados que podem ser refeitos.
+
+O estado de cada sessão (st.session_state) guarda só o que não pode ser
+recalculado: os dados do solicitante e as linhas compactas dos produtos. O
+que é derivado deles (tabelas do relatório, rótulos de remoção) fica em um
+cache do processo com limite de entradas e expiração, e é liberado quando a
+sessão fica ociosa.
+"""
+
+import sys
+import threading
+import time
+
+from solicitar_placa.cache import CacheTTL
+
+# ===============================
+# CONSTANTES
+# ===============================
+TEMPO_OCIOSO = 30 * 60    # Segundos sem interação até os dados derivados da sessão serem descartados
+MAX_DERIVADOS = 300       # Dados derivados mantidos no processo (somando todas as sessões)
+# Limite documentado do estado de uma sessão: base fixa + linhas dos produtos (ver README)
+BYTES_BASE_SESSAO = 16 * 1024
+BYTES_POR_PRODUTO = 512   # Medido: cerca de 370 bytes (linha, códigos colados e resumo do lote)
+
+
+def tamanho_profundo(objeto, vistos=None):
+    """Bytes ocupados pelo objeto e por tudo o que ele referencia (cada objeto contado uma vez)"""
+    vistos = set() if vistos is None else vistos
+    if id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+
+    memoria = getattr(objeto, "memory_usage", None)
+    if callable(memoria) and hasattr(objeto, "columns"):  # DataFrame
+        return int(memoria(index=True, deep=True).sum())
+    if hasattr(objeto, "getbuffer"):  # BytesIO / arquivo enviado
+        return sys.getsizeof(objeto) + objeto.getbuffer().nbytes
+
+    tamanho = sys.getsizeof(objeto)
+    if isinstance(objeto, (str, bytes, bytearray, int, float, bool)) or objeto is None:
+        return tamanho
+    if isinstance(objeto, dict):
+        return tamanho + sum(tamanho_profundo(chave, vistos) + tamanho_profundo(valor, vistos)
+                             for chave, valor in objeto.items())
+    if isinstance(objeto, (list, tuple, set, frozenset)):
+        return tamanho + sum(tamanho_profundo(item, vistos) for item in objeto)
+
+    for nome in getattr(type(objeto), "__slots__", ()):
+        tamanho += tamanho_profundo(getattr(objeto, nome, None), vistos)
+    if hasattr(objeto, "__dict__"):
+        tamanho += tamanho_profundo(vars(objeto), vistos)
+    return tamanho
+
+
+def limite_sessao(quantidade_produtos):
+    """Bytes que o estado de uma sessão com essa quantidade de produtos não deve ultrapassar"""
+    return BYTES_BASE_SESSAO + BYTES_POR_PRODUTO * quantidade_produtos
+
+
+class RegistroSessoes:
+    """Atividade e memória estimada de cada sessão, mais os dados derivados delas.
+
+    Uma instância por processo (st.cache_resource no app). Cada execução do
+    script chama `registrar`; sessões sem interação há mais de `tempo_ocioso`
+    saem do registro e seus derivados expiram do cache.
+    """
+
+    def __init__(self, tempo_ocioso=TEMPO_OCIOSO, max_derivados=MAX_DERIVADOS, relogio=time.monotonic):
+        self.tempo_ocioso = tempo_ocioso
+        self.derivados = CacheTTL(ttl=tempo_ocioso, tamanho_maximo=max_derivados, relogio=relogio)
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._sessoes = {}  # sessao_id -> (último acesso, bytes, produtos)
+        self.acima_do_limite = 0
+
+    def registrar(self, sessao_id, estado, quantidade_produtos=0):
+        """Marca a atividade da sessão e mede o estado dela. Retorna os bytes medidos"""
+        tamanho = tamanho_profundo(estado)
+        agora = self._relogio()
+        with self._lock:
+            self._sessoes[sessao_id] = (agora, tamanho, quantidade_produtos)
+            if tamanho > limite_sessao(quantidade_produtos):
+                self.acima_do_limite += 1
+            for ociosa in [s for s, (acesso, _, _) in self._sessoes.items() if agora - acesso > self.tempo_ocioso]:
+                del self._sessoes[ociosa]
+        return tamanho
+
+    def memo(self, sessao_id, nome, versao, calcular):
+        """Resultado de `calcular()` para a sessão, refeito quando a versão muda ou o derivado expira"""
+        chave = (sessao_id, nome)
+        memo = self.derivados.obter(chave)
+        if memo is None or memo[0] != versao:
+            memo = (versao, calcular())
+            self.derivados.guardar(chave, memo)
+        return memo[1]
+
+    def estatisticas(self):
+        with self._lock:
+            tamanhos = [tamanho for _, tamanho, _ in self._sessoes.values()]
+            return {
+                "sessoes": len(tamanhos),
+                "bytes_total": sum(tamanhos),
+                "bytes_maximo": max(tamanhos, default=0),
+                "acima_do_limite": self.acima_do_limite,
+                "derivados": len(self.derivados)
+            }
@@ -0,0 +1,286 @@
+"""Processamento do LOTE em segundo plano, independente das reexecuções do Streamlit.
+
+As tarefas rodam em um pool de threads do processo e registram o resultado de
+cada código de barras em SQLite assim que ele fica pronto. Uma tarefa
+interrompida (reinício do servidor) é retomada a partir dos códigos sem
+resultado quando o gerenciador é criado de novo com o mesmo arquivo.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+
+import requests
+
+from solicitar_placa.api import descrever_falha
+from solicitar_placa.ingestao import ler_codigos, ler_texto
+from solicitar_placa.metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONSTANTES
+# ===============================
+MAX_TAREFAS_SIMULTANEAS = 2   # Lotes processados ao mesmo tempo (cada um já consulta em paralelo)
+TAMANHO_GRUPO_TAREFA = 25     # Códigos consultados por vez (o cancelamento é conferido entre grupos)
+RETENCAO_TAREFAS = 6 * 60 * 60  # Segundos que uma tarefa finalizada fica disponível
+
+FILA = "fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+CANCELADA = "cancelada"
+FALHOU = "falhou"
+ESTADOS_FINAIS = (CONCLUIDA, CANCELADA, FALHOU)
+
+ENCONTRADO = "encontrado"
+NAO_ENCONTRADO = "nao_encontrado"
+DUPLICADO = "duplicado"  # Já estava na solicitação quando o lote foi enviado: não é consultado
+ERRO = "erro"
+NAO_PROCESSADO = "nao_processado"  # A tarefa foi cancelada ou falhou antes de consultar o código
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    parametros TEXT NOT NULL,
+    ingestao TEXT,
+    erro TEXT,
+    criada_em REAL NOT NULL,
+    atualizada_em REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS itens (
+    tarefa_id TEXT NOT NULL,
+    posicao INTEGER NOT NULL,
+    codigo TEXT NOT NULL,
+    situacao TEXT,
+    dados TEXT,
+    PRIMARY KEY (tarefa_id, posicao)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class TarefaLote:
+    """Retrato de uma tarefa para a interface"""
+    id: str
+    estado: str
+    parametros: dict
+    total: int = 0
+    concluidos: int = 0
+    rejeitados: list = field(default_factory=list)
+    duplicados: list = field(default_factory=list)
+    erro: str = None
+
+    @property
+    def finalizada(self):
+        return self.estado in ESTADOS_FINAIS
+
+
+class GerenciadorTarefas:
+    """Fila de lotes processados em segundo plano por `ConsultaProdutos.consultar_lote`.
+
+    Uma instância por processo (st.cache_resource no app). Sem `caminho` o
+    registro fica em memória: as tarefas sobrevivem às reexecuções e trocas de
+    aba, mas não a um reinício do servidor.
+    """
+
+    def __init__(self, consulta, caminho=None, max_simultaneas=MAX_TAREFAS_SIMULTANEAS,
+                 tamanho_grupo=TAMANHO_GRUPO_TAREFA):
+        self.consulta = consulta
+        self.tamanho_grupo = tamanho_grupo
+        self._lock = threading.Lock()
+        self._banco = sqlite3.connect(caminho or ":memory:", check_same_thread=False)
+        with self._lock, self._banco:
+            if caminho:
+                self._banco.execute("PRAGMA journal_mode=WAL")
+            self._banco.executescript(ESQUEMA)
+        self._cancelar = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix="tarefa-lote")
+        self._retomar()
+
+    def _executar_sql(self, sql, parametros=()):
+        with self._lock, self._banco:
+            return self._banco.execute(sql, parametros).fetchall()
+
+    def _atualizar_estado(self, tarefa_id, estado, erro=None):
+        self._executar_sql(
+            "UPDATE tarefas SET estado = ?, erro = ?, atualizada_em = ? WHERE id = ?",
+            (estado, erro, time.time(), tarefa_id)
+        )
+
+    def _finalizar(self, tarefa_id, estado, erro=None):
+        """Encerra a tarefa; os códigos ainda sem resultado ficam como não processados (na mesma transação)"""
+        with self._lock, self._banco:
+            self._banco.execute(
+                "UPDATE itens SET situacao = ? WHERE tarefa_id = ? AND situacao IS NULL", (NAO_PROCESSADO, tarefa_id)
+            )
+            self._banco.execute(
+                "UPDATE tarefas SET estado = ?, erro = ?, atualizada_em = ? WHERE id = ?",
+                (estado, erro, time.time(), tarefa_id)
+            )
+
+    def _registrar_resultado(self, tarefa_id, posicao, dados):
+        """Grava o resultado de um código assim que a consulta dele termina"""
+        if isinstance(dados, requests.RequestException):
+            situacao, dados = ERRO, json.dumps(descrever_falha(dados))
+        elif dados is None:
+            situacao = NAO_ENCONTRADO
+        else:
+            situacao, dados = ENCONTRADO, json.dumps(dados)
+        with self._lock, self._banco:
+            self._banco.execute(
+                "UPDATE itens SET situacao = ?, dados = ? WHERE tarefa_id = ? AND posicao = ?",
+                (situacao, dados, tarefa_id, posicao)
+            )
+            self._banco.execute("UPDATE tarefas SET atualizada_em = ? WHERE id = ?", (time.time(), tarefa_id))
+
+    def enviar(self, parametros, codigos=None, arquivo=None, nome_arquivo=None, texto=None, ignorar=()):
+        """Cria a tarefa e a coloca na fila. Retorna o id.
+
+        Os códigos podem vir prontos (`codigos`), como conteúdo de arquivo
+        (`arquivo` em bytes + `nome_arquivo`) ou como texto colado; a leitura do
+        arquivo também acontece em segundo plano. Códigos em `ignorar` (já
+        solicitados) são registrados como duplicados sem consulta.
+        """
+        self.limpar()
+        tarefa_id = uuid.uuid4().hex
+        agora = time.time()
+        self._executar_sql(
+            "INSERT INTO tarefas (id, estado, parametros, criada_em, atualizada_em) VALUES (?, ?, ?, ?, ?)",
+            (tarefa_id, FILA, json.dumps(parametros), agora, agora)
+        )
+        self._executor.submit(self._executar, tarefa_id, (codigos, arquivo, nome_arquivo, texto, set(ignorar)))
+        METRICAS.incrementar("tarefas_total", estado=FILA)
+        return tarefa_id
+
+    def _ler_fonte(self, tarefa_id, fonte):
+        """Lê e registra os códigos da tarefa (um item por código, na ordem do arquivo)"""
+        codigos, arquivo, nome_arquivo, texto, ignorar = fonte
+        rejeitados = duplicados = []
+        if codigos is None:
+            leitura = ler_codigos(BytesIO(arquivo), nome_arquivo) if arquivo is not None else \
+                ler_texto((texto or "").splitlines())
+            codigos, rejeitados, duplicados = leitura.codigos, leitura.rejeitados, leitura.duplicados
+
+        with self._lock, self._banco:
+            self._banco.executemany(
+                "INSERT INTO itens (tarefa_id, posicao, codigo, situacao) VALUES (?, ?, ?, ?)",
+                [(tarefa_id, posicao, codigo, DUPLICADO if codigo in ignorar else None)
+                 for posicao, codigo in enumerate(codigos)]
+            )
+            self._banco.execute(
+                "UPDATE tarefas SET ingestao = ? WHERE id = ?",
+                (json.dumps({"rejeitados": rejeitados, "duplicados": duplicados}), tarefa_id)
+            )
+
+    def _executar(self, tarefa_id, fonte=None):
+        inicio = time.perf_counter()
+        try:
+            if fonte is not None:
+                self._ler_fonte(tarefa_id, fonte)
+            self._atualizar_estado(tarefa_id, EXECUTANDO)
+
+            while True:
+                if tarefa_id in self._cancelar:
+                    self._cancelar.discard(tarefa_id)
+                    self._finalizar(tarefa_id, CANCELADA)
+                    return
+
+                pendentes = self._executar_sql(
+                    "SELECT posicao, codigo FROM itens WHERE tarefa_id = ? AND situacao IS NULL "
+                    "ORDER BY posicao LIMIT ?", (tarefa_id, self.tamanho_grupo)
+                )
+                if not pendentes:
+                    break
+
+                # Cada código é gravado quando termina: progresso contínuo e nada a refazer após um reinício
+                self.consulta.consultar_lote(
+                    [codigo for _, codigo in pendentes],
+                    ao_resultado=lambda i, dados: self._registrar_resultado(tarefa_id, pendentes[i][0], dados)
+                )
+
+            self._finalizar(tarefa_id, CONCLUIDA)
+            METRICAS.observar("tarefa_segundos", time.perf_counter() - inicio)
+        except Exception as erro:
+            logger.exception("Falha na tarefa de lote %s", tarefa_id)
+            self._finalizar(tarefa_id, FALHOU, str(erro))
+        finally:
+            self._cancelar.discard(tarefa_id)
+            estado = self._executar_sql("SELECT estado FROM tarefas WHERE id = ?", (tarefa_id,))
+            METRICAS.incrementar("tarefas_total", estado=estado[0][0] if estado else FALHOU)
+
+    def _retomar(self):
+        """Recoloca na fila as tarefas interrompidas por um reinício"""
+        interrompidas = self._executar_sql(
+            "SELECT id, ingestao FROM tarefas WHERE estado IN (?, ?)", (FILA, EXECUTANDO)
+        )
+        for tarefa_id, ingestao in interrompidas:
+            if ingestao is None:
+                # O arquivo enviado não é guardado: sem os códigos registrados não há o que retomar
+                self._finalizar(tarefa_id, FALHOU, "Interrompida antes da leitura dos códigos")
+                continue
+            logger.info("Retomando a tarefa de lote %s", tarefa_id)
+            self._executor.submit(self._executar, tarefa_id)
+
+    def obter(self, tarefa_id):
+        """TarefaLote com o progresso atual, ou None se não existir"""
+        linhas = self._executar_sql(
+            """SELECT t.estado, t.parametros, t.ingestao, t.erro,
+                      (SELECT COUNT(*) FROM itens i WHERE i.tarefa_id = t.id),
+                      (SELECT COUNT(*) FROM itens i WHERE i.tarefa_id = t.id AND i.situacao IS NOT NULL)
+               FROM tarefas t WHERE t.id = ?""", (tarefa_id,)
+        )
+        if not linhas:
+            return None
+        estado, parametros, ingestao, erro, total, concluidos = linhas[0]
+        ingestao = json.loads(ingestao) if ingestao else {}
+        return TarefaLote(
+            id=tarefa_id, estado=estado, parametros=json.loads(parametros), total=total,
+            concluidos=concluidos, rejeitados=ingestao.get("rejeitados", []),
+            duplicados=ingestao.get("duplicados", []), erro=erro
+        )
+
+    def resultados(self, tarefa_id, a_partir=0):
+        """(posicao, codigo, situacao, dados) já processados a partir da posição, sem lacunas e em ordem.
+
+        `dados` é o dicionário do produto (encontrado), o texto da falha (erro)
+        ou None (não encontrado, duplicado, não processado). Em uma tarefa
+        finalizada todos os itens têm situação.
+        """
+        linhas = self._executar_sql(
+            "SELECT posicao, codigo, situacao, dados FROM itens WHERE tarefa_id = ? AND posicao >= ? "
+            "ORDER BY posicao", (tarefa_id, a_partir)
+        )
+        processados = []
+        for posicao, codigo, situacao, dados in linhas:
+            if situacao is None or posicao != a_partir + len(processados):
+                break
+            processados.append((posicao, codigo, situacao, json.loads(dados) if dados else None))
+        return processados
+
+    def cancelar(self, tarefa_id):
+        """Pede a interrupção da tarefa (os códigos já consultados continuam disponíveis)"""
+        self._cancelar.add(tarefa_id)
+
+    def limpar(self, retencao=RETENCAO_TAREFAS):
+        """Remove as tarefas finalizadas há mais de `retencao` segundos"""
+        limite = time.time() - retencao
+        with self._lock, self._banco:
+            antigas = [linha[0] for linha in self._banco.execute(
+                f"SELECT id FROM tarefas WHERE estado IN ({','.join('?' * len(ESTADOS_FINAIS))}) "
+                "AND atualizada_em < ?", (*ESTADOS_FINAIS, limite)
+            )]
+            for tarefa_id in antigas:
+                self._banco.execute("DELETE FROM itens WHERE tarefa_id = ?", (tarefa_id,))
+                self._banco.execute("DELETE FROM tarefas WHERE id = ?", (tarefa_id,))
+        return len(antigas)
+
+    def estatisticas(self):
+        linhas = self._executar_sql("SELECT estado, COUNT(*) FROM tarefas GROUP BY estado")
+        return {estado: quantidade for estado, quantidade in linhas}
@@ -0,0 +1,45 @@
+"""Índice de busca alimentado pelo espelho local: códigos como o espelho guarda e reconstrução após remoções"""
+
+from solicitar_placa.busca import IndiceBusca
+from solicitar_placa.catalogo import CatalogoLocal
+
+
+def produto(produto_id, descricao):
+    return {"id": produto_id, "descricao": descricao, "identificadorDeOrigem": None}
+
+
+def ids(indice, texto):
+    return [encontrado["produto_id"] for encontrado in indice.buscar(texto)]
+
+
+def test_ean8_com_zero_a_esquerda_continua_no_indice(tmp_path):
+    catalogo = CatalogoLocal(tmp_path / "catalogo.sqlite3")
+    catalogo.guardar_produto(produto(1, "BALA DE GOMA"), ["01234565"], None, True)
+    indice = IndiceBusca(catalogo, intervalo_atualizacao=0)
+
+    assert indice.buscar("01234565")[0]["codigos"] == ["1234565"]
+    assert ids(indice, "1234565") == [1]
+    assert ids(indice, "23456") == [1]
+
+
+def test_produto_substituido_sai_do_indice(tmp_path):
+    catalogo = CatalogoLocal(tmp_path / "catalogo.sqlite3")
+    catalogo.guardar_produto(produto(1, "ARROZ TIPO 1"), ["7891000000007"], None, True)
+    indice = IndiceBusca(catalogo, intervalo_atualizacao=0)
+    assert ids(indice, "arroz") == [1]
+
+    # Sincronização completa: o produto 1 deu lugar ao 2 (mesma quantidade de produtos)
+    catalogo.guardar_produto(produto(2, "FEIJAO CARIOCA"), ["7891000000014"], None, True)
+    catalogo.remover_produtos_exceto([2])
+    assert ids(indice, "arroz") == []
+    assert ids(indice, "feijao") == [2]
+
+
+def test_codigo_que_muda_de_produto_sai_do_anterior(tmp_path):
+    catalogo = CatalogoLocal(tmp_path / "catalogo.sqlite3")
+    catalogo.guardar_produto(produto(1, "ARROZ TIPO 1"), ["7891000000007"], None, True)
+    catalogo.guardar_produto(produto(2, "FEIJAO CARIOCA"), ["7891000000014"], None, True)
+    indice = IndiceBusca(catalogo, intervalo_atualizacao=0)
+
+    catalogo.guardar_produto(produto(2, "FEIJAO CARIOCA"), ["7891000000007"], None, True)
+    assert ids(indice, "7891000000007") == [2]
@@ -0,0 +1,45 @@
+"""Chamada de teste do disjuntor meio aberto"""
+
+import pytest
+
+from solicitar_placa.disjuntor import ABERTO, FECHADO, CircuitoAberto, Disjuntor
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def disjuntor_aberto():
+    relogio = Relogio()
+    disjuntor = Disjuntor(falhas_para_abrir=1, tempo_aberto=30, relogio=relogio)
+    lenta = disjuntor.permitir()  # Começa antes da abertura e só termina durante o teste
+    disjuntor.registrar(None, 0.1, disjuntor.permitir())
+    assert disjuntor.estado == ABERTO
+    relogio.agora = 31
+    return disjuntor, lenta
+
+
+def test_chamada_antiga_nao_libera_um_segundo_teste():
+    disjuntor, lenta = disjuntor_aberto()
+    teste = disjuntor.permitir()
+    assert teste is not None
+
+    disjuntor.registrar(200, 0.1, lenta)
+    with pytest.raises(CircuitoAberto):
+        disjuntor.permitir()
+
+    disjuntor.registrar(200, 0.1, teste)
+    assert disjuntor.estado == FECHADO
+    assert disjuntor.permitir() is None
+
+
+def test_teste_com_falha_reabre_o_circuito():
+    disjuntor, _ = disjuntor_aberto()
+    disjuntor.registrar(503, 0.1, disjuntor.permitir())
+    assert disjuntor.estado == ABERTO
+    with pytest.raises(CircuitoAberto):
+        disjuntor.permitir()
@@ -0,0 +1,31 @@
+"""Forma canônica dos códigos de barras e rejeição de dígitos verificadores inválidos"""
+
+import pytest
+
+from solicitar_placa.ingestao import ajustar_tamanho_gtin, ler_texto
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("12345670", "12345670"),
+    ("00012345670", "12345670"),
+    ("0000012345670", "12345670"),
+    ("00000012345670", "12345670"),
+    ("00001234", "00001234"),
+    ("789100000003", "0789100000003"),
+    ("7891000000007", "7891000000007"),
+    ("07891000000007", "7891000000007"),
+    ("17891000000004", "17891000000004"),
+])
+def test_mesmo_gtin_tem_uma_unica_forma(texto, esperado):
+    assert ajustar_tamanho_gtin(texto) == (esperado, None)
+
+
+def test_repeticoes_de_codigo_invalido_sao_todas_rejeitadas():
+    resultado = ler_texto(["7891000000002", "12345670", "7891000000002", "12345670", "7891000000002"])
+
+    assert resultado.codigos == ["12345670"]
+    assert resultado.duplicados == ["12345670"]
+    assert [rejeitado["Linha"] for rejeitado in resultado.rejeitados] == [1, 3, 5]
+    assert {rejeitado["Motivo"] for rejeitado in resultado.rejeitados} == {
+        "Dígito verificador inválido (o último dígito deveria ser 7)"
+    }
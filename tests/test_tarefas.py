@@ -0,0 +1,103 @@
+"""Fim das tarefas de lote (cancelamento e falha no meio) e gravação por código"""
+
+import threading
+import time
+
+import pytest
+
+from solicitar_placa.tarefas import (
+    CANCELADA, CONCLUIDA, ENCONTRADO, FALHOU, NAO_PROCESSADO, GerenciadorTarefas
+)
+
+ESPERA_MAXIMA = 5.0
+
+
+class ConsultaFalsa:
+    """Consulta que encontra todos os códigos; `antes_do_grupo(numero)` roda antes de cada grupo"""
+
+    def __init__(self, antes_do_grupo=None):
+        self.antes_do_grupo = antes_do_grupo
+        self.grupos = 0
+
+    def consultar_lote(self, codigos, ao_concluir=None, ao_resultado=None):
+        self.grupos += 1
+        if self.antes_do_grupo:
+            self.antes_do_grupo(self.grupos)
+        resultados = []
+        for i, codigo in enumerate(codigos):
+            dados = {"Descrição": f"PRODUTO {codigo}", "Fornecedor": "F", "Identificador de Origem": None}
+            resultados.append(dados)
+            if ao_resultado:
+                ao_resultado(i, dados)
+        return resultados
+
+
+def aguardar(condicao):
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while not condicao():
+        if time.monotonic() > limite:
+            pytest.fail("Tempo esgotado esperando a tarefa")
+        time.sleep(0.01)
+
+
+def codigos(quantidade):
+    return [f"789{i:010d}" for i in range(quantidade)]
+
+
+def test_cancelamento_encerra_os_itens_restantes():
+    liberar = threading.Event()
+    no_segundo_grupo = threading.Event()
+
+    def antes_do_grupo(numero):
+        if numero == 2:
+            no_segundo_grupo.set()
+            liberar.wait(ESPERA_MAXIMA)
+
+    tarefas = GerenciadorTarefas(ConsultaFalsa(antes_do_grupo), tamanho_grupo=2)
+    tarefa_id = tarefas.enviar({}, codigos=codigos(6))
+    assert no_segundo_grupo.wait(ESPERA_MAXIMA)
+    tarefas.cancelar(tarefa_id)
+    liberar.set()
+    aguardar(lambda: tarefas.obter(tarefa_id).finalizada)
+
+    tarefa = tarefas.obter(tarefa_id)
+    assert tarefa.estado == CANCELADA
+    assert tarefa.concluidos == tarefa.total == 6
+    situacoes = [situacao for _, _, situacao, _ in tarefas.resultados(tarefa_id)]
+    assert situacoes == [ENCONTRADO] * 4 + [NAO_PROCESSADO] * 2
+
+
+def test_falha_no_meio_encerra_os_itens_restantes():
+    def antes_do_grupo(numero):
+        if numero == 2:
+            raise RuntimeError("falha inesperada")
+
+    tarefas = GerenciadorTarefas(ConsultaFalsa(antes_do_grupo), tamanho_grupo=2)
+    tarefa_id = tarefas.enviar({}, codigos=codigos(5))
+    aguardar(lambda: tarefas.obter(tarefa_id).finalizada)
+
+    tarefa = tarefas.obter(tarefa_id)
+    assert tarefa.estado == FALHOU
+    assert tarefa.erro == "falha inesperada"
+    situacoes = [situacao for _, _, situacao, _ in tarefas.resultados(tarefa_id)]
+    assert situacoes == [ENCONTRADO] * 2 + [NAO_PROCESSADO] * 3
+
+
+def test_resultado_gravado_antes_do_fim_do_grupo():
+    liberar = threading.Event()
+
+    class ConsultaLenta(ConsultaFalsa):
+        def consultar_lote(self, codigos, ao_concluir=None, ao_resultado=None):
+            ao_resultado(0, {"Descrição": "PRIMEIRO", "Fornecedor": "F", "Identificador de Origem": None})
+            liberar.wait(ESPERA_MAXIMA)
+            return super().consultar_lote(codigos, ao_concluir, ao_resultado)
+
+    tarefas = GerenciadorTarefas(ConsultaLenta())
+    tarefa_id = tarefas.enviar({}, codigos=codigos(10))
+    aguardar(lambda: tarefas.obter(tarefa_id).concluidos == 1)
+    assert [posicao for posicao, _, _, _ in tarefas.resultados(tarefa_id)] == [0]
+
+    liberar.set()
+    aguardar(lambda: tarefas.obter(tarefa_id).finalizada)
+    assert tarefas.obter(tarefa_id).estado == CONCLUIDA
+    assert tarefas.obter(tarefa_id).concluidos == 10